@@ -0,0 +1,84 @@
+'''
+Benchmarks for :mod:`terra.compute`
+
+Run from the terra directory:
+
+.. code-block:: bash
+
+    python benchmarks/compute.py [-n COUNT]
+'''
+
+import argparse
+import os
+import timeit
+
+# Keep terra from setting up its log files on import
+os.environ['TERRA_UNITTEST'] = "1"
+
+from terra.compute import base, utils  # noqa: E402
+
+
+class Compute(base.BaseCompute):
+  def run_service(self, service_info):
+    pass
+
+
+class Service(base.BaseService):
+  pass
+
+
+@Compute.register(Service)
+class Service_compute(Service):
+  pass
+
+
+def calls_per_second(function, count):
+  return count / timeit.timeit(function, number=count)
+
+
+def dispatch(count):
+  '''
+  Calls per second of ``compute.run`` on a service instance (so no service is
+  loaded) with a no-op ``run_service``. Uncached builds the command for every
+  call, which is how :meth:`terra.compute.base.BaseCompute.__getattr__` used
+  to work
+  '''
+  compute = Compute()
+  service = base.BaseService()
+
+  def uncached():
+    Compute._command('run').__get__(compute, Compute)(service)
+
+  for name, function in (('uncached', uncached),
+                         ('cached', lambda: compute.run(service))):
+    print(f'  {name + ":":9} {calls_per_second(function, count):12.0f} '
+          'calls/s')
+
+
+def load_service(count):
+  '''
+  Calls per second of :func:`terra.compute.utils.load_service` by name, with
+  the resolution cache cleared before each call, and without
+  '''
+  utils.compute.__dict__['_connection'] = Compute()
+  service_name = f'{Service.__module__}.{Service.__name__}'
+
+  def uncached():
+    utils._service_cache.clear()
+    utils.load_service(service_name)
+
+  for name, function in (('uncached', uncached),
+                         ('cached', lambda: utils.load_service(service_name))):
+    print(f'  {name + ":":9} {calls_per_second(function, count):12.0f} '
+          'calls/s')
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+  parser.add_argument('-n', '--count', type=int, default=100000)
+  args = parser.parse_args()
+
+  print('Dispatch')
+  dispatch(args.count)
+  print('Load service')
+  load_service(args.count)
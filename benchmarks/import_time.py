@@ -0,0 +1,75 @@
+'''
+Benchmark the time it takes to ``import terra``, compared to starting the
+interpreter alone
+
+Run from the terra directory:
+
+.. code-block:: bash
+
+    python benchmarks/import_time.py [-n COUNT] [--importtime]
+'''
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def run(code, env):
+  start = time.perf_counter()
+  subprocess.run([sys.executable, '-c', code], env=env, check=True)
+  return time.perf_counter() - start
+
+
+def import_time(count):
+  '''
+  Median wall time of ``count`` interpreters importing terra, minus the
+  median for an interpreter that imports nothing. Also checks that the import
+  didn't leave any files in the temporary directory
+  '''
+  with tempfile.TemporaryDirectory() as temp_dir:
+    env = dict(os.environ, TMPDIR=temp_dir)
+    env.pop('TERRA_UNITTEST', None)
+
+    baseline = statistics.median(run('pass', env) for _ in range(count))
+    terra = statistics.median(run('import terra', env) for _ in range(count))
+    left_behind = os.listdir(temp_dir)
+
+  print(f'Interpreter:   {baseline * 1000:8.1f} ms')
+  print(f'import terra:  {(terra - baseline) * 1000:8.1f} ms')
+  print(f'Files left in the temporary directory: {len(left_behind)}')
+
+
+def import_profile():
+  '''
+  Print the slowest modules imported by ``import terra``, using
+  ``-X importtime``
+  '''
+  env = dict(os.environ)
+  env.pop('TERRA_UNITTEST', None)
+  output = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                           'import terra'], env=env, check=True,
+                          stderr=subprocess.PIPE,
+                          universal_newlines=True).stderr
+  rows = []
+  for line in output.splitlines()[1:]:
+    self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+    rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+  print(f'{"cumulative (us)":>16} {"self (us)":>10}  module')
+  for cumulative_us, self_us, name in sorted(rows, reverse=True)[:20]:
+    print(f'{cumulative_us:16d} {self_us:10d}  {name}')
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+  parser.add_argument('-n', '--count', type=int, default=20)
+  parser.add_argument('--importtime', action='store_true', default=False,
+                      help='Also print the slowest imports')
+  args = parser.parse_args()
+
+  import_time(args.count)
+  if args.importtime:
+    import_profile()
@@ -0,0 +1,91 @@
+'''
+Benchmarks for :mod:`terra.logger`
+
+Run from the terra directory:
+
+.. code-block:: bash
+
+    python benchmarks/logger.py [-n COUNT]
+'''
+
+import argparse
+import io
+import logging
+import os
+import time
+import timeit
+
+# Keep terra from setting up its log files on import
+os.environ['TERRA_UNITTEST'] = "1"
+
+from terra import logger  # noqa: E402
+
+
+def records_per_second(test_logger, count):
+  start = time.perf_counter()
+  for x in range(count):
+    test_logger.info('Record %d', x)
+  return count / (time.perf_counter() - start)
+
+
+def find_caller(count):
+  '''
+  Records per second with and without caller lookup, for a format that uses
+  the caller and one that doesn't
+  '''
+  test_logger = logger.getLogger('benchmark.find_caller')
+  test_logger.setLevel(logger.INFO)
+  handler = logging.StreamHandler(io.StringIO())
+  test_logger.logger.addHandler(handler)
+  test_logger.logger.propagate = False
+
+  for fmt in ('%(asctime)s %(filename)s:%(lineno)d %(message)s',
+              '%(asctime)s %(message)s'):
+    handler.setFormatter(logging.Formatter(fmt))
+    logger.Logger.find_caller = True
+    cached = records_per_second(test_logger, count)
+    logger.Logger.find_caller = logger.format_uses_caller(fmt)
+    skipped = records_per_second(test_logger, count)
+    print(f'{fmt!r}')
+    print(f'  caller lookup (cached): {cached:12.0f} records/s')
+    print(f'  skip_caller_lookup:     {skipped:12.0f} records/s')
+
+  logger.Logger.find_caller = True
+
+
+def calls_per_second(function, count):
+  return count / timeit.timeit(function, number=count)
+
+
+def adapter(count):
+  '''
+  Calls per second of disabled and enabled log calls, through terra's adapter
+  and through a plain :class:`logging.LoggerAdapter` merging the same ``extra``
+  into every call, which is how terra's adapter used to work
+  '''
+  test_logger = logger.getLogger('benchmark.adapter')
+  test_logger.setLevel(logger.INFO)
+  test_logger.logger.addHandler(logging.StreamHandler(io.StringIO()))
+  test_logger.logger.propagate = False
+  plain = logging.LoggerAdapter(test_logger.logger,
+                                logger.extra_logger_variables)
+
+  print('Disabled (debug1)')
+  for name, function in (('terra', lambda: test_logger.debug1('Record')),
+                         ('plain', lambda: plain.log(logger.DEBUG1,
+                                                     'Record'))):
+    print(f'  {name}: {calls_per_second(function, count):12.0f} calls/s')
+
+  print('Enabled (info)')
+  for name, function in (('terra', lambda: test_logger.info('Record')),
+                         ('plain', lambda: plain.info('Record'))):
+    print(f'  {name}: {calls_per_second(function, count):12.0f} calls/s')
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+  parser.add_argument('-n', '--count', type=int, default=100000)
+  args = parser.parse_args()
+
+  find_caller(args.count)
+  adapter(args.count)
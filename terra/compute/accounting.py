@@ -0,0 +1,374 @@
+'''
+Accounting of the resources each service used, see
+:option:`compute.accounting.enabled`.
+
+When enabled, the docker and virtualenv computes' ``run_service`` return a
+record of the run, which ``compute.run`` returns, and which is also saved to
+``{processing_dir}/service_usage/{name}.{pid}.json``:
+
+.. code-block:: python
+
+    {"service": "Classify", "pid": 1234, "returncode": 0,
+     "start_time": 1600000000.0, "elapsed": 12.3,
+     "user_time": 40.1, "system_time": 2.2,
+     "max_rss": 1073741824, "read_bytes": 4096, "write_bytes": 1048576}
+
+Times are in seconds and sizes in bytes. Usage that isn't known is ``null``.
+
+* virtualenv: The resource usage of the child process and its own children, by
+  waiting on it with :func:`os.wait4`. Not available on Windows, or with
+  ``compute.arun``, since the :mod:`asyncio` child watcher reaps the process
+* docker: The ``docker-compose run`` container is labeled, and its cgroup
+  statistics (CPU time, peak memory and block I/O) are read every
+  :option:`compute.accounting.interval` seconds while it runs. The container is
+  gone by the time ``docker-compose`` exits, so the last read is the one
+  recorded, and up to an interval of CPU time can be missed
+'''
+
+import json
+import os
+from subprocess import Popen, run, PIPE, DEVNULL
+import sys
+import threading
+import time
+import uuid
+
+from terra import settings
+import terra.compute.scheduler
+from terra.logger import getLogger
+logger = getLogger(__name__)
+
+usage_keys = ('user_time', 'system_time', 'max_rss', 'read_bytes',
+              'write_bytes')
+'''tuple: The resource usage in each record'''
+
+
+def is_record(value):
+  '''
+  Check if a value is a usage record, as returned by
+  :meth:`ServiceAccounting.record`
+  '''
+  return isinstance(value, dict) and all(
+      key in value for key in ('service', 'pid', 'returncode', 'start_time',
+                               'elapsed') + usage_keys)
+
+
+def _returncode(status):
+  # Like Popen, negative for a signal
+  if os.WIFSIGNALED(status):
+    return -os.WTERMSIG(status)
+  return os.WEXITSTATUS(status)
+
+
+def rusage_usage(rusage):
+  '''
+  Arguments
+  ---------
+  rusage : :class:`resource.struct_rusage`
+      The resource usage of a process
+
+  Returns
+  -------
+  dict
+      The usage, with :data:`usage_keys`
+  '''
+  # Linux counts the max RSS in KiB, macOS in bytes. Blocks are 512 bytes
+  max_rss = rusage.ru_maxrss
+  if sys.platform != 'darwin':
+    max_rss *= 1024
+  return {'user_time': rusage.ru_utime,
+          'system_time': rusage.ru_stime,
+          'max_rss': max_rss,
+          'read_bytes': rusage.ru_inblock * 512,
+          'write_bytes': rusage.ru_oublock * 512}
+
+
+def wait(process):
+  '''
+  Wait for a process to exit, like :meth:`subprocess.Popen.wait`, and get
+  its resource usage
+
+  Arguments
+  ---------
+  process : :class:`subprocess.Popen`
+      The process
+
+  Returns
+  -------
+  tuple
+      The return code, and the usage as returned by :func:`rusage_usage`, or
+      ``None`` where :func:`os.wait4` isn't available
+  '''
+  if not hasattr(os, 'wait4') or not isinstance(process, Popen) \
+     or process.returncode is not None:
+    return process.wait(), None
+
+  while True:
+    try:
+      _, status, rusage = os.wait4(process.pid, 0)
+      break
+    except InterruptedError:  # pragma: no cover
+      pass
+  # Tell Popen it has exited, so it doesn't wait on it again
+  process.returncode = _returncode(status)
+  return process.returncode, rusage_usage(rusage)
+
+
+def _read_words(path):
+  try:
+    with open(path, 'r') as fid:
+      return fid.read().split()
+  except OSError:
+    return None
+
+
+def _read_keys(path):
+  # A cgroup file of "key value" lines
+  words = _read_words(path)
+  if words is None:
+    return None
+  return dict(zip(words[::2], words[1::2]))
+
+
+def container_usage(container_id):
+  '''
+  Read the usage of a running docker container from its cgroup, under
+  :data:`terra.compute.scheduler.cgroup_root`
+
+  Arguments
+  ---------
+  container_id : str
+      The full id of the container
+
+  Returns
+  -------
+  dict
+      The usage, with :data:`usage_keys`. ``None`` when its cgroup is not
+      found
+  '''
+  root = terra.compute.scheduler.cgroup_root
+
+  # cgroup v2, with the systemd or cgroupfs driver
+  for group in (f'system.slice/docker-{container_id}.scope',
+                f'docker/{container_id}'):
+    group = os.path.join(root, group)
+    cpu = _read_keys(os.path.join(group, 'cpu.stat'))
+    if cpu is None:
+      continue
+    usage = dict.fromkeys(usage_keys)
+    usage['user_time'] = int(cpu['user_usec']) / 1e6
+    usage['system_time'] = int(cpu['system_usec']) / 1e6
+    # memory.peak is only in newer kernels
+    peak = _read_words(os.path.join(group, 'memory.peak'))
+    if peak:
+      usage['max_rss'] = int(peak[0])
+    io = _read_words(os.path.join(group, 'io.stat'))
+    if io is not None:
+      # "$MAJOR:$MINOR rbytes=... wbytes=..." per device
+      fields = [word.split('=', 1) for word in io if '=' in word]
+      usage['read_bytes'] = sum(int(value) for key, value in fields
+                                if key == 'rbytes')
+      usage['write_bytes'] = sum(int(value) for key, value in fields
+                                 if key == 'wbytes')
+    return usage
+
+  # cgroup v1
+  for driver in (f'docker/{container_id}',
+                 f'system.slice/docker-{container_id}.scope'):
+    user = _read_words(os.path.join(root, 'cpuacct', driver,
+                                    'cpuacct.usage_user'))
+    if user is None:
+      continue
+    usage = dict.fromkeys(usage_keys)
+    usage['user_time'] = int(user[0]) / 1e9
+    system = _read_words(os.path.join(root, 'cpuacct', driver,
+                                      'cpuacct.usage_sys'))
+    if system:
+      usage['system_time'] = int(system[0]) / 1e9
+    peak = _read_words(os.path.join(root, 'memory', driver,
+                                    'memory.max_usage_in_bytes'))
+    if peak:
+      usage['max_rss'] = int(peak[0])
+    # "$MAJOR:$MINOR Read|Write|... $BYTES" per device, and a "Total"
+    io = _read_words(os.path.join(root, 'blkio', driver,
+                                  'blkio.throttle.io_service_bytes'))
+    if io is not None:
+      lines = [io[i:i + 3] for i in range(0, len(io) - 2, 3)]
+      usage['read_bytes'] = sum(int(line[2]) for line in lines
+                                if line[1] == 'Read')
+      usage['write_bytes'] = sum(int(line[2]) for line in lines
+                                 if line[1] == 'Write')
+    return usage
+
+  return None
+
+
+def find_container(label):
+  '''
+  Arguments
+  ---------
+  label : str
+      A ``key=value`` label of the container
+
+  Returns
+  -------
+  str
+      The full id of the running container with the label, or ``None``
+  '''
+  output = run(['docker', 'ps', '--quiet', '--no-trunc', '--filter',
+                f'label={label}'], stdout=PIPE, stderr=DEVNULL,
+               universal_newlines=True, check=True).stdout.split()
+  return output[0] if output else None
+
+
+class ContainerMonitor:
+  '''
+  Reads the usage of a docker container on a thread, while it runs
+
+  Arguments
+  ---------
+  label : str
+      A ``key=value`` label unique to the container
+  interval : float
+      Seconds between reads
+  '''
+
+  def __init__(self, label, interval):
+    self.label = label
+    self.interval = interval
+    self.container_id = None
+    self.usage = None
+    self._stop = threading.Event()
+    self._thread = threading.Thread(target=self._monitor, daemon=True)
+
+  def start(self):
+    self._thread.start()
+
+  def stop(self):
+    '''
+    Stop reading, once the container has exited. Calling it again only
+    returns the usage
+
+    Returns
+    -------
+    dict
+        The last usage read, see :func:`container_usage`, or ``None``
+    '''
+    if self._stop.is_set():
+      return self.usage
+    self._stop.set()
+    self._thread.join()
+
+    # One last read, in case the container is still there
+    if self.container_id is not None:
+      try:
+        usage = container_usage(self.container_id)
+      except Exception:
+        logger.debug1('Could not read the usage of the container with the '
+                      f'label {self.label}', exc_info=True)
+      else:
+        if usage is not None:
+          self.usage = usage
+    return self.usage
+
+  def _monitor(self):
+    try:
+      while True:
+        if self.container_id is None:
+          self.container_id = find_container(self.label)
+        if self.container_id is not None:
+          usage = container_usage(self.container_id)
+          if usage is None and self.usage is not None:
+            # Gone
+            break
+          if usage is not None:
+            self.usage = usage
+        if self._stop.wait(self.interval):
+          break
+    except Exception:
+      logger.debug1('Could not read the usage of the container with the '
+                    f'label {self.label}', exc_info=True)
+
+
+class ServiceAccounting:
+  '''
+  Times a service run, and records its usage
+
+  Arguments
+  ---------
+  service_info : :class:`terra.compute.base.BaseService`
+      The service being run
+  '''
+
+  def __init__(self, service_info):
+    self.name = type(service_info).__qualname__
+    self.start_time = time.time()
+    self._start = time.perf_counter()
+    self.label = f'terra.run={uuid.uuid4().hex}'
+    '''str: A ``key=value`` docker label unique to this run'''
+    self.monitor = None
+
+  def monitor_container(self, interval):
+    '''
+    Start a :class:`ContainerMonitor` for a container run with the
+    :attr:`label`
+    '''
+    self.monitor = ContainerMonitor(self.label, interval)
+    self.monitor.start()
+
+  def record(self, pid, returncode, usage=None):
+    '''
+    Record the run, once the service has exited
+
+    Arguments
+    ---------
+    pid : int
+        The process id of the service
+    returncode : int
+        The exit code of the service
+    usage : dict, optional
+        The resource usage of the service, with :data:`usage_keys`. Read from
+        the container monitor, if any, when not given
+
+    Returns
+    -------
+    dict
+        The record, also saved in the processing dir
+    '''
+    elapsed = time.perf_counter() - self._start
+    if usage is None and self.monitor is not None:
+      usage = self.monitor.stop()
+    record = {'service': self.name, 'pid': pid, 'returncode': returncode,
+              'start_time': self.start_time, 'elapsed': elapsed}
+    record.update(usage or dict.fromkeys(usage_keys))
+
+    usage_dir = os.path.join(settings.processing_dir, 'service_usage')
+    try:
+      os.makedirs(usage_dir, exist_ok=True)
+      with open(os.path.join(usage_dir, f'{self.name}.{pid}.json'),
+                'w') as fid:
+        json.dump(record, fid)
+    except OSError:
+      logger.warning(f'Could not save the usage of {self.name}',
+                     exc_info=True)
+    return record
+
+
+def service_accounting(service_info):
+  '''
+  Get a :class:`ServiceAccounting` for a service, if
+  :option:`compute.accounting.enabled` is set
+
+  Arguments
+  ---------
+  service_info : :class:`terra.compute.base.BaseService`
+      The service being run
+
+  Returns
+  -------
+  :class:`ServiceAccounting`
+      ``None`` when not accounting
+  '''
+  if not settings.compute.accounting.enabled:
+    return None
+  return ServiceAccounting(service_info)
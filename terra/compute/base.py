@@ -1,6 +1,14 @@
+import asyncio
+from collections.abc import MutableMapping
+import concurrent.futures
+import functools
 import os
+import time
 
 import terra.compute.utils
+import terra.compute.cache
+from terra.core.signals import pre_service_run, post_service_run
+from terra.executor.thread import ThreadPoolExecutor
 
 
 class ServiceRunFailed(Exception):
@@ -8,6 +16,206 @@ class ServiceRunFailed(Exception):
   '''
 
 
+_environ_data = None
+_environ_snapshot = {}
+
+
+def environ_snapshot():
+  '''
+  Get a copy of :data:`os.environ` shared by every caller, and only copied
+  again once :data:`os.environ` has changed. It must not be modified
+
+  Returns
+  -------
+  dict
+      The snapshot
+  '''
+  global _environ_data, _environ_snapshot
+  # Comparing the raw data is much cheaper than decoding every variable again
+  data = getattr(os.environ, '_data', None)
+  if data is None or data != _environ_data:
+    _environ_snapshot = os.environ.copy()
+    _environ_data = None if data is None else data.copy()
+  return _environ_snapshot
+
+
+class EnvOverlay(MutableMapping):
+  '''
+  An environment that only stores its modifications over a shared ``base``
+  environment, rather than a full copy
+
+  Use ``dict(env)`` to get the full environment, e.g. to pass to
+  :class:`subprocess.Popen`.
+
+  Arguments
+  ---------
+  base : dict, optional
+      The environment being modified, which is never changed. Defaults to
+      :func:`environ_snapshot`
+  '''
+
+  def __init__(self, base=None):
+    self.base = environ_snapshot() if base is None else base
+    self.changes = {}
+    self.deleted = set()
+
+  def __getitem__(self, key):
+    try:
+      return self.changes[key]
+    except KeyError:
+      if key in self.deleted:
+        raise
+    return self.base[key]
+
+  def __setitem__(self, key, value):
+    self.changes[key] = value
+    self.deleted.discard(key)
+
+  def __delitem__(self, key):
+    if key not in self:
+      raise KeyError(key)
+    self.changes.pop(key, None)
+    if key in self.base:
+      self.deleted.add(key)
+
+  def __iter__(self):
+    for key in self.base:
+      if key not in self.deleted and key not in self.changes:
+        yield key
+    yield from self.changes
+
+  def __len__(self):
+    return len(self.base) - len(self.deleted) + \
+        sum(1 for key in self.changes if key not in self.base)
+
+  def __repr__(self):
+    return f'{type(self).__name__}(changes={self.changes!r}, ' \
+           f'deleted={self.deleted!r})'
+
+  def copy(self):
+    env = type(self)(self.base)
+    env.changes = self.changes.copy()
+    env.deleted = self.deleted.copy()
+    return env
+
+  def diff(self):
+    '''
+    Returns
+    -------
+    list
+        A line describing each modification over the base environment
+    '''
+    lines = [f'- {key}: {self.base[key]}' for key in sorted(self.deleted)]
+    for key, value in sorted(self.changes.items()):
+      if key not in self.base:
+        lines.append(f'+ {key}: {value}')
+      elif self.base[key] != value:
+        lines.append(f'~ {key}: {self.base[key]} -> {value}')
+    return lines
+
+
+async def _call_async(obj, name, *args, **kwargs):
+  '''
+  Await ``obj.a{name}`` if it exists, otherwise call ``obj.{name}``, if it
+  exists, in the running loop's default executor
+  '''
+  function = getattr(obj, 'a' + name, None)
+  if function is not None:
+    return await function(*args, **kwargs)
+
+  function = getattr(obj, name, None)
+  if function is None:
+    return None
+  return await asyncio.get_running_loop().run_in_executor(
+      None, functools.partial(function, *args, **kwargs))
+
+
+class _ServiceRun:
+  '''
+  What the ``run`` command and :meth:`BaseCompute.arun` share around running a
+  service: the :data:`terra.core.signals.pre_service_run` and
+  :data:`terra.core.signals.post_service_run` signals, and the cache of its
+  results. Other commands get neither, with ``enabled`` false
+  '''
+
+  # Made for every run, keep it cheap
+  __slots__ = ('compute', 'service_info', 'enabled', 'cache', 'start',
+               'start_time')
+
+  def __init__(self, compute, service_info, enabled=True):
+    self.compute = compute
+    self.service_info = service_info
+    self.enabled = enabled
+    self.cache = None
+    self.start = None
+
+  def _send(self, signal, **kwargs):
+    signal.send(sender=type(self.compute), compute=self.compute,
+                service=self.service_info, start_time=self.start_time,
+                **kwargs)
+
+  def __enter__(self):
+    # Only pay for the timing when someone is listening
+    if self.enabled and (pre_service_run.receivers
+                         or post_service_run.receivers):
+      self.start_time = time.time()
+      self.start = time.perf_counter()
+      self._send(pre_service_run)
+    return self
+
+  def __exit__(self, exc_type, exception, traceback):
+    if self.start is not None and (exc_type is None
+                                   or issubclass(exc_type, Exception)):
+      self._send(post_service_run, elapsed=time.perf_counter() - self.start,
+                 exception=exception)
+
+  def restore(self):
+    '''
+    Restore the results of the service from the cache, when cached
+
+    Returns
+    -------
+    tuple
+        Whether they were restored, and the cached return value
+    '''
+    self._find_cache()
+    if self.cache is None:
+      return False, None
+    return self.cache.restore()
+
+  def store(self, rv):
+    '''
+    Add the results of the service to the cache, when caching
+    '''
+    if self.cache is not None:
+      self.cache.store(rv)
+
+  def _find_cache(self):
+    # Only services with outputs can be cached
+    if self.enabled and getattr(self.service_info, 'outputs', None):
+      self.cache = terra.compute.cache.service_cache(self.service_info)
+
+  async def arestore(self):
+    '''
+    The :mod:`asyncio` version of :meth:`restore`. Hashing and copying the
+    files is done in the running loop's default executor, so it doesn't
+    block the loop
+    '''
+    self._find_cache()
+    if self.cache is None:
+      return False, None
+    return await asyncio.get_running_loop().run_in_executor(
+        None, self.cache.restore)
+
+  async def astore(self, rv):
+    '''
+    The :mod:`asyncio` version of :meth:`store`
+    '''
+    if self.cache is not None:
+      await asyncio.get_running_loop().run_in_executor(
+          None, self.cache.store, rv)
+
+
 class BaseService:
   '''
   The base class for all Terra Service definitions
@@ -18,12 +226,43 @@ class BaseService:
   Service definitions can define a ``pre_{command}`` and ``post_{command}``
   function that will be called before and after a ``{command}Service`` call,
   if they exist
+
+  Services can declare the resources they need, for
+  :class:`terra.compute.scheduler.Scheduler` to only run as many at the same
+  time as the node has room for, and the files they read and write, for
+  :class:`terra.compute.dag.ServiceDag` to work out which services depend on
+  which
   '''
 
+  cpus = 1
+  '''float: The number of CPU cores the service uses'''
+
+  memory = 0
+  '''int: The bytes of memory the service uses'''
+
+  resources = ()
+  '''tuple: Names of resources the service needs exclusive use of, e.g. a
+  ``gpu``. No two services using the same resource are run at the same time'''
+
+  inputs = ()
+  '''tuple: The files and directories the service reads. Either paths, or
+  names of settings ending in a filename suffix, e.g.
+  ``'stage1.output_dir'``'''
+
+  outputs = ()
+  '''tuple: The files and directories the service writes, the same as
+  :attr:`inputs`'''
+
+  cache_settings = None
+  '''tuple: Names of the settings (e.g. ``'stage1'``) the results of the
+  service depend on, for :mod:`terra.compute.cache`. ``None`` for all the
+  settings except :data:`terra.compute.cache.ignored_settings`'''
+
   def __init__(self):
-    self.env = os.environ.copy()
+    self.env = EnvOverlay()
+    ''' The processes environment variables, as modified for a service, see
+    :class:`EnvOverlay` '''
     self.volumes = []
-    ''' A copy of the processes environment variables local to a service '''
 
   def add_volume(self, local, remote):
     self.volumes.append((local, remote))
@@ -56,6 +295,8 @@ class BaseCompute:
         raise AlreadyRegisteredException(f'Service {service_name} already '
                                          'registered')
       services[service_name][cls] = impl
+      # A registration can change what a service resolves to
+      terra.compute.utils._service_cache.clear()
 
       return impl
 
@@ -71,38 +312,117 @@ class BaseCompute:
     except AttributeError:
       raise AttributeError(f'Compute command "{name}" does not have a service '
                            f'implementation "{implementation}"') from None
-    else:
-      def defaultCommand(self, service_class, *args, **kwargs):
 
-        service_info = terra.compute.utils.load_service(service_class)
+    # Install the command on the class, so the next call is a plain method
+    # call, without coming back here
+    command = type(self)._command(name)
+    setattr(type(self), name, command)
+    return command.__get__(self, type(self))
+
+  @classmethod
+  def _command(cls, name):
+    '''
+    Create the default command function that calls a service's
+    ``{name}_service`` implementation
+    '''
+    implementation = name + '_service'
+    send_signals = name == 'run'
+
+    def defaultCommand(self, service_class, *args, **kwargs):
+
+      service_info = terra.compute.utils.load_service(service_class,
+                                                      type(self))
+
+      with _ServiceRun(self, service_info, send_signals) as service_run:
+        hit, rv = service_run.restore()
+        if not hit:
+          # Check and call pre_ call
+          pre_call = getattr(service_info, 'pre_' + name, None)
+          if pre_call:
+            pre_call(*args, **kwargs)
+
+          # Call command implementation
+          rv = self.__getattribute__(implementation)(
+              service_info, *args, **kwargs)
+
+          # Check and call post_ call
+          post_call = getattr(service_info, 'post_' + name, None)
+          if post_call:
+            post_call(*args, **kwargs)
+
+          service_run.store(rv)
 
-        # Check and call pre_ call
-        pre_call = getattr(service_info, 'pre_' + name, None)
-        if pre_call:
-          pre_call(*args, **kwargs)
+      return rv
 
-        # Call command implementation
-        rv = self.__getattribute__(implementation)(
-            service_info, *args, **kwargs)
+    defaultCommand.__doc__ = f'''The {name} command for {cls.__qualname__}
 
-        # Check and call post_ call
-        post_call = getattr(service_info, 'post_' + name, None)
-        if post_call:
-          post_call(*args, **kwargs)
+      The {name} command will call the a service's pre_{name} if it has one,
+      followed by the {implementation}, and then the service's post_{name} if
+      it has one.
+      Calls {implementation}'''  # noqa
+    defaultCommand.__name__ = name
+    defaultCommand.__qualname__ = cls.__qualname__ + '.' + name
 
-        return rv
+    return defaultCommand
 
-      defaultCommand.__doc__ = f'''The {name} command for {__class__.__qualname__}
+  async def arun(self, service_class, *args, **kwargs):
+    '''
+    The :mod:`asyncio` version of the ``run`` command, to supervise many
+    services from one event loop
+
+    Coroutine versions are used when they exist: the service's ``apre_run``
+    and ``apost_run``, and the compute's ``arun_service`` (e.g. the docker and
+    virtualenv computes, using :func:`asyncio.create_subprocess_exec`).
+    Otherwise the regular ``pre_run``, ``post_run`` and ``run_service`` are
+    called in the event loop's default executor, so existing services work
+    unchanged without blocking the loop.
+    '''
+    service_info = terra.compute.utils.load_service(service_class,
+                                                    type(self))
+
+    with _ServiceRun(self, service_info) as service_run:
+      hit, rv = await service_run.arestore()
+      if not hit:
+        await _call_async(service_info, 'pre_run', *args, **kwargs)
+        rv = await _call_async(self, 'run_service', service_info, *args,
+                               **kwargs)
+        await _call_async(service_info, 'post_run', *args, **kwargs)
+        await service_run.astore(rv)
 
-        The {name} command will call the a service's pre_{name} if it has one,
-        followed by the {implementation}, and then the service's post_{name} if
-        it has one.
-        Calls {implementation}'''  # noqa
-      defaultCommand.__name__ = name
-      defaultCommand.__qualname__ = type(self).__qualname__ + '.' + name
+    return rv
+
+  def run_many(self, services, max_parallel=None, as_completed=False):
+    '''
+    Run many services at the same time, on threads, each with :meth:`run`
+    (``pre_run``, ``run_service`` and then ``post_run``)
+
+    Arguments
+    ---------
+    services : list
+        The services to run, as accepted by :meth:`run`. Instances must not be
+        repeated
+    max_parallel : int, optional
+        The most services run at the same time. Defaults to the number of CPUs
+    as_completed : bool, optional
+        Return the futures in the order they are done, instead of the order
+        the services were given
 
-      # bind function and return it
-      return defaultCommand.__get__(self, type(self))
+    Returns
+    -------
+    list
+        A :class:`concurrent.futures.Future` for each service, in the order
+        given. The result of a future is the return value of :meth:`run`, or
+        the exception it raised, which does not stop the other services. When
+        ``as_completed``, an iterator that yields the futures as they are done
+    '''
+    executor = ThreadPoolExecutor(max_parallel or os.cpu_count() or 1)
+    futures = [executor.submit(self.run, service) for service in services]
+    # The submitted services still run, and the threads exit when done
+    executor.shutdown(wait=False)
+
+    if as_completed:
+      return concurrent.futures.as_completed(futures)
+    return futures
 
   def run_service(self, *args, **kwargs):
     '''
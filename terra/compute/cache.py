@@ -0,0 +1,297 @@
+'''
+A cache of service results, to skip running a service again on the same
+settings and inputs, see :option:`compute.cache.enabled`.
+
+Only services with :attr:`terra.compute.base.BaseService.outputs` are cached,
+since their outputs are what is restored. A service's key is a hash of:
+
+* The service class
+* The service's ``command`` line, and the compute command (``run``)
+* Its settings, see :attr:`terra.compute.base.BaseService.cache_settings`
+* The size and modification time of every file of its
+  :attr:`terra.compute.base.BaseService.inputs`, or their contents with
+  :option:`compute.cache.content_hash`
+
+After a successful run, the outputs are hard linked into
+``{cache_dir}/{key}``, next to a ``manifest.json`` with the return value. The
+next time a service has the same key, its outputs are linked back in place,
+and ``pre_run``, ``run_service`` and ``post_run`` are all skipped. Files are
+copied instead when they can't be linked, e.g. across file systems.
+
+A service with an output that is, contains or is in the cache directory
+(e.g. the ``processing_dir``, where the cache is by default) is never cached,
+restoring it would remove the cache. With :option:`compute.accounting.enabled`,
+the usage record a run returns is not stored, so a hit returns ``None`` rather
+than the usage of a run that didn't happen.
+
+.. note::
+
+    Since the cached files are hard links, a service must replace its outputs
+    rather than modifying them in place, or the cached copy changes too.
+'''
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from terra import settings
+from terra.core.settings import TerraJSONEncoder
+import terra.compute.accounting
+import terra.compute.utils
+from terra.logger import getLogger
+logger = getLogger(__name__)
+
+ignored_settings = ('compute', 'logging', 'processing_dir', 'status_file',
+                    'config_file', 'resume', 'unittest', 'executor')
+'''tuple: The settings not part of a service's key by default, since they
+don't change its results'''
+
+stats = {'hits': 0, 'misses': 0}
+'''dict: The number of cache hits and misses, since terra started'''
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+  with _stats_lock:
+    stats[name] += 1
+    return dict(stats)
+
+
+def _link(source, destination):
+  try:
+    os.link(source, destination)
+  except OSError:
+    shutil.copy2(source, destination)
+
+
+def _copy(source, destination):
+  # Hard link a file or directory tree
+  if os.path.isdir(source):
+    shutil.copytree(source, destination, copy_function=_link)
+  else:
+    _link(source, destination)
+
+
+def _remove(path):
+  if os.path.isdir(path) and not os.path.islink(path):
+    shutil.rmtree(path)
+  elif os.path.lexists(path):
+    os.remove(path)
+
+
+def _files(path):
+  # Every file under path, or path itself
+  if not os.path.isdir(path):
+    yield path
+    return
+  for root, dirs, files in os.walk(path):
+    dirs.sort()
+    for name in sorted(files):
+      yield os.path.join(root, name)
+
+
+class ServiceCache:
+  '''
+  The cache entry of a service run
+
+  Arguments
+  ---------
+  service_info : :class:`terra.compute.base.BaseService`
+      The service being run
+  cache_dir : str
+      The directory of the cache
+  content_hash : bool, optional
+      Hash the contents of the input files, instead of their size and
+      modification time
+  verb : str, optional
+      The compute command being run, e.g. ``run``
+
+  Raises
+  ------
+  ValueError
+      When an output is, contains or is in the cache directory
+  '''
+
+  def __init__(self, service_info, cache_dir, content_hash=False,
+               verb='run'):
+    self.service_info = service_info
+    self.cache_dir = cache_dir
+    self.content_hash = content_hash
+    self.verb = verb
+    self.outputs = sorted(
+        terra.compute.utils.resolve_paths(service_info.outputs))
+    self._key = None
+
+    # Restoring would remove the cache, and storing copy it into itself
+    cache_dir = os.path.normpath(os.path.abspath(cache_dir))
+    for output in self.outputs:
+      try:
+        common = os.path.commonpath([output, cache_dir])
+      except ValueError:
+        # e.g. on different drives
+        continue
+      if common in (output, cache_dir):
+        raise ValueError(f'The output {output} of {self.name} overlaps the '
+                         f'cache directory {cache_dir}')
+
+  @property
+  def name(self):
+    return type(self.service_info).__qualname__
+
+  def _settings(self):
+    config = TerraJSONEncoder.serializableSettings(settings)
+    names = self.service_info.cache_settings
+    if names is None:
+      return {key: value for key, value in config.items()
+              if key not in ignored_settings}
+
+    subtrees = {}
+    for name in names:
+      value = config
+      for part in name.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+      subtrees[name] = value
+    return subtrees
+
+  def _fingerprint(self, path):
+    try:
+      if not self.content_hash:
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+      digest = hashlib.sha256()
+      with open(path, 'rb') as fid:
+        for chunk in iter(lambda: fid.read(1 << 20), b''):
+          digest.update(chunk)
+      return digest.hexdigest()
+    except OSError:
+      return None
+
+  @property
+  def key(self):
+    '''
+    str: The hash of everything the results of the service depend on
+    '''
+    if self._key is None:
+      service_class = type(self.service_info)
+      inputs = {path: self._fingerprint(path)
+                for name in sorted(terra.compute.utils.resolve_paths(
+                    self.service_info.inputs))
+                for path in _files(name)}
+      description = {
+          'service': f'{service_class.__module__}.'
+                     f'{service_class.__qualname__}',
+          'verb': self.verb,
+          'command': getattr(self.service_info, 'command', None),
+          'settings': self._settings(),
+          'inputs': inputs,
+          'outputs': self.outputs}
+      self._key = hashlib.sha256(json.dumps(
+          description, sort_keys=True, default=str).encode()).hexdigest()
+    return self._key
+
+  @property
+  def entry_dir(self):
+    '''
+    str: The directory of the cache entry
+    '''
+    return os.path.join(self.cache_dir, self.key[:2], self.key)
+
+  def restore(self):
+    '''
+    Restore the outputs of the service, if in the cache
+
+    Returns
+    -------
+    tuple
+        Whether the outputs were restored, and the return value of the run
+        that is cached
+    '''
+    manifest_file = os.path.join(self.entry_dir, 'manifest.json')
+    try:
+      with open(manifest_file, 'r') as fid:
+        manifest = json.load(fid)
+    except (OSError, ValueError):
+      counts = _count('misses')
+      logger.info(f'Cache miss for {self.name} ({self.key[:12]}), '
+                  f'{counts["hits"]} hits, {counts["misses"]} misses')
+      return False, None
+
+    for index, output in enumerate(self.outputs):
+      stored = os.path.join(self.entry_dir, str(index))
+      _remove(output)
+      if os.path.lexists(stored):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        _copy(stored, output)
+
+    counts = _count('hits')
+    logger.info(f'Cache hit for {self.name} ({self.key[:12]}), '
+                f'{counts["hits"]} hits, {counts["misses"]} misses')
+    return True, manifest['result']
+
+  def store(self, result):
+    '''
+    Add the outputs of a successful run to the cache
+
+    Arguments
+    ---------
+    result
+        The return value of the run, which has to be json serializable
+    '''
+    if terra.compute.accounting.is_record(result):
+      # The usage of this run, not of the runs restored later
+      result = None
+    try:
+      manifest = json.dumps({'service': self.name, 'outputs': self.outputs,
+                             'result': result})
+    except TypeError:
+      logger.warning(f'Not caching {self.name}, the result {result!r} is not '
+                     'json serializable')
+      return
+
+    # Filled in under a temporary name, and then renamed, so that a partial
+    # entry is never seen
+    entry_dir = self.entry_dir
+    temp_dir = f'{entry_dir}.{os.getpid()}.{threading.get_ident()}'
+    os.makedirs(temp_dir)
+    try:
+      for index, output in enumerate(self.outputs):
+        if os.path.lexists(output):
+          _copy(output, os.path.join(temp_dir, str(index)))
+      with open(os.path.join(temp_dir, 'manifest.json'), 'w') as fid:
+        fid.write(manifest)
+      os.rename(temp_dir, entry_dir)
+    except OSError:
+      # e.g. the same entry was just stored by another service
+      logger.debug1(f'Could not store the cache entry of {self.name}',
+                    exc_info=True)
+      shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def service_cache(service_info, verb='run'):
+  '''
+  Get a :class:`ServiceCache` for a service, if
+  :option:`compute.cache.enabled` is set and it has outputs
+
+  Arguments
+  ---------
+  service_info : :class:`terra.compute.base.BaseService`
+      The service being run
+  verb : str, optional
+      The compute command being run, e.g. ``run``
+
+  Returns
+  -------
+  :class:`ServiceCache`
+      ``None`` when not caching
+  '''
+  cache = settings.compute.cache
+  if not cache.enabled or not service_info.outputs:
+    return None
+  try:
+    return ServiceCache(service_info, cache.cache_dir,
+                        content_hash=cache.content_hash, verb=verb)
+  except ValueError as error:
+    logger.warning(f'Not caching: {error}')
+    return None
@@ -0,0 +1,297 @@
+'''
+Run services that depend on each other, as many at the same time as their
+dependencies allow.
+
+Rather than calling ``compute.run`` on one service after the other, the
+services are added to a :class:`ServiceDag` with what they depend on, and
+run with a :class:`terra.compute.scheduler.Scheduler`. A service is started as
+soon as all the services it depends on have finished, and there is room for
+it on the node. When more services are ready than there is room for, the ones
+with the longest chain of services still to run after them (the critical path)
+are started first.
+
+Dependencies are either given explicitly, or worked out from the
+:attr:`terra.compute.base.BaseService.inputs` and
+:attr:`terra.compute.base.BaseService.outputs` of the services: a service
+depends on every service that writes a file or directory it reads, or a
+directory containing it. These are read from the service instances that are
+run, loaded for the compute each service is routed to, when the dag is run.
+
+.. code-block:: python
+
+    from terra.compute.dag import ServiceDag
+
+    dag = ServiceDag()
+    segment = dag.add(Segment)
+    dag.add(Classify, after=[segment])
+    dag.add(Report)  # Reads Classify's output_dir
+    results = dag.run()
+'''
+
+import os
+import queue
+
+import terra.compute.utils
+from terra.compute.scheduler import Scheduler
+from terra.logger import getLogger
+logger = getLogger(__name__)
+
+
+class DagFailed(Exception):
+  '''
+  Exception thrown when services of a :class:`ServiceDag` fail
+
+  Attributes
+  ----------
+  failed : dict
+      The exception of each :class:`DagNode` that failed
+  skipped : list
+      The :class:`DagNode` s that were never run
+  results : dict
+      The results of the :class:`DagNode` s that succeeded
+  '''
+
+  def __init__(self, failed, skipped, results):
+    self.failed = failed
+    self.skipped = skipped
+    self.results = results
+    super().__init__(f'{len(failed)} service(s) failed: '
+                     f'{", ".join(node.name for node in failed)}, '
+                     f'{len(skipped)} not run')
+
+
+class DagNode:
+  '''
+  A service in a :class:`ServiceDag`, returned by :meth:`ServiceDag.add`
+  '''
+
+  def __init__(self, service, service_info, after, inputs, outputs):
+    # As given, so the scheduler routes and loads it for its compute
+    self.spec = service
+    self.service = service_info
+    '''The service instance. Replaced by the one loaded for the compute it
+    runs on when the dag is run, which is the one run'''
+    self.after = list(after)
+    self._inputs = inputs
+    self._outputs = outputs
+
+  @property
+  def inputs(self):
+    '''
+    list: The files and directories the service reads, by default the
+    service's :attr:`terra.compute.base.BaseService.inputs`
+    '''
+    return self.service.inputs if self._inputs is None else self._inputs
+
+  @property
+  def outputs(self):
+    '''
+    list: The files and directories the service writes, by default the
+    service's :attr:`terra.compute.base.BaseService.outputs`
+    '''
+    return self.service.outputs if self._outputs is None else self._outputs
+
+  @property
+  def name(self):
+    return type(self.service).__qualname__
+
+  def __repr__(self):
+    return f'<{type(self).__name__} {self.name}>'
+
+
+def _overlaps(first, second):
+  # The same path, or one contains the other
+  first = os.path.abspath(first)
+  second = os.path.abspath(second)
+  try:
+    return os.path.commonpath([first, second]) in (first, second)
+  except ValueError:
+    # e.g. on different drives
+    return False
+
+
+class ServiceDag:
+  '''
+  A set of services and the services each depends on, see :mod:`the module
+  <terra.compute.dag>`
+  '''
+
+  def __init__(self):
+    self.nodes = []
+
+  def add(self, service, after=(), inputs=None, outputs=None):
+    '''
+    Add a service
+
+    Arguments
+    ---------
+    service : str or class or instance
+        The service, as accepted by :func:`terra.compute.utils.load_service`
+    after : list, optional
+        The :class:`DagNode` s that have to finish before this service is run,
+        on top of what is worked out from the inputs and outputs
+    inputs : list, optional
+        The files and directories the service reads, instead of the service's
+        :attr:`terra.compute.base.BaseService.inputs`
+    outputs : list, optional
+        The files and directories the service writes, instead of the service's
+        :attr:`terra.compute.base.BaseService.outputs`
+
+    Returns
+    -------
+    :class:`DagNode`
+        The node of the service, to depend on and look the result up with
+    '''
+    node = DagNode(service, terra.compute.utils.load_service(service), after,
+                   inputs, outputs)
+    self.nodes.append(node)
+    return node
+
+  def dependencies(self):
+    '''
+    Work out what each service depends on. Settings are looked up now, so
+    that the settings are the ones the services will be run with
+
+    Returns
+    -------
+    dict
+        The set of :class:`DagNode` s each :class:`DagNode` depends on
+    '''
+    outputs = {node: terra.compute.utils.resolve_paths(node.outputs)
+               for node in self.nodes}
+    depends = {}
+    for node in self.nodes:
+      inputs = terra.compute.utils.resolve_paths(node.inputs)
+      depends[node] = set(node.after)
+      for other in self.nodes:
+        if other is not node and any(_overlaps(input_, output)
+                                     for input_ in inputs
+                                     for output in outputs[other]):
+          depends[node].add(other)
+    return depends
+
+  def _order(self, depends):
+    # Topological order, in the order added where there is a choice
+    waiting = {node: len(depends[node]) for node in self.nodes}
+    dependents = {node: [] for node in self.nodes}
+    for node in self.nodes:
+      for dependency in depends[node]:
+        dependents[dependency].append(node)
+
+    order = [node for node in self.nodes if not waiting[node]]
+    for node in order:
+      for dependent in dependents[node]:
+        waiting[dependent] -= 1
+        if not waiting[dependent]:
+          order.append(dependent)
+
+    if len(order) < len(self.nodes):
+      cycle = [node.name for node in self.nodes if waiting[node]]
+      raise ValueError('Services depend on each other in a cycle: '
+                       f'{", ".join(cycle)}')
+    return order, dependents
+
+  def run(self, scheduler=None, keep_going=False):
+    '''
+    Run all the services, each once the services it depends on are done
+
+    Arguments
+    ---------
+    scheduler : :class:`terra.compute.scheduler.Scheduler`, optional
+        The scheduler to run the services with. Defaults to a new
+        :class:`terra.compute.scheduler.Scheduler` on the default compute
+    keep_going : bool, optional
+        When a service fails, keep running the services that don't depend on
+        it. By default, no more services are started after the first failure,
+        and the services already running are waited for
+
+    Returns
+    -------
+    dict
+        The result of each :class:`DagNode`
+
+    Raises
+    ------
+    DagFailed
+        When any of the services failed, once the services still running have
+        finished
+    ValueError
+        When the services depend on each other in a cycle
+    '''
+    owned = scheduler is None
+    if owned:
+      scheduler = Scheduler()
+
+    try:
+      # The instances that are run, so their inputs and outputs are the ones
+      # the dependencies are worked out from
+      for node in self.nodes:
+        node.service = scheduler.load_service(node.spec)
+      depends = self.dependencies()
+      order, dependents = self._order(depends)
+    except BaseException:
+      if owned:
+        scheduler.shutdown()
+      raise
+
+    # Critical path: the most services that still have to run, one after the
+    # other, from this one on
+    priority = {}
+    for node in reversed(order):
+      priority[node] = 1 + max((priority[dependent]
+                                for dependent in dependents[node]), default=0)
+
+    waiting = {node: len(depends[node]) for node in self.nodes}
+    running = {}
+    done = queue.Queue()
+    results = {}
+    failed = {}
+    stopping = False
+
+    def submit(nodes):
+      futures = scheduler.run_many([node.service for node in nodes],
+                                   priorities=[priority[node]
+                                               for node in nodes])
+      for node, future in zip(nodes, futures):
+        running[future] = node
+        future.add_done_callback(done.put)
+
+    logger.info(f'Running {len(order)} services')
+    try:
+      submit([node for node in order if not waiting[node]])
+      while running:
+        future = done.get()
+        node = running.pop(future)
+        if future.cancelled():
+          continue
+
+        error = future.exception()
+        if error is not None:
+          logger.error(f'{node.name} failed: {error!r}')
+          failed[node] = error
+          if not keep_going and not stopping:
+            stopping = True
+            # Take back the services that haven't started yet
+            for other in running:
+              other.cancel()
+          continue
+
+        results[node] = future.result()
+        if stopping:
+          continue
+        ready = []
+        for dependent in dependents[node]:
+          waiting[dependent] -= 1
+          if not waiting[dependent]:
+            ready.append(dependent)
+        if ready:
+          submit(ready)
+    finally:
+      if owned:
+        scheduler.shutdown()
+
+    if failed:
+      skipped = [node for node in order
+                 if node not in results and node not in failed]
+      raise DagFailed(failed, skipped, results)
+    return results
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import posixpath
 import ntpath
@@ -18,8 +19,12 @@ from vsi.tools.python import nested_patch
 from terra import settings
 from terra.core.settings import TerraJSONEncoder, filename_suffixes
 from terra.compute import compute
-from terra.compute.base import BaseService, BaseCompute, ServiceRunFailed
-from terra.logger import getLogger, DEBUG1
+from terra.compute.base import (
+  BaseService, BaseCompute, EnvOverlay, ServiceRunFailed
+)
+from terra.logger import getLogger, log_server_env, DEBUG1
+from terra.logger.capture import service_capture
+from terra.compute.accounting import service_accounting
 logger = getLogger(__name__)
 
 
@@ -65,7 +70,29 @@ class Compute(BaseCompute):
         Arguments sent to ``Popen`` command
     '''
 
-    logger.debug('Running: ' + ' '.join(
+    command, kwargs = self._just_command(*args, **kwargs)
+    pid = Popen(command, **kwargs)
+    return pid
+
+  async def ajust(self, *args, **kwargs):
+    '''
+    The :mod:`asyncio` version of :meth:`just`
+
+    Returns
+    -------
+    :class:`asyncio.subprocess.Process`
+        The ``just`` process
+    '''
+
+    command, kwargs = self._just_command(*args, **kwargs)
+    return await asyncio.create_subprocess_exec(*command, **kwargs)
+
+  def _just_command(self, *args, **kwargs):
+    '''
+    Returns the command and ``Popen`` arguments for :meth:`just`
+    '''
+
+    logger.debug_lazy(lambda: 'Running: ' + ' '.join(
         [quote(x) for x in ('just',) + args]))
 
     just_env = kwargs.pop('env', env).copy()
@@ -74,7 +101,10 @@ class Compute(BaseCompute):
     just_env['JUSTFILE'] = justfile
 
     if logger.getEffectiveLevel() <= DEBUG1:
-      dd = dict_diff(env, just_env)[3]
+      if isinstance(just_env, EnvOverlay):
+        dd = just_env.diff()
+      else:
+        dd = dict_diff(env, just_env)[3]
       if dd:
         logger.debug1('Environment Modification:\n' + '\n'.join(dd))
 
@@ -86,9 +116,9 @@ class Compute(BaseCompute):
     # Microsoft probably has a special exception for the word "bash" that
     # calls WSL bash on execute :(
     kwargs['executable'] = distutils.spawn.find_executable('bash')
+    kwargs['env'] = dict(just_env)
     # Have to call bash for windows compatibility, no shebang support
-    pid = Popen(('bash', 'just') + args, env=just_env, **kwargs)
-    return pid
+    return ('bash', 'just') + args, kwargs
 
   def run_service(self, service_info):
     '''
@@ -101,15 +131,87 @@ class Compute(BaseCompute):
             -f {service_info.compose_file} \\
             run {service_info.compose_service_name} \\
             {service_info.command}
+
+    Returns the usage record of the run, with
+    :option:`compute.accounting.enabled`
     '''
+    service_info.env.update(log_server_env(service_info))
+    capture = service_capture(service_info)
+    kwargs = capture.popen_kwargs if capture else {}
+    accounting = service_accounting(service_info)
     pid = self.just("--wrap", "Just-docker-compose",
                     '-f', service_info.compose_file,
-                    'run', service_info.compose_service_name,
+                    'run', *self._run_options(accounting),
+                    service_info.compose_service_name,
                     *(service_info.command),
-                    env=service_info.env)
+                    env=service_info.env, **kwargs)
+    if accounting:
+      accounting.monitor_container(settings.compute.accounting.interval)
+
+    try:
+      if capture:
+        capture.start(pid)
+      returncode = pid.wait()
+      if capture:
+        capture.join()
+
+      record = None
+      if accounting:
+        record = accounting.record(pid.pid, returncode)
+    finally:
+      # Already stopped by record, unless interrupted
+      if accounting:
+        accounting.monitor.stop()
+
+    if returncode != 0:
+      raise ServiceRunFailed()
+    return record
 
-    if pid.wait() != 0:
+  async def arun_service(self, service_info):
+    '''
+    The :mod:`asyncio` version of :meth:`run_service`, see
+    :meth:`terra.compute.base.BaseCompute.arun`
+    '''
+    service_info.env.update(log_server_env(service_info))
+    capture = service_capture(service_info)
+    kwargs = capture.popen_kwargs if capture else {}
+    accounting = service_accounting(service_info)
+    process = await self.ajust("--wrap", "Just-docker-compose",
+                               '-f', service_info.compose_file,
+                               'run', *self._run_options(accounting),
+                               service_info.compose_service_name,
+                               *(service_info.command),
+                               env=service_info.env, **kwargs)
+    if accounting:
+      accounting.monitor_container(settings.compute.accounting.interval)
+
+    try:
+      if capture:
+        await capture.aread(process)
+      returncode = await process.wait()
+
+      record = None
+      if accounting:
+        # Waits for the container monitor thread
+        record = await asyncio.get_running_loop().run_in_executor(
+            None, accounting.record, process.pid, returncode)
+    finally:
+      # Already stopped by record, unless cancelled
+      if accounting:
+        accounting.monitor.stop()
+
+    if returncode != 0:
       raise ServiceRunFailed()
+    return record
+
+  def _run_options(self, accounting):
+    '''
+    Returns the ``docker-compose run`` options to label the container, when
+    accounting
+    '''
+    if not accounting:
+      return ()
+    return ('--label', accounting.label)
 
   def config_service(self, service_info, extra_compose_files=[]):
     '''
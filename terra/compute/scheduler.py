@@ -0,0 +1,359 @@
+'''
+A scheduler that runs services at the same time, only as many as fit on the
+node, see :option:`compute.scheduler.cpus`.
+
+Services declare what they need with the ``cpus``, ``memory`` and
+``resources`` attributes of :class:`terra.compute.base.BaseService`. A service
+is only started once there are enough free CPUs and memory, and none of its
+exclusive resources are in use. Whenever room frees up, waiting services are
+started heaviest first. When one doesn't have enough CPUs or memory yet, the
+ones after it wait too, so lighter services can't keep it waiting forever.
+Services waiting for an exclusive resource don't hold up the others.
+
+.. code-block:: python
+
+    from terra.compute.scheduler import Scheduler
+
+    with Scheduler() as scheduler:
+      futures = scheduler.run_many([ServiceA, ServiceB, ServiceC])
+'''
+
+from concurrent.futures import Future, as_completed as futures_as_completed
+import os
+import threading
+
+from terra import settings
+import terra.compute.utils
+from terra.logger import getLogger
+logger = getLogger(__name__)
+
+cgroup_root = '/sys/fs/cgroup'
+'''str: Where the cgroup file systems are mounted'''
+
+proc_cgroup = '/proc/self/cgroup'
+'''str: The file listing the cgroups this process is in'''
+
+
+def _cgroups(controller):
+  # This process' cgroup for a controller ('' for cgroup v2), and then each of
+  # its ancestors, since their limits apply too
+  path = '/'
+  try:
+    with open(proc_cgroup, 'r') as fid:
+      for line in fid:
+        # "$ID:$CONTROLLERS:$PATH", where cgroup v2 has no controllers
+        _, controllers, cgroup = line.rstrip('\n').split(':', 2)
+        if controller in controllers.split(','):
+          path = cgroup
+          break
+  except (OSError, ValueError):
+    pass
+
+  cgroups = [path]
+  while path not in ('/', ''):
+    path = os.path.dirname(path)
+    cgroups.append(path)
+  return cgroups
+
+
+def _read_cgroup(cgroup, *names):
+  # The first file of a cgroup that exists, split into words. When a
+  # container has its own cgroup namespace, its cgroup is mounted as the root
+  # and the files under its path won't exist
+  for name in names:
+    directory, filename = os.path.split(name)
+    try:
+      with open(os.path.join(cgroup_root, directory, cgroup.lstrip('/'),
+                             filename), 'r') as fid:
+        return fid.read().split()
+    except OSError:
+      pass
+  return None
+
+
+def cgroup_cpus():
+  '''
+  Returns
+  -------
+  float
+      The CPU quota of this process' cgroup (or the lowest of its
+      ancestors'), in cores. ``None`` if unlimited
+  '''
+  limits = []
+  # cgroup v2: "$MAX $PERIOD", where $MAX can be "max"
+  for cgroup in _cgroups(''):
+    words = _read_cgroup(cgroup, 'cpu.max')
+    if words and words[0] != 'max':
+      limits.append(int(words[0]) / int(words[1]))
+
+  # cgroup v1: A quota of -1 is unlimited
+  for cgroup in _cgroups('cpu'):
+    quota = _read_cgroup(cgroup, 'cpu/cpu.cfs_quota_us',
+                         'cpu,cpuacct/cpu.cfs_quota_us')
+    period = _read_cgroup(cgroup, 'cpu/cpu.cfs_period_us',
+                          'cpu,cpuacct/cpu.cfs_period_us')
+    if quota and period and int(quota[0]) > 0:
+      limits.append(int(quota[0]) / int(period[0]))
+  return min(limits, default=None)
+
+
+def cgroup_memory():
+  '''
+  Returns
+  -------
+  int
+      The memory limit of this process' cgroup (or the lowest of its
+      ancestors'), in bytes. ``None`` if unlimited
+  '''
+  limits = []
+  words = [_read_cgroup(cgroup, 'memory.max') for cgroup in _cgroups('')]
+  words += [_read_cgroup(cgroup, 'memory/memory.limit_in_bytes')
+            for cgroup in _cgroups('memory')]
+  for limit in words:
+    # cgroup v1 uses a huge number for unlimited
+    if limit and limit[0] != 'max' and int(limit[0]) < 2**60:
+      limits.append(int(limit[0]))
+  return min(limits, default=None)
+
+
+def node_capacity():
+  '''
+  Get the CPUs and memory services can use on this node, from
+  :option:`compute.scheduler.cpus` and :option:`compute.scheduler.memory`, or
+  detected when ``0``. Detection takes the CPU affinity and cgroup limits (e.g.
+  of a container) into account
+
+  Returns
+  -------
+  tuple
+      The number of CPUs, and bytes of memory
+  '''
+  cpus = settings.compute.scheduler.cpus
+  if not cpus:
+    if hasattr(os, 'sched_getaffinity'):
+      cpus = len(os.sched_getaffinity(0))
+    else:
+      cpus = os.cpu_count() or 1
+    quota = cgroup_cpus()
+    if quota is not None:
+      cpus = min(cpus, quota)
+
+  memory = settings.compute.scheduler.memory
+  if not memory:
+    try:
+      memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+      memory = float('inf')
+    limit = cgroup_memory()
+    if limit is not None:
+      memory = min(memory, limit)
+
+  return cpus, memory
+
+
+class _Job:
+  __slots__ = ('service', 'compute', 'future', 'cpus', 'memory', 'resources',
+               'priority')
+
+  def __init__(self, service, compute, future, cpus, memory, resources,
+               priority):
+    self.service = service
+    self.compute = compute
+    self.future = future
+    self.cpus = cpus
+    self.memory = memory
+    self.resources = resources
+    self.priority = priority
+
+
+class Scheduler:
+  '''
+  Runs services on a compute, each on its own thread, once there is room for
+  them on the node
+
+  Arguments
+  ---------
+  compute : :class:`terra.compute.base.BaseCompute`, optional
+      The compute to run the services with. Defaults to
+      :data:`terra.compute.compute`
+  cpus : float, optional
+      The number of CPUs services can use. Defaults to :func:`node_capacity`
+  memory : int, optional
+      The bytes of memory services can use. Defaults to :func:`node_capacity`
+  '''
+
+  def __init__(self, compute=None, cpus=None, memory=None):
+    self.compute = terra.compute.utils.compute if compute is None else compute
+    if cpus is None or memory is None:
+      node_cpus, node_memory = node_capacity()
+      cpus = node_cpus if cpus is None else cpus
+      memory = node_memory if memory is None else memory
+    self.cpus = cpus
+    self.memory = memory
+
+    self.free_cpus = cpus
+    self.free_memory = memory
+    self.busy_resources = set()
+    self.pending = []
+    self.running = 0
+    self.condition = threading.Condition()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.shutdown()
+
+  def _load(self, service):
+    compute = self.compute
+    # Routed to one of the handler's computes
+    if isinstance(compute, terra.compute.utils.ComputeHandler):
+      compute = compute.connection_for(service)
+    return compute, terra.compute.utils.load_service(service, type(compute))
+
+  def load_service(self, service):
+    '''
+    Load a service for the compute it will be run on, like :meth:`submit`
+    does
+
+    Arguments
+    ---------
+    service : str or class or instance
+        The service, as accepted by :func:`terra.compute.utils.load_service`
+
+    Returns
+    -------
+    instance
+        The service, which can then be submitted
+    '''
+    return self._load(service)[1]
+
+  def _job(self, service, priority):
+    compute, service_info = self._load(service)
+    cpus = service_info.cpus
+    memory = service_info.memory
+    # Too big to ever fit, so run it once it has the node to itself
+    if cpus > self.cpus or memory > self.memory:
+      logger.warning(f'{type(service_info).__qualname__} needs more than the '
+                     f'node has ({cpus} CPUs, {memory} bytes), running it '
+                     'alone')
+      cpus = min(cpus, self.cpus)
+      memory = min(memory, self.memory)
+    return _Job(service_info, compute, Future(), cpus, memory,
+                frozenset(service_info.resources), priority)
+
+  def submit(self, service, priority=0):
+    '''
+    Run a service once there is room for it
+
+    Arguments
+    ---------
+    service : str or class or instance
+        The service, as accepted by :func:`terra.compute.utils.load_service`
+    priority : float, optional
+        Services with a higher priority are started first, before the heaviest
+
+    Returns
+    -------
+    :class:`concurrent.futures.Future`
+        The result of the compute's ``run``
+    '''
+    return self.run_many([service], priorities=[priority])[0]
+
+  def run_many(self, services, as_completed=False, priorities=None):
+    '''
+    Run many services, as many at the same time as there is room for. All the
+    services are considered together, so the heaviest are started first
+
+    Arguments
+    ---------
+    services : list
+        The services, as accepted by
+        :func:`terra.compute.utils.load_service`. Instances must not be
+        repeated
+    as_completed : bool, optional
+        Return the futures in the order they are done, instead of the order
+        the services were given
+    priorities : list, optional
+        The priority of each service, see :meth:`submit`
+
+    Returns
+    -------
+    list
+        A :class:`concurrent.futures.Future` for each service, like
+        :meth:`terra.compute.base.BaseCompute.run_many`
+    '''
+    if priorities is None:
+      priorities = [0] * len(services)
+    jobs = [self._job(service, priority)
+            for service, priority in zip(services, priorities)]
+    with self.condition:
+      self.pending.extend(jobs)
+      self._dispatch()
+
+    futures = [job.future for job in jobs]
+    if as_completed:
+      return futures_as_completed(futures)
+    return futures
+
+  def _fits(self, job):
+    return job.cpus <= self.free_cpus and job.memory <= self.free_memory \
+        and not job.resources & self.busy_resources
+
+  def _dispatch(self):
+    # Called with the condition held. Highest priority and then heaviest
+    # first, the sort is stable so equal services keep their order
+    self.pending.sort(key=lambda job: (job.priority, job.cpus, job.memory),
+                      reverse=True)
+    waiting = []
+    for index, job in enumerate(self.pending):
+      if job.resources & self.busy_resources:
+        waiting.append(job)
+        continue
+      if not self._fits(job):
+        # Don't let the services after it take the room it's waiting for
+        waiting.extend(self.pending[index:])
+        break
+      self.free_cpus -= job.cpus
+      self.free_memory -= job.memory
+      self.busy_resources |= job.resources
+      self.running += 1
+      threading.Thread(target=self._run, args=(job,), daemon=True).start()
+    self.pending = waiting
+
+  def _run(self, job):
+    exception = None
+    if job.future.set_running_or_notify_cancel():
+      try:
+        result = job.compute.run(job.service)
+      except BaseException as error:
+        exception = error
+
+    with self.condition:
+      self.free_cpus += job.cpus
+      self.free_memory += job.memory
+      self.busy_resources -= job.resources
+      self.running -= 1
+      self._dispatch()
+      self.condition.notify_all()
+
+    if job.future.cancelled():
+      return
+    if exception is None:
+      job.future.set_result(result)
+    else:
+      job.future.set_exception(exception)
+
+  def shutdown(self, wait=True):
+    '''
+    Wait for all the submitted services to finish
+
+    Arguments
+    ---------
+    wait : bool, optional
+        When ``False``, return right away
+    '''
+    if wait:
+      with self.condition:
+        self.condition.wait_for(lambda: not self.pending
+                                and not self.running)
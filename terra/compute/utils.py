@@ -27,23 +27,58 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+from fnmatch import fnmatchcase
 from importlib import import_module
+import inspect
+import os
+import threading
 
 from terra.core.utils import Handler
+from terra.core.settings import filename_suffixes
 from terra import settings
 import terra.compute.base
 from terra.logger import getLogger
 logger = getLogger(__name__)
 
 
+def _service_names(service):
+  # The names of a service's class and base classes, and the class, if known
+  if isinstance(service, str):
+    module, _, name = service.rpartition('.')
+    try:
+      service_class = getattr(import_module(module), name, None)
+    except (ValueError, ImportError):
+      # No module part, or no such module, so only the name can be matched
+      service_class = None
+    if not isinstance(service_class, type):
+      return {service}, None
+  elif isinstance(service, type):
+    service_class = service
+  else:
+    service_class = type(service)
+  return ({f'{cls.__module__}.{cls.__qualname__}'
+           for cls in inspect.getmro(service_class)}, service_class)
+
+
 class ComputeHandler(Handler):
   '''
   The :class:`ComputeHandler` class gives a single entrypoint to interact with
   the compute architecture, no matter what arch type it is. A standard way to
   call ``run``, etc...
+
+  Besides the default compute from :option:`compute.arch`, more named computes
+  can be set up in :option:`compute.connections`, and used with
+  ``compute[name]``. ``run`` sends each service to the compute picked by the
+  first of the :option:`compute.routes` that matches it. Each compute is only
+  created the first time it is used.
   '''
 
-  def _connect_backend(self):
+  def __init__(self, override_type=None):
+    super().__init__(override_type)
+    object.__setattr__(self, '_connections', {})
+    object.__setattr__(self, '_connections_lock', threading.Lock())
+
+  def _connect_backend(self, backend_name=None):
     '''
     Loads the compute's backend's base module, given either a fully qualified
     compute backend name, or a partial (``terra.compute.{partial}``), and
@@ -56,11 +91,13 @@ class ComputeHandler(Handler):
 
     Parameters
     ----------
-    self._override_type : :class:`str`, optional
-        If not ``None``, override the name of the backend to load.
+    backend_name : :class:`str`, optional
+        The name of the backend to load. Defaults to ``self._override_type``,
+        and then :option:`compute.arch`
     '''
 
-    backend_name = self._override_type
+    if backend_name is None:
+      backend_name = self._override_type
 
     if backend_name is None:
       backend_name = settings.compute.arch
@@ -75,6 +112,105 @@ class ComputeHandler(Handler):
 
     return module.Compute()
 
+  def __getitem__(self, name):
+    '''
+    Get a compute by its name in :option:`compute.connections`, or
+    ``default`` for the default compute. Created the first time
+    '''
+    if name == 'default':
+      return self._connection
+
+    try:
+      return self._connections[name]
+    except KeyError:
+      pass
+
+    with self._connections_lock:
+      if name not in self._connections:
+        try:
+          arch = settings.compute.connections[name]['arch']
+        except KeyError:
+          raise KeyError(f'No compute connection "{name}" in '
+                         'compute.connections') from None
+        self._connections[name] = self._connect_backend(arch)
+      return self._connections[name]
+
+  def route(self, service):
+    '''
+    Pick the compute to run a service on, with :option:`compute.routes`
+
+    Arguments
+    ---------
+    service : str or class or instance
+        The service, as accepted by :func:`load_service`
+
+    Returns
+    -------
+    str
+        The name of the compute, ``default`` when no route matches
+    '''
+    routes = settings.compute.routes
+    if not routes:
+      return 'default'
+
+    names, service_class = _service_names(service)
+    # Instances can set their needs in __init__
+    needs = service if not isinstance(service, (str, type)) else service_class
+
+    for route in routes:
+      if 'service' in route and not any(fnmatchcase(name, route['service'])
+                                        for name in names):
+        continue
+      if 'resources' in route and not set(route['resources']) <= \
+         set(getattr(needs, 'resources', ())):
+        continue
+      if 'min_cpus' in route and \
+         getattr(needs, 'cpus', 1) < route['min_cpus']:
+        continue
+      if 'min_memory' in route and \
+         getattr(needs, 'memory', 0) < route['min_memory']:
+        continue
+      return route['connection']
+    return 'default'
+
+  def connection_for(self, service):
+    '''
+    Returns
+    -------
+    :class:`terra.compute.base.BaseCompute`
+        The compute :meth:`route` picks for a service
+    '''
+    return self[self.route(service)]
+
+  def run(self, service, *args, **kwargs):
+    '''
+    Run a service on the compute :meth:`route` picks for it
+    '''
+    return self.connection_for(service).run(service, *args, **kwargs)
+
+  async def arun(self, service, *args, **kwargs):
+    '''
+    The :mod:`asyncio` version of :meth:`run`
+    '''
+    return await self.connection_for(service).arun(service, *args, **kwargs)
+
+  def run_many(self, services, max_parallel=None, as_completed=False):
+    '''
+    :meth:`terra.compute.base.BaseCompute.run_many`, with each service run on
+    the compute :meth:`route` picks for it
+    '''
+    return terra.compute.base.BaseCompute.run_many(
+        self, services, max_parallel=max_parallel, as_completed=as_completed)
+
+  def close(self):
+    super().close()
+    with self._connections_lock:
+      connections = list(self._connections.values())
+      self._connections.clear()
+    for connection in connections:
+      if hasattr(connection, 'close'):
+        connection.close()
+
 
 compute = ComputeHandler()
 '''ComputeHandler: The compute handler that all apps will be interfacing with.
@@ -99,7 +235,51 @@ def get_default_service_class(cls):
   return module.Service
 
 
-def load_service(name_or_class):
+def _setting(name):
+  # The value of a setting named with a filename suffix, or None
+  if not name.rsplit('.', 1)[-1].endswith(tuple(filename_suffixes)):
+    return None
+  value = settings
+  try:
+    for part in name.split('.'):
+      value = getattr(value, part)
+  except AttributeError:
+    return None
+  return value
+
+
+def resolve_paths(names):
+  '''
+  Get the paths of the ``inputs`` or ``outputs`` of a service, see
+  :attr:`terra.compute.base.BaseService.inputs`
+
+  Arguments
+  ---------
+  names : list
+      Paths, or names of settings ending in a filename suffix
+
+  Returns
+  -------
+  set
+      The absolute, normalized paths. Settings holding a list (e.g.
+      ``_files``) give all their paths
+  '''
+  paths = set()
+  for name in names:
+    value = _setting(name)
+    if value is None:
+      value = name
+    for path in value if isinstance(value, (list, tuple)) else [value]:
+      paths.add(os.path.normpath(os.path.abspath(os.fspath(path))))
+  return paths
+
+
+_service_cache = {}
+'''dict: The service class :func:`load_service` resolved each
+``(name_or_class, compute class)`` to. Cleared when a service is registered'''
+
+
+def load_service(name_or_class, compute_class=None):
   '''
   Get (and optionally import) a service by name. Also accepts the class itself
   or an instance of a class.
@@ -108,18 +288,35 @@ def load_service(name_or_class):
   ----------
   name_or_class : :class:`str` or :class:`class` or instance
       The service being loaded
+  compute_class : type, optional
+      The compute the service is for. Defaults to the default compute
 
   Returns
   -------
     instance
         Instead of the class specified. If ``name_or_class`` was already an
         instance, the same instance is returned
+
+  The service class is only resolved (imported and looked up in the registry)
+  the first time for each name or class and compute, and remembered for the
+  next calls. A new instance is returned each time, since services hold the
+  state of a run.
   '''
 
+  # If already instance, return it
+  if not isinstance(name_or_class, (str, type)):
+    return name_or_class
+
+  cls = type(compute._connection) if compute_class is None else compute_class
+  key = (name_or_class, cls)
+
+  cached = _service_cache.get(key)
+  # Unless the registry has been replaced since, e.g. patched by a test
+  if cached is not None and \
+     terra.compute.base.services.get(cached[0]) is cached[1]:
+    return cached[2]()
+
   if not isinstance(name_or_class, str):
-    # If already instance, return it
-    if not isinstance(name_or_class, type):
-      return name_or_class
     # TODO: Not really designed for nested classes, so don't use __qualname__
     name_or_class = f'{name_or_class.__module__}.{name_or_class.__name__}'
   else:
@@ -133,10 +330,11 @@ def load_service(name_or_class):
     logger.fatal(f'{name_or_class} is not registered')
     raise
 
-  cls = type(compute._connection)
-
-  if cls not in services:
+  if cls in services:
+    service_class = services[cls]
+  else:
     logger.info(f'Using default {cls} compute handler for {name_or_class}')
-    return get_default_service_class(cls)()
+    service_class = get_default_service_class(cls)
 
-  return services[cls]()
+  _service_cache[key] = (name_or_class, services, service_class)
+  return service_class()
@@ -1,3 +1,4 @@
+import asyncio
 import distutils.spawn
 import json
 import os
@@ -7,10 +8,14 @@ from tempfile import TemporaryDirectory
 
 from vsi.tools.diff import dict_diff
 
-from terra.compute.base import BaseService, BaseCompute, ServiceRunFailed
+from terra.compute.base import (
+  BaseService, BaseCompute, EnvOverlay, ServiceRunFailed
+)
 from terra.core.settings import TerraJSONEncoder
 from terra import settings
-from terra.logger import getLogger, DEBUG1
+from terra.logger import getLogger, log_server_env, DEBUG1
+from terra.logger.capture import service_capture
+from terra.compute.accounting import service_accounting, wait
 logger = getLogger(__name__)
 
 
@@ -37,12 +42,76 @@ class Compute(BaseCompute):
 
     If ``settings.compute.virtualenv_dir`` is set, then that directory is
     automatically prepended to the ``PATH`` for the command to be executed.
+
+    Returns the usage record of the run, with
+    :option:`compute.accounting.enabled`
+    '''
+
+    env, executable = self._environment(service_info)
+
+    capture = service_capture(service_info)
+    kwargs = capture.popen_kwargs if capture else {}
+    accounting = service_accounting(service_info)
+
+    # run command -- command must be a list of strings
+    pid = Popen(service_info.command, env=dict(env), executable=executable,
+                **kwargs)
+
+    if capture:
+      capture.start(pid)
+    if accounting:
+      returncode, usage = wait(pid)
+    else:
+      returncode = pid.wait()
+    if capture:
+      capture.join()
+
+    record = None
+    if accounting:
+      record = accounting.record(pid.pid, returncode, usage)
+
+    if returncode != 0:
+      raise ServiceRunFailed()
+    return record
+
+  async def arun_service(self, service_info):
+    '''
+    The :mod:`asyncio` version of :meth:`run_service`, see
+    :meth:`terra.compute.base.BaseCompute.arun`
+    '''
+
+    env, executable = self._environment(service_info)
+
+    capture = service_capture(service_info)
+    kwargs = capture.popen_kwargs if capture else {}
+    accounting = service_accounting(service_info)
+
+    process = await asyncio.create_subprocess_exec(
+        *service_info.command, env=dict(env), executable=executable, **kwargs)
+
+    if capture:
+      await capture.aread(process)
+    returncode = await process.wait()
+
+    # The child watcher reaps the process, so there is no rusage
+    record = None
+    if accounting:
+      record = accounting.record(process.pid, returncode)
+
+    if returncode != 0:
+      raise ServiceRunFailed()
+    return record
+
+  def _environment(self, service_info):
+    '''
+    Returns the environment and executable to run a service with
     '''
 
     logger.debug('Running: ' + ' '.join(
         [quote(x) for x in service_info.command]))
 
     env = service_info.env
+    env.update(log_server_env(service_info))
 
     # Replace 'python' command with virtual environment python executable
     if settings.compute.virtualenv_dir:
@@ -53,7 +122,10 @@ class Compute(BaseCompute):
       #   service_info.env['PATH'] = service_info.env["_OLD_VIRTUAL_PATH"]
 
     if logger.getEffectiveLevel() <= DEBUG1:
-      dd = dict_diff(os.environ, env)[3]
+      if isinstance(env, EnvOverlay):
+        dd = env.diff()
+      else:
+        dd = dict_diff(os.environ, env)[3]
       if dd:
         logger.debug1('Environment Modification:\n' + '\n'.join(dd))
 
@@ -63,12 +135,7 @@ class Compute(BaseCompute):
     # command
     executable = distutils.spawn.find_executable(service_info.command[0],
                                                  path=env['PATH'])
-
-    # run command -- command must be a list of strings
-    pid = Popen(service_info.command, env=env, executable=executable)
-
-    if pid.wait() != 0:
-      raise ServiceRunFailed()
+    return env, executable
 
 
 class Service(BaseService):
@@ -236,6 +236,16 @@ def processing_dir(self):
   return processing_dir
 
 
+@settings_property
+def cache_dir(self):
+  '''
+  The default :func:`settings_property` for the service cache directory,
+  :option:`compute.cache.cache_dir`. The default is
+  ``processing_dir/service_cache``
+  '''
+  return os.path.join(self.processing_dir, 'service_cache')
+
+
 @settings_property
 def unittest(self):
   '''
@@ -258,13 +268,56 @@ global_templates = [
         "level": "ERROR",
         "format": f"%(asctime)s (%(hostname)s): %(levelname)s - %(message)s",
         "date_format": None,
-        "style": "%"
+        "style": "%",
+        "queue": False,
+        "skip_caller_lookup": False,
+        "binary": False,
+        "index": {
+          "records": 0
+        },
+        "rate_limit": {
+          "records": 0,
+          "interval": 60,
+          "max_keys": 1000
+        },
+        "rotate": {
+          "max_bytes": 0,
+          "interval": 0,
+          "backup_count": 0,
+          "compress": True
+        },
+        "server": {
+          "enabled": False,
+          "hostname": "localhost",
+          "port": 0
+        }
       },
       "executor": {
         "type": "ThreadPoolExecutor"
       },
       "compute": {
-        "arch": "terra.compute.dummy"
+        "arch": "terra.compute.dummy",
+        "capture_output": {
+          "enabled": False,
+          "stdout_level": "INFO",
+          "stderr_level": "WARNING",
+          "max_line": 65536
+        },
+        "scheduler": {
+          "cpus": 0,
+          "memory": 0
+        },
+        "cache": {
+          "enabled": False,
+          "cache_dir": cache_dir,
+          "content_hash": False
+        },
+        "accounting": {
+          "enabled": False,
+          "interval": 1.0
+        },
+        "connections": {},
+        "routes": []
       },
       "resume": False,
       'status_file': status_file,
@@ -6,6 +6,11 @@ They're especially useful when many pieces of code may be interested in the
 same events.
 
 See https://docs.djangoproject.com/en/2.2/topics/signals/ for more info
+
+.. envvar:: TERRA_SIGNAL_STATS
+
+    When set to ``1``, every :class:`Signal` collects per receiver dispatch
+    statistics, see :func:`Signal.stats`. A summary is logged at exit.
 '''
 
 # Copyright (c) Django Software Foundation and individual contributors.
@@ -37,7 +42,10 @@ See https://docs.djangoproject.com/en/2.2/topics/signals/ for more info
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import atexit
+import os
 import threading
+import time
 import weakref
 
 # Avoid importing anything else in terra here, it can cause some nasty
@@ -51,10 +59,49 @@ def _make_id(target):
   return id(target)
 
 
+def _receiver_name(receiver):
+  func = getattr(receiver, '__func__', receiver)
+  return f'{getattr(func, "__module__", None)}.' \
+         f'{getattr(func, "__qualname__", repr(func))}'
+
+
 NONE_ID = _make_id(None)
 # A marker for caching
 NO_RECEIVERS = object()
 
+STATS_ENVIRONMENT_VARIABLE = "TERRA_SIGNAL_STATS"
+'''str: The environment variable that turns on :class:`ReceiverStats`
+collection for every :class:`Signal`, when set to ``1``
+'''
+
+
+class ReceiverStats:
+  '''
+  Dispatch statistics for a single receiver of a :class:`Signal`. Times are in
+  seconds.
+  '''
+
+  def __init__(self):
+    self.calls = 0
+    '''int: Number of times the receiver was called'''
+    self.total_time = 0.0
+    '''float: Cumulative time spent in the receiver'''
+    self.max_time = 0.0
+    '''float: Longest single call to the receiver'''
+    self.exceptions = 0
+    '''int: Number of calls that raised an exception'''
+
+  @property
+  def mean_time(self):
+    if not self.calls:
+      return 0.0
+    return self.total_time / self.calls
+
+  def __repr__(self):
+    return (f'ReceiverStats(calls={self.calls}, '
+            f'total_time={self.total_time:.6f}, '
+            f'max_time={self.max_time:.6f}, exceptions={self.exceptions})')
+
 
 class Signal:
   """
@@ -70,9 +117,17 @@ class Signal:
       receivers that sender has in :data:`sender_receivers_cache`. The cache is
       cleaned when :func:`connect` or :func:`disconnect` is called and
       populated on :func:`send`.
+  track_stats : bool, optional
+      If ``True``, record per receiver call counts, latency and exception
+      counts, see :func:`stats`. Defaults to ``None``, which uses
+      :envvar:`TERRA_SIGNAL_STATS`. This is only checked when a receiver is
+      connected, so there is no overhead on :func:`send` when disabled.
+  name : str, optional
+      A name used to identify the signal in the stats summary
   """
 
-  def __init__(self, providing_args=None, use_caching=False):
+  def __init__(self, providing_args=None, use_caching=False, track_stats=None,
+               name=None):
     self.receivers = []
     '''dict: The internal map of all signals that are connected to receivers'''
     if providing_args is None:
@@ -91,6 +146,18 @@ class Signal:
     '''weakref.WeakKeyDictionary: Stores receivers for a sender if
     :data:`use_caching` is on'''
     self._dead_receivers = False
+    self.name = name
+    '''str: Name used in the stats summary'''
+    self.track_stats = track_stats
+    '''bool: Set if stats collection was requested'''
+    self._stats = {}
+    self._stats_lock = threading.Lock()
+    self._stats_installed = False
+
+  def __repr__(self):
+    if self.name:
+      return f'<{type(self).__name__} {self.name}>'
+    return super().__repr__()
 
   def connect(self, receiver, sender=None, weak=True, dispatch_uid=None):
     """
@@ -140,6 +207,22 @@ class Signal:
       if not any(r_key == lookup_key for r_key, _ in self.receivers):
         self.receivers.append((lookup_key, receiver))
       self.sender_receivers_cache.clear()
+      if not self._stats_installed and self._stats_enabled():
+        self._install_stats()
+
+  def _stats_enabled(self):
+    if self.track_stats is None:
+      return os.environ.get(STATS_ENVIRONMENT_VARIABLE, None) == "1"
+    return self.track_stats
+
+  def _install_stats(self):
+    # Note: caller is assumed to hold self.lock.
+    # Shadow the class methods on this instance, so that the non-instrumented
+    # send and send_robust never have to check if stats are on.
+    self.send = self._send_stats
+    self.send_robust = self._send_robust_stats
+    self._stats_installed = True
+    atexit.register(self.log_stats)
 
   def disconnect(self, receiver=None, sender=None, dispatch_uid=None):
     """
@@ -245,6 +328,97 @@ class Signal:
         responses.append((receiver, response))
     return responses
 
+  def _record_stats(self, receiver, elapsed, exception):
+    name = _receiver_name(receiver)
+    with self._stats_lock:
+      stats = self._stats.get(name)
+      if stats is None:
+        stats = self._stats[name] = ReceiverStats()
+      stats.calls += 1
+      stats.total_time += elapsed
+      if elapsed > stats.max_time:
+        stats.max_time = elapsed
+      if exception:
+        stats.exceptions += 1
+
+  def _send_stats(self, sender, **named):
+    if not self.receivers or \
+       self.sender_receivers_cache.get(sender) is NO_RECEIVERS:
+      return []
+
+    responses = []
+    for receiver in self._live_receivers(sender):
+      start = time.perf_counter()
+      try:
+        response = receiver(signal=self, sender=sender, **named)
+      except Exception:
+        self._record_stats(receiver, time.perf_counter() - start, True)
+        raise
+      self._record_stats(receiver, time.perf_counter() - start, False)
+      responses.append((receiver, response))
+    return responses
+
+  def _send_robust_stats(self, sender, **named):
+    if not self.receivers or \
+       self.sender_receivers_cache.get(sender) is NO_RECEIVERS:
+      return []
+
+    responses = []
+    for receiver in self._live_receivers(sender):
+      start = time.perf_counter()
+      try:
+        response = receiver(signal=self, sender=sender, **named)
+      except Exception as err:
+        self._record_stats(receiver, time.perf_counter() - start, True)
+        responses.append((receiver, err))
+      else:
+        self._record_stats(receiver, time.perf_counter() - start, False)
+        responses.append((receiver, response))
+    return responses
+
+  def stats(self):
+    '''
+    Get the dispatch statistics collected for each receiver
+
+    Stats are only collected if ``track_stats`` or
+    :envvar:`TERRA_SIGNAL_STATS` was enabled when a receiver was connected.
+
+    Returns
+    -------
+    dict
+        Maps the receiver's qualified name to a copy of its
+        :class:`ReceiverStats`
+    '''
+    with self._stats_lock:
+      rv = {}
+      for name, stats in self._stats.items():
+        rv[name] = ReceiverStats()
+        rv[name].__dict__.update(stats.__dict__)
+      return rv
+
+  def reset_stats(self):
+    '''
+    Clear all collected receiver statistics
+    '''
+    with self._stats_lock:
+      self._stats.clear()
+
+  def log_stats(self):
+    '''
+    Log a summary of the receiver statistics, slowest receivers first. This is
+    called automatically at exit when stats are being collected.
+    '''
+    stats = self.stats()
+    if not stats:
+      return
+    lines = [f'Signal stats for {self!r}:']
+    for name, stat in sorted(stats.items(), key=lambda x: -x[1].total_time):
+      lines.append(f'  {name}: calls={stat.calls} '
+                   f'total={stat.total_time:.6f}s '
+                   f'mean={stat.mean_time:.6f}s max={stat.max_time:.6f}s '
+                   f'exceptions={stat.exceptions}')
+    logger.info('\n'.join(lines))
+
   def _clear_dead_receivers(self):
     # Note: caller is assumed to hold self.lock.
     if self._dead_receivers:
@@ -341,10 +515,12 @@ def receiver(signal, **kwargs):
   return _decorator
 
 
-__all__ = ['Signal', 'receiver', 'post_settings_configured']
+__all__ = ['Signal', 'ReceiverStats', 'receiver', 'post_settings_configured',
+           'pre_service_run', 'post_service_run', 'task_submitted',
+           'task_done', 'stage_started', 'stage_finished']
 
 # a signal for settings done being loaded
-post_settings_configured = Signal()
+post_settings_configured = Signal(name='post_settings_configured')
 '''Signal:
 Sent after settings has been configured. This will either happen after
 :func:`terra.core.settings.LazySettings._setup` is trigger by accessing any
@@ -352,6 +528,48 @@ element in the settings (which is done automatically), or in rare cases after a
 manual call to :func:`terra.core.settings.LazySettings.configure`.
 '''
 
+# Lifecycle signals. Senders only build the payloads when a signal has
+# receivers, so these cost nothing unless something is connected.
+pre_service_run = Signal(['compute', 'service', 'start_time'],
+                         name='pre_service_run')
+'''Signal:
+Sent by :class:`terra.compute.base.BaseCompute` before a service's ``pre_run``
+is called. The sender is the compute class. ``start_time`` is a
+:func:`time.time` timestamp.
+'''
+post_service_run = Signal(['compute', 'service', 'start_time', 'elapsed',
+                           'exception'],
+                          name='post_service_run')
+'''Signal:
+Sent by :class:`terra.compute.base.BaseCompute` after a service's ``post_run``
+is called, or when the run raises, in which case ``exception`` is set.
+``elapsed`` is the run time in seconds, including ``pre_run`` and
+``post_run``.
+'''
+task_submitted = Signal(['executor', 'fn', 'future', 'submit_time'],
+                        name='task_submitted')
+'''Signal:
+Sent by the :mod:`terra.executor` executors when a task is submitted. The
+sender is the executor class.
+'''
+task_done = Signal(['executor', 'fn', 'future', 'submit_time', 'elapsed'],
+                   name='task_done')
+'''Signal:
+Sent by the :mod:`terra.executor` executors when a task's future is done.
+``elapsed`` is the time in seconds since the task was submitted.
+'''
+stage_started = Signal(['stage_name', 'start_time'], name='stage_started')
+'''Signal:
+Sent by :class:`terra.utils.workflow.resumable` when a stage starts running.
+The sender is the class of the stage's ``self``. Skipped stages are not sent.
+'''
+stage_finished = Signal(['stage_name', 'start_time', 'elapsed'],
+                        name='stage_finished')
+'''Signal:
+Sent by :class:`terra.utils.workflow.resumable` when a stage finishes
+successfully.
+'''
+
 from terra.logger import getLogger  # noqa
 logger = getLogger(__name__)
 # Must be after post_settings_configured to prevent circular import errors.
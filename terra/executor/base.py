@@ -0,0 +1,50 @@
+from concurrent.futures import Executor
+import time
+
+from terra.core.signals import task_submitted, task_done
+
+
+class BaseExecutor(Executor):
+  '''
+  The base class for all Terra executors. Sends the
+  :data:`terra.core.signals.task_submitted` and
+  :data:`terra.core.signals.task_done` signals for each submitted task.
+
+  Executors should call :func:`_track_task` on each future they create in
+  ``submit``
+  '''
+
+  def _track_task(self, fn, future):
+    '''
+    Send :data:`terra.core.signals.task_submitted` for a new future, and
+    arrange for :data:`terra.core.signals.task_done` to be sent when it is
+    done. Does nothing when neither signal has receivers.
+
+    Arguments
+    ---------
+    fn : func
+        The function submitted
+    future : :class:`concurrent.futures.Future`
+        The future for ``fn``
+
+    Returns
+    -------
+    :class:`concurrent.futures.Future`
+        The same ``future``
+    '''
+    if not (task_submitted.receivers or task_done.receivers):
+      return future
+
+    submit_time = time.time()
+    start = time.perf_counter()
+    task_submitted.send(sender=type(self), executor=self, fn=fn, future=future,
+                        submit_time=submit_time)
+
+    if task_done.receivers:
+      def done(future):
+        task_done.send(sender=type(self), executor=self, fn=fn, future=future,
+                       submit_time=submit_time,
+                       elapsed=time.perf_counter() - start)
+      future.add_done_callback(done)
+
+    return future
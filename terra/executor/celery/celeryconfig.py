@@ -29,3 +29,14 @@ celery_include = env.get('TERRA_CELERY_INCLUDE', None)
 if celery_include:
   import ast
   include = ast.literal_eval(celery_include)
+
+# Stream the worker's log records back to the master, see
+# terra.executor.celery.log_stream
+log_stream = env.get('TERRA_CELERY_LOG_STREAM', None)
+if log_stream:
+  from celery.signals import after_setup_logger
+
+  @after_setup_logger.connect(weak=False)
+  def setup_log_stream(logger, **kwargs):
+    from terra.executor.celery.log_stream import RedisStreamHandler
+    logger.addHandler(RedisStreamHandler(broker_url, log_stream))
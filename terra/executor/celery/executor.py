@@ -16,12 +16,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from concurrent.futures import Future, Executor, as_completed
+from concurrent.futures import Future, as_completed
 from concurrent.futures._base import (RUNNING, FINISHED, CANCELLED,
                                       CANCELLED_AND_NOTIFIED)
 from threading import Lock, Thread
 import time
 
+from terra.executor.base import BaseExecutor
 from terra.logger import getLogger
 logger = getLogger(__name__)
 
@@ -74,7 +75,7 @@ class CeleryExecutorFuture(Future):
       return result
 
 
-class CeleryExecutor(Executor):
+class CeleryExecutor(BaseExecutor):
   def __init__(self, predelay=None, postdelay=None, applyasync_kwargs=None,
                retry_kwargs=None, retry_queue='', update_delay=0.1):
     """
@@ -107,6 +108,7 @@ class CeleryExecutor(Executor):
     self._monitor_stopping = False
     self._monitor = Thread(target=self._update_futures)
     self._monitor.setDaemon(True)
+    self._log_consumer = None
 
   def _update_futures(self):
     while True:
@@ -158,6 +160,7 @@ class CeleryExecutor(Executor):
       if not self._monitor_started:
         self._monitor.start()
         self._monitor_started = True
+        self._start_log_consumer()
 
       # metadata = {
       #     'retry_kwargs': self._retry_kwargs.copy()
@@ -172,10 +175,22 @@ class CeleryExecutor(Executor):
       if self._postdelay:
         self._postdelay(asyncresult)
 
-      future = CeleryExecutorFuture(asyncresult)
+      future = self._track_task(fn, CeleryExecutorFuture(asyncresult))
       self._futures.add(future)
       return future
 
+  def _start_log_consumer(self):
+    '''
+    Start reading the workers' log records, if the celery config has a
+    ``log_stream`` (set by :envvar:`TERRA_CELERY_LOG_STREAM`)
+    '''
+    from terra.executor.celery import app
+    key = app.conf.get('log_stream', None)
+    if key:
+      from terra.executor.celery.log_stream import RedisStreamLogConsumer
+      self._log_consumer = RedisStreamLogConsumer(app.conf.broker_url, key)
+      self._log_consumer.start()
+
   def shutdown(self, wait=True):
     with self._shutdown_lock:
       self._shutdown = True
@@ -192,3 +207,7 @@ class CeleryExecutor(Executor):
       except RuntimeError:  # pragma: no cover
         # Thread never started. Cannot join
         pass
+
+    if self._log_consumer is not None:
+      self._log_consumer.stop()
+      self._log_consumer = None
@@ -0,0 +1,271 @@
+'''
+Stream log records from celery workers back to the master through a redis
+stream.
+
+Workers install a :class:`RedisStreamHandler` (see ``celeryconfig``), which
+pushes compact json records to the stream in batches. The master runs a
+:class:`RedisStreamLogConsumer` that reads them back and handles them with its
+normal logging handlers, so worker records end up in the master's
+``terra_log``.
+
+Memory is bounded on both ends: the handler buffers at most ``capacity``
+records (dropping the oldest when redis can't keep up), the stream is trimmed
+to roughly ``maxlen`` entries, and the consumer reads at most ``batch_size``
+entries at a time.
+
+.. envvar:: TERRA_CELERY_LOG_STREAM
+
+    The name of the redis stream used. When set, workers install the
+    :class:`RedisStreamHandler` and the
+    :class:`terra.executor.celery.CeleryExecutor` starts a
+    :class:`RedisStreamLogConsumer`. Unset by default.
+'''
+
+from collections import deque
+import json
+import logging
+import os
+import threading
+import time
+
+import redis
+
+from terra.logger import getLogger, extra_logger_variables
+logger = getLogger(__name__)
+
+
+_record_fields = ('name', 'levelno', 'levelname', 'pathname', 'filename',
+                  'module', 'lineno', 'funcName', 'created', 'msecs',
+                  'thread', 'threadName', 'processName', 'process')
+
+
+def serialize_record(record, formatter=None):
+  '''
+  Serialize a :class:`logging.LogRecord` into compact json. The message is
+  merged with its args and any exception is formatted, so the record can be
+  rebuilt with :func:`deserialize_record`
+  '''
+  d = {field: getattr(record, field, None) for field in _record_fields}
+  d['msg'] = record.getMessage()
+  if record.exc_info and not record.exc_text:
+    record.exc_text = (formatter or logging.Formatter()).formatException(
+        record.exc_info)
+  if record.exc_text:
+    d['exc_text'] = record.exc_text
+  for key, value in extra_logger_variables.items():
+    d[key] = getattr(record, key, value)
+  return json.dumps(d, separators=(',', ':'), default=str)
+
+
+def deserialize_record(data):
+  '''
+  Rebuild a :class:`logging.LogRecord` serialized by :func:`serialize_record`
+  '''
+  return logging.makeLogRecord(json.loads(data))
+
+
+class RedisStreamHandler(logging.Handler):
+  '''
+  A :class:`logging.Handler` that pushes records to a redis stream in batches.
+
+  Records are sent once ``batch_size`` are buffered, or every
+  ``flush_interval`` seconds by a background thread. The thread is started on
+  the first record in each process, so the handler survives celery's prefork
+  workers.
+
+  Arguments
+  ---------
+  url : str
+      The redis url, e.g. the celery ``broker_url``
+  key : str
+      The name of the redis stream
+  batch_size : int, optional
+      The number of records to send at a time
+  flush_interval : float, optional
+      The maximum number of seconds a record waits in the buffer
+  capacity : int, optional
+      The maximum number of records buffered. When full, the oldest records
+      are dropped, and how many is logged once redis is reachable again
+  maxlen : int, optional
+      The approximate maximum length of the redis stream
+  '''
+
+  def __init__(self, url, key, batch_size=100, flush_interval=1.0,
+               capacity=10000, maxlen=100000):
+    super().__init__()
+    self.redis = redis.Redis.from_url(url)
+    self.key = key
+    self.batch_size = batch_size
+    self.flush_interval = flush_interval
+    self.maxlen = maxlen
+    self.buffer = deque(maxlen=capacity)
+    self.dropped = 0
+    '''int: Number of records dropped because the buffer was full'''
+    self._reported_dropped = 0
+    self._flusher_pid = None
+    self._closed = False
+
+  def emit(self, record):
+    try:
+      data = serialize_record(record, self.formatter)
+    except Exception:
+      self.handleError(record)
+      return
+
+    if len(self.buffer) == self.buffer.maxlen:
+      self.dropped += 1
+    self.buffer.append(data)
+
+    if self._flusher_pid != os.getpid():
+      self._start_flusher()
+
+    if len(self.buffer) >= self.batch_size:
+      self.flush()
+
+  def _start_flusher(self):
+    self._flusher_pid = os.getpid()
+    thread = threading.Thread(target=self._flush_loop,
+                              name='TerraRedisLogFlusher', daemon=True)
+    thread.start()
+
+  def _flush_loop(self):
+    pid = os.getpid()
+    while not self._closed and self._flusher_pid == pid:
+      time.sleep(self.flush_interval)
+      self.flush()
+
+  def flush(self):
+    self.acquire()
+    try:
+      batch = list(self.buffer)
+      self.buffer.clear()
+    finally:
+      self.release()
+
+    if not batch:
+      return
+
+    try:
+      pipe = self.redis.pipeline(transaction=False)
+      for data in batch:
+        pipe.xadd(self.key, {'r': data}, maxlen=self.maxlen, approximate=True)
+      pipe.execute()
+    except redis.RedisError:
+      # Put the records back in front of any logged since. Extending a full
+      # deque discards from the left, so the oldest records are dropped
+      self.acquire()
+      try:
+        records = batch + list(self.buffer)
+        self.dropped += max(len(records) - self.buffer.maxlen, 0)
+        self.buffer.clear()
+        self.buffer.extend(records)
+      finally:
+        self.release()
+      return
+
+    # Report drops once redis is reachable again
+    dropped = self.dropped - self._reported_dropped
+    if dropped:
+      self._reported_dropped = self.dropped
+      logger.warning(f'Dropped {dropped} log records while redis could not '
+                     'keep up')
+
+  def close(self):
+    self._closed = True
+    try:
+      self.flush()
+    finally:
+      super().close()
+
+
+class RedisStreamLogConsumer:
+  '''
+  Reads records pushed by :class:`RedisStreamHandler` and handles them with
+  the logger they were logged to, in this process. Only records added after
+  :func:`start` are read.
+
+  Received messages are prefixed with the process name and pid of the worker
+  that sent them.
+
+  Arguments
+  ---------
+  url : str
+      The redis url
+  key : str
+      The name of the redis stream
+  batch_size : int, optional
+      The maximum number of records read at a time
+  block : int, optional
+      The number of milliseconds to wait for new records on each read
+  '''
+
+  def __init__(self, url, key, batch_size=100, block=500):
+    self.redis = redis.Redis.from_url(url)
+    self.key = key
+    self.batch_size = batch_size
+    self.block = block
+    self.thread = None
+    self._stopping = False
+    self.last_id = None
+
+  def start(self):
+    # Start at the redis server's current time, only new records are of
+    # interest. Not this host's clock, which may be ahead of the server's
+    try:
+      seconds, microseconds = self.redis.time()
+      self.last_id = f'{seconds * 1000 + microseconds // 1000}-0'
+    except redis.RedisError:
+      logger.warning('Could not reach redis to read worker logs',
+                     exc_info=True)
+      self.last_id = '$'
+    self._stopping = False
+    self.thread = threading.Thread(target=self._consume,
+                                   name='TerraRedisLogConsumer', daemon=True)
+    self.thread.start()
+
+  def stop(self):
+    '''
+    Stop the consumer thread, after handling any records already in the stream
+    '''
+    if self.thread is None:
+      return
+    self._stopping = True
+    self.thread.join()
+    self.thread = None
+    try:
+      # Everything left, not just one batch
+      while self.read():
+        pass
+    except redis.RedisError:
+      logger.warning('Lost connection reading worker logs from redis',
+                     exc_info=True)
+
+  def read(self, block=None):
+    '''
+    Read and handle one batch of records
+
+    Returns
+    -------
+    int
+        The number of records handled
+    '''
+    response = self.redis.xread({self.key: self.last_id},
+                                count=self.batch_size, block=block)
+    count = 0
+    for _, entries in response or []:
+      for entry_id, fields in entries:
+        self.last_id = entry_id
+        record = deserialize_record(fields[b'r'])
+        record.msg = f'[{record.processName}:{record.process}] {record.msg}'
+        logging.getLogger(record.name).handle(record)
+        count += 1
+    return count
+
+  def _consume(self):
+    while not self._stopping:
+      try:
+        self.read(self.block)
+      except redis.RedisError:
+        logger.warning('Lost connection reading worker logs from redis',
+                       exc_info=True)
+        time.sleep(1)
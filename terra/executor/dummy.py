@@ -1,11 +1,12 @@
-from concurrent.futures import Future, Executor
+from concurrent.futures import Future
 from threading import Lock
 
+from terra.executor.base import BaseExecutor
 from terra.logger import getLogger
 logger = getLogger(__name__)
 
 
-class DummyExecutor(Executor):
+class DummyExecutor(BaseExecutor):
   """
   Executor that does the nothin, just logs what would happen.
   """
@@ -19,10 +20,10 @@ class DummyExecutor(Executor):
       if self._shutdown:
         raise RuntimeError('cannot schedule new futures after shutdown')
 
-      f = Future()
-      logger.info(f'Run function: {fn}')
-      logger.info(f'With args: {args}')
-      logger.info(f'With kwargs: {kwargs}')
+      f = self._track_task(fn, Future())
+      logger.info_lazy(lambda: f'Run function: {fn}')
+      logger.info_lazy(lambda: f'With args: {args}')
+      logger.info_lazy(lambda: f'With kwargs: {kwargs}')
       f.set_result(None)
       return f
 
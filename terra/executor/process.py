@@ -0,0 +1,28 @@
+import concurrent.futures
+import os
+
+from terra.executor.base import BaseExecutor
+from terra.logger import (
+  log_server_initializer, LOG_SERVER_ENVIRONMENT_VARIABLE
+)
+
+
+class ProcessPoolExecutor(BaseExecutor,
+                          concurrent.futures.ProcessPoolExecutor):
+  '''
+  :class:`concurrent.futures.ProcessPoolExecutor` that sends terra's task
+  signals
+
+  When the master is running a :class:`terra.logger.LogRecordServer`, and no
+  ``initializer`` is given, the workers send their log records to it instead
+  of writing to the inherited log file handles.
+  '''
+
+  def __init__(self, *args, **kwargs):
+    if os.environ.get(LOG_SERVER_ENVIRONMENT_VARIABLE, None) and \
+       len(args) < 3 and kwargs.get('initializer', None) is None:
+      kwargs['initializer'] = log_server_initializer
+    super().__init__(*args, **kwargs)
+
+  def submit(self, fn, *args, **kwargs):
+    return self._track_task(fn, super().submit(fn, *args, **kwargs))
@@ -1,11 +1,13 @@
-from concurrent.futures import Future, Executor
+from concurrent.futures import Future
 from threading import Lock
 
+from terra.executor.base import BaseExecutor
+
 
 # No need for a global shutdown lock here, not multi-threaded/process
 
 
-class SyncExecutor(Executor):
+class SyncExecutor(BaseExecutor):
   """
   Executor that does the job synchronously.
 
@@ -25,7 +27,7 @@ class SyncExecutor(Executor):
       if self._shutdown:
         raise RuntimeError('cannot schedule new futures after shutdown')
 
-      f = Future()
+      f = self._track_task(fn, Future())
       try:
         result = fn(*args, **kwargs)
       except BaseException as e:
@@ -0,0 +1,13 @@
+import concurrent.futures
+
+from terra.executor.base import BaseExecutor
+
+
+class ThreadPoolExecutor(BaseExecutor, concurrent.futures.ThreadPoolExecutor):
+  '''
+  :class:`concurrent.futures.ThreadPoolExecutor` that sends terra's task
+  signals
+  '''
+
+  def submit(self, fn, *args, **kwargs):
+    return self._track_task(fn, super().submit(fn, *args, **kwargs))
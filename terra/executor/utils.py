@@ -1,4 +1,3 @@
-import concurrent.futures
 from terra import settings
 from terra.core.utils import ClassHandler
 from importlib import import_module
@@ -34,9 +33,11 @@ class ExecutorHandler(ClassHandler):
       from terra.executor.sync import SyncExecutor
       return SyncExecutor
     elif backend_name == "ThreadPoolExecutor":
-      return concurrent.futures.ThreadPoolExecutor
+      from terra.executor.thread import ThreadPoolExecutor
+      return ThreadPoolExecutor
     elif backend_name == "ProcessPoolExecutor":
-      return concurrent.futures.ProcessPoolExecutor
+      from terra.executor.process import ProcessPoolExecutor
+      return ProcessPoolExecutor
     elif backend_name == "CeleryExecutor":
       import terra.executor.celery
       return terra.executor.celery.CeleryExecutor
@@ -0,0 +1,1146 @@
+'''
+The logging module for all of terra apps.
+
+Whether a part of terra core or apps, cli, workflow, service, task, all modules
+should import :mod:`terra.logger` to output all messages to user and developer.
+
+Logging, like everything is configured by :data:`terra.settings`. Before the
+:data:`terra.settings` is configured, the logger is setup to create an initial
+temporary log file in your systems temporary directory with the prefix
+``terra_initial_tmp_XXXXXXXX`` (Where ``X`` are random characters), when the
+first message is logged. This initial log file will capture all levels of log
+messages (Down to :data:`DEBUG3`). During this time, stdout will also emit
+message at the default level of :data:`logging.WARNING`.
+
+This initial file in only useful in extremely rare circumstances where terra
+crashes before it is even configured.
+
+After the :data:`terra.settings` are
+:data:`initialized<terra.core.signals.post_settings_configured>`, the
+``terra_initial_tmp_XXXXXXXX`` file is removed, and another log file is used
+according to the :ref:`settings_logging`, named ``terra_log`` in your
+:data:`terra.core.settings.processing_dir`. The ``terra_log`` file is appended
+to if it already exists.
+
+All messages that are emitted before :data:`terra.settings` is configured are
+then replayed for the newly configured logger handlers so that any messages of
+interest will be seen on stdout and saved in the final log file. Only the most
+recent :envvar:`TERRA_PRECONFIG_LOG_CAPACITY` records are kept in memory until
+then, older records are spilled to a temporary file, and read back from it
+when replayed.
+
+.. envvar:: TERRA_PRECONFIG_LOG_CAPACITY
+
+    The number of records logged before :data:`terra.settings` is configured
+    that are kept in memory. Default: ``1000``
+
+.. note::
+
+    In the rare case any :data:`logging.WARNING` or above messages that appear
+    before :data:`terra.settings` is configured, they may be display a second
+    time on ``stdout``. This repetition only occurs on ``stdout`` and is
+    expected
+
+Multiple processes
+------------------
+
+When :option:`logging.server.enabled` is set, the master process runs a
+:class:`LogRecordServer` and sets :envvar:`TERRA_LOG_SERVER`. Terra processes
+that see this environment variable, such as services run by the compute
+backends, and workers of the ``ProcessPoolExecutor``, send their records to the
+master instead of writing them themselves, so ``terra_log`` is only ever
+written by one process.
+
+.. envvar:: TERRA_LOG_SERVER
+
+    The ``host:port`` of the master's log server. Set automatically
+
+.. envvar:: TERRA_LOG_SERVICE
+
+    The name of the service a process is running, used to tag its records. Set
+    automatically by the compute backends. Docker services need both variables
+    passed through in their ``docker-compose.yml`` ``environment`` section.
+
+Binary log
+----------
+
+When :option:`logging.binary` is set, ``terra_log.bin`` is written instead of
+``terra_log``, in a compact binary format that is only formatted when read
+back. See :mod:`terra.logger.binary` and ``python -m terra.logger --help``.
+
+Either log file can be rotated by size and time, see :mod:`terra.logger.rotate`
+and :option:`logging.rotate.max_bytes`. The text log file can also keep a
+sparse index, for fast queries by time and level, see
+:mod:`terra.logger.index` and :option:`logging.index.records`.
+
+Repetitive records, such as a warning logged for every item in a loop, can be
+rate limited, see :mod:`terra.logger.rate_limit` and
+:option:`logging.rate_limit.records`.
+
+See :ref:`settings_logging` for how to customize the logger
+
+Usage
+-----
+
+To use the logger, in any module always:
+
+```
+from terra.logging import get_logger
+logger = get_logger(__name__)
+```
+
+And then use the ``logger`` object anywhere in the module. This logger is a
+python :mod:`logging` logger with the following extra configuration
+
+* Added `debug1`, `debug2`, and `debug3` levels (with `debug3` being the most
+  verbose)
+* `debug` is really `debug1`
+* `debug3` is best used for debugging math in an algorithm
+* `debug2` is best used for more verbose statements used only for development
+* `debug1` is best used for verbose statements used when running
+* All logging level variables exist in :mod:`terra.logger`: ``CRITICAL``,
+  ``WARN``, ``DEBUG2``, etc...
+* Messages that are expensive to build can be passed as a function to
+  `debug1_lazy`, `debug2_lazy`, `debug3_lazy` or `info_lazy`, e.g.
+  ``logger.debug1_lazy(lambda: pprint.pformat(data))``. The function is only
+  called if the record is emitted by a handler (see :class:`LazyMessage`)
+'''
+
+import logging.handlers
+import sys
+import atexit
+import collections
+import queue
+import tempfile
+import platform
+import pprint
+import os
+import traceback
+import io
+import json
+import socketserver
+import struct
+import threading
+
+from terra.core.exceptions import ImproperlyConfigured
+
+from logging import (
+  CRITICAL, ERROR, INFO, FATAL, WARN, WARNING, NOTSET,
+  getLogger as getLogger_original, _acquireLock, _releaseLock, currentframe,
+  _srcfile as logging_srcfile, Logger as Logger_original
+)
+
+
+__all__ = ['getLogger', 'CRITICAL', 'ERROR', 'INFO', 'FATAL', 'WARN',
+           'WARNING', 'NOTSET', 'DEBUG1', 'DEBUG2', 'DEBUG3', 'Logger',
+           'LogRecordServer', 'LazyMessage']
+
+
+class HandlerLoggingContext(object):
+  '''
+  A context Manager for swapping out logging handlers
+  '''
+
+  def __init__(self, logger, handlers):
+    '''
+    Arguments
+    ---------
+    logger:
+        The logger to swap handlers on
+    handlers: list
+        List of handles to set the logger to
+    '''
+    self.handlers = handlers
+    if isinstance(logger, logging.LoggerAdapter):
+      self.logger = logger.logger
+    else:
+      self.logger = logger
+
+  def __enter__(self):
+    try:
+      _acquireLock()
+      self.old_handlers = self.logger.handlers
+      self.logger.handlers = self.handlers
+    finally:
+      _releaseLock()
+
+  def __exit__(self, et, ev, tb):
+    try:
+      _acquireLock()
+      self.logger.handlers = self.old_handlers
+    finally:
+      _releaseLock()
+    # implicit return of None => don't swallow exceptions
+
+
+class _ExtraVariablesFilter(logging.Filter):
+  '''
+  Adds the :data:`extra_logger_variables` to records that don't already have
+  them, such as records from loggers created before :mod:`terra.logger` was
+  imported, so terra's handlers can always format them
+  '''
+
+  def filter(self, record):
+    for key, value in extra_logger_variables.items():
+      record.__dict__.setdefault(key, value)
+    return True
+
+
+PRECONFIG_CAPACITY_ENVIRONMENT_VARIABLE = "TERRA_PRECONFIG_LOG_CAPACITY"
+'''
+str: The environment variable for the capacity of the :class:`_PreconfigBuffer`
+'''
+
+
+class _PreconfigBuffer(logging.Handler):
+  '''
+  Buffers records until :data:`terra.settings` is configured, so they can be
+  replayed to the configured handlers.
+
+  The newest ``capacity`` records are kept in memory. Older records are spilled
+  to a temporary file, in the :mod:`terra.logger.binary` format, which is only
+  created if needed. Memory stays bounded, and no records are lost.
+
+  Arguments
+  ---------
+  capacity : int
+      The number of records kept in memory
+  '''
+
+  def __init__(self, capacity):
+    super().__init__()
+    self.capacity = capacity
+    self.buffer = collections.deque()
+    self.spill_handler = None
+
+  def emit(self, record):
+    self.buffer.append(record)
+    if len(self.buffer) > self.capacity:
+      record = self.buffer.popleft()
+      if self.spill_handler is None:
+        from terra.logger.binary import BinaryFileHandler
+        fid, filename = tempfile.mkstemp(
+            prefix=_SetupTerraLogger.default_tmp_prefix, suffix='.spill')
+        os.close(fid)
+        self.spill_handler = BinaryFileHandler(filename)
+      self.spill_handler.emit(record)
+
+  def replay(self, handlers):
+    '''
+    Replay every record, oldest first, to each of the ``handlers`` whose level
+    accepts it. Spilled records are streamed back from disk, and the temporary
+    file is removed.
+    '''
+    if self.spill_handler is not None:
+      from terra.logger.binary import read_records
+      self.spill_handler.close()
+      filename = self.spill_handler.baseFilename
+      with open(filename, 'rb') as fid:
+        for record in read_records(fid):
+          self._replay_record(record, handlers)
+      os.unlink(filename)
+      self.spill_handler = None
+
+    while self.buffer:
+      self._replay_record(self.buffer.popleft(), handlers)
+
+  @staticmethod
+  def _replay_record(record, handlers):
+    for handler in handlers:
+      if record.levelno >= handler.level:
+        handler.handle(record)
+
+  def close(self):
+    if self.spill_handler is not None:
+      self.spill_handler.close()
+      try:
+        os.unlink(self.spill_handler.baseFilename)
+      except OSError:  # pragma: no cover
+        pass
+      self.spill_handler = None
+    super().close()
+
+
+class _TempFileHandler(logging.StreamHandler):
+  '''
+  A :class:`logging.StreamHandler` that writes to a temporary file, which is
+  only created when the first record is emitted
+
+  Arguments
+  ---------
+  prefix : str
+      The prefix of the temporary file name
+  '''
+
+  def __init__(self, prefix):
+    super().__init__()
+    self.prefix = prefix
+    self.stream = None
+
+  def emit(self, record):
+    if self.stream is None:
+      self.stream = tempfile.NamedTemporaryFile(mode="w+", prefix=self.prefix,
+                                                delete=False)
+    super().emit(record)
+
+  def flush(self):
+    if self.stream is not None:
+      super().flush()
+
+  def remove(self):
+    '''
+    Close and remove the temporary file, if it was created
+    '''
+    self.acquire()
+    try:
+      if self.stream is not None:
+        self.stream.close()
+        os.unlink(self.stream.name)
+        self.stream = None
+    finally:
+      self.release()
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+  '''
+  A :class:`logging.handlers.QueueHandler` for a queue in the same process.
+
+  Since the records never leave the process, they don't need to be made
+  pickleable, so :func:`prepare` skips formatting them. All the formatting
+  then happens in the :class:`logging.handlers.QueueListener` thread.
+  '''
+
+  def prepare(self, record):
+    return record
+
+
+LOG_SERVER_ENVIRONMENT_VARIABLE = "TERRA_LOG_SERVER"
+'''str: The environment variable holding the ``host:port`` of the master's
+log server. When set, a terra process sends its log records to the log server
+instead of writing them itself
+'''
+
+LOG_SERVICE_ENVIRONMENT_VARIABLE = "TERRA_LOG_SERVICE"
+'''str: The environment variable holding the name of the service a process
+is running, used to tag records sent to the log server
+'''
+
+
+class _LogServerHandler(logging.handlers.SocketHandler):
+  '''
+  A :class:`logging.handlers.SocketHandler` that sends records to the terra
+  log server as length prefixed json, instead of pickles, so the server never
+  has to unpickle data from a socket.
+  '''
+
+  def __init__(self, host, port, service=None):
+    super().__init__(host, port)
+    self.service = service
+
+  def makePickle(self, record):
+    if record.exc_info and not record.exc_text:
+      # Format the traceback into exc_text, since exc_info can't be sent
+      record.exc_text = logging.Formatter().formatException(record.exc_info)
+    d = dict(record.__dict__)
+    d['msg'] = record.getMessage()
+    d['args'] = None
+    d['exc_info'] = None
+    d.pop('message', None)
+    if self.service:
+      d['service'] = self.service
+    s = json.dumps(d, default=str).encode()
+    return struct.pack('>L', len(s)) + s
+
+
+class _LogRecordStreamHandler(socketserver.StreamRequestHandler):
+  '''
+  Reads length prefixed json log records from one child process connection
+  '''
+
+  def handle(self):
+    while True:
+      chunk = self.rfile.read(4)
+      if len(chunk) < 4:
+        break
+      length = struct.unpack('>L', chunk)[0]
+      chunk = self.rfile.read(length)
+      if len(chunk) < length:
+        break
+      self.server.handle_record(logging.makeLogRecord(json.loads(chunk)))
+
+
+class LogRecordServer(socketserver.ThreadingTCPServer):
+  '''
+  A log server that receives records from child processes (services, and
+  executor workers) and handles them with the master's logging handlers, so
+  that every record is written once, by one process, into ``terra_log``.
+
+  Received records have their message prefixed with the service name (or the
+  process name) and pid of the process that sent them.
+
+  Each connection is read on its own thread, but those threads only queue the
+  records; a single writer thread handles them all, so handlers (and their
+  rollovers) are never called concurrently by the server. Records from one
+  process keep their order. Records from different processes are written in
+  the order they were received, which may differ from the order they were
+  created.
+
+  Arguments
+  ---------
+  host : str
+      The address to listen on
+  port : int
+      The port to listen on. ``0`` picks a free port
+  '''
+
+  allow_reuse_address = True
+  daemon_threads = True
+
+  def __init__(self, host='localhost', port=0):
+    super().__init__((host, port), _LogRecordStreamHandler)
+    self.thread = None
+    self.writer = None
+    self.records = queue.Queue()
+
+  @property
+  def address(self):
+    '''
+    str: The ``host:port`` address for :envvar:`TERRA_LOG_SERVER`
+    '''
+    return f'{self.server_address[0]}:{self.server_address[1]}'
+
+  def handle_record(self, record):
+    self.records.put(record)
+
+  def _write(self):
+    while True:
+      record = self.records.get()
+      if record is None:
+        break
+      tag = getattr(record, 'service', None) or record.processName
+      record.msg = f'[{tag}:{record.process}] {record.msg}'
+      logging.getLogger(record.name).handle(record)
+
+  def start(self):
+    self.writer = threading.Thread(target=self._write,
+                                   name='TerraLogServerWriter', daemon=True)
+    self.writer.start()
+    self.thread = threading.Thread(target=self.serve_forever,
+                                   name='TerraLogServer', daemon=True)
+    self.thread.start()
+
+  def stop(self):
+    if self.thread is not None:
+      self.shutdown()
+      self.thread.join()
+      self.thread = None
+    if self.writer is not None:
+      # Records already received are written before the writer stops
+      self.records.put(None)
+      self.writer.join()
+      self.writer = None
+    self.server_close()
+
+
+def connect_log_server(address, service=None, level=NOTSET):
+  '''
+  Replace all the root logger's handlers with one that sends records to the
+  master's :class:`LogRecordServer`.
+
+  Handlers are removed without being closed, since in a forked process they
+  share the master's open log file, and flushing it would duplicate writes.
+
+  Arguments
+  ---------
+  address : str
+      The ``host:port`` of the log server
+  service : str, optional
+      The service name to tag records with
+  level : int, optional
+      The handler level
+
+  Returns
+  -------
+  :class:`logging.Handler`
+      The new handler
+  '''
+  host, port = address.rsplit(':', 1)
+  handler = _LogServerHandler(host, int(port), service)
+  handler.setLevel(level)
+  root_logger = logging.getLogger(None)
+  try:
+    _acquireLock()
+    root_logger.handlers = [handler]
+  finally:
+    _releaseLock()
+  return handler
+
+
+def log_server_initializer():
+  '''
+  Initializer for executor worker processes. When the master is running a log
+  server, send all of the worker's records to it, at the lowest level of the
+  worker's current handlers.
+  '''
+  address = os.environ.get(LOG_SERVER_ENVIRONMENT_VARIABLE, None)
+  if address:
+    handlers = logging.getLogger(None).handlers
+    level = min((h.level for h in handlers), default=NOTSET)
+    connect_log_server(address, level=level)
+
+
+def log_server_env(service):
+  '''
+  Get the environment variables a service needs to send its records to the
+  master's log server
+
+  Arguments
+  ---------
+  service : :class:`terra.compute.base.BaseService`
+      The service being run
+
+  Returns
+  -------
+  dict
+      Empty if no log server is running
+  '''
+  address = os.environ.get(LOG_SERVER_ENVIRONMENT_VARIABLE, None)
+  if not address:
+    return {}
+  return {LOG_SERVER_ENVIRONMENT_VARIABLE: address,
+          LOG_SERVICE_ENVIRONMENT_VARIABLE: type(service).__qualname__}
+
+
+class _SetupTerraLogger():
+  '''
+  A simple logger class used internally to configure the logger before and
+  after :data:`terra.settings` is configured
+  '''
+  default_formatter = logging.Formatter('%(asctime)s (preconfig) : '
+                                        '%(levelname)s - %(message)s')
+  default_stderr_handler_level = logging.WARNING
+  default_tmp_prefix = "terra_initial_tmp_"
+  default_log_prefix = "terra_log"
+
+  def __init__(self):
+    self._configured = False
+    self.queue_listener = None
+    self.log_server = None
+    self.rate_limit_filter = None
+    self.root_logger = logging.getLogger(None)
+    self.root_logger.setLevel(0)
+    self.extra_filter = _ExtraVariablesFilter()
+
+    # stream -> stderr
+    self.stderr_handler = logging.StreamHandler(sys.stderr)
+    self.stderr_handler.addFilter(self.extra_filter)
+    self.stderr_handler.setLevel(self.default_stderr_handler_level)
+    self.stderr_handler.setFormatter(self.default_formatter)
+    self.root_logger.addHandler(self.stderr_handler)
+
+    # Set up temporary file logger. The file isn't created until needed
+    self.tmp_handler = _TempFileHandler(self.default_tmp_prefix)
+    self.tmp_handler.setLevel(0)
+    self.tmp_handler.addFilter(self.extra_filter)
+    self.tmp_handler.setFormatter(self.default_formatter)
+    self.root_logger.addHandler(self.tmp_handler)
+
+    # setup Buffer to use for replay after configure
+    self.preconfig_handler = _PreconfigBuffer(int(os.environ.get(
+        PRECONFIG_CAPACITY_ENVIRONMENT_VARIABLE, 1000)))
+    self.preconfig_handler.setLevel(0)
+    self.root_logger.addHandler(self.preconfig_handler)
+
+    # Replace the exception hook with our exception handler
+    self.setup_logging_exception_hook()
+    self.setup_logging_ipython_exception_hook()
+
+  @property
+  def tmp_file(self):
+    '''
+    The temporary log file, or ``None`` if nothing has been logged to it yet,
+    or after :data:`terra.settings` is configured
+    '''
+    if self.tmp_handler is None:
+      return None
+    return self.tmp_handler.stream
+
+  @property
+  def log_file(self):
+    '''
+    The stream of ``terra_log``, or ``None`` before :data:`terra.settings` is
+    configured, or when sending records to a log server. After the log file is
+    rotated, this is the new file
+    '''
+    return getattr(getattr(self, 'file_handler', None), 'stream', None)
+
+  def setup_logging_exception_hook(self):
+    '''
+    Setup logging of uncaught exceptions
+
+    MITM insert an error logging call on all uncaught exceptions. Should only
+    be called once, or else errors will be logged multiple times
+    '''
+
+    # Make a copy of the original hook so the inner function can call it
+    original_hook = sys.excepthook
+
+    # https://stackoverflow.com/a/16993115/4166604
+    def handle_exception(exc_type, exc_value, exc_traceback):
+      logger.error("Uncaught exception",
+                   exc_info=(exc_type, exc_value, exc_traceback))
+      # Make sure the exception is written out before anything else happens
+      self.flush_queue()
+
+      return original_hook(exc_type, exc_value, exc_traceback)
+
+    # Replace the hook
+    sys.excepthook = handle_exception
+
+  # https://stackoverflow.com/a/49176714/4166604
+  def setup_logging_ipython_exception_hook(self):
+    '''
+    Setup logging of uncaught exceptions in ipython
+
+    MITM insert an error logging call on all uncaught exceptions. Should only
+    be called once, or else errors will be logged multiple times
+
+    If IPython hasn't already been imported, nothing happens. Importing it is
+    slow, and terra is only running in IPython if it has been imported.
+    '''
+    if 'IPython' not in sys.modules:
+      return
+
+    try:
+      import warnings
+      with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        from IPython.core.interactiveshell import InteractiveShell
+
+      original_exception = InteractiveShell.showtraceback
+
+      def handle_traceback(*args, **kwargs):
+        getLogger(__name__).error("Uncaught exception",
+                                  exc_info=sys.exc_info())
+        self.flush_queue()
+        return original_exception(*args, **kwargs)
+
+      InteractiveShell.showtraceback = handle_traceback
+
+    except ImportError:  # pragma: no cover
+      pass
+
+  def configure_logger(self, sender, **kwargs):
+    '''
+    Call back function to configure the logger after settings have been
+    configured
+    '''
+
+    from terra import settings
+
+    if self._configured:
+      self.root_logger.error("Configure logger called twice, this is "
+                             "unexpected")
+      raise ImproperlyConfigured()
+
+    formatter = logging.Formatter(fmt=settings.logging.format,
+                                  datefmt=settings.logging.date_format,
+                                  style=settings.logging.style)
+
+    if settings.logging.skip_caller_lookup:
+      Logger.find_caller = format_uses_caller(settings.logging.format)
+
+    log_server_address = os.environ.get(LOG_SERVER_ENVIRONMENT_VARIABLE, None)
+    if log_server_address:
+      # Send everything to the master's log server instead of terra_log. The
+      # socket handler stands in for the file handler.
+      host, port = log_server_address.rsplit(':', 1)
+      self.file_handler = _LogServerHandler(
+          host, int(port),
+          os.environ.get(LOG_SERVICE_ENVIRONMENT_VARIABLE, None))
+    elif settings.logging.rotate.max_bytes or settings.logging.rotate.interval:
+      from terra.logger.rotate import (
+        RotatingFileHandler, RotatingBinaryFileHandler
+      )
+      os.makedirs(settings.processing_dir, exist_ok=True)
+      log_file = os.path.join(settings.processing_dir, self.default_log_prefix)
+      rotate = settings.logging.rotate
+      kwargs = {'max_bytes': rotate.max_bytes, 'interval': rotate.interval,
+                'backup_count': rotate.backup_count,
+                'compress': rotate.compress}
+      if settings.logging.binary:
+        self.file_handler = RotatingBinaryFileHandler(log_file + '.bin',
+                                                      **kwargs)
+      elif settings.logging.index.records:
+        from terra.logger.index import IndexedRotatingFileHandler
+        self.file_handler = IndexedRotatingFileHandler(
+            log_file, index_records=settings.logging.index.records, **kwargs)
+      else:
+        self.file_handler = RotatingFileHandler(log_file, **kwargs)
+    elif settings.logging.binary:
+      from terra.logger.binary import BinaryFileHandler
+      os.makedirs(settings.processing_dir, exist_ok=True)
+      self.file_handler = BinaryFileHandler(
+          os.path.join(settings.processing_dir,
+                       self.default_log_prefix + '.bin'))
+    elif settings.logging.index.records:
+      from terra.logger.index import IndexedFileHandler
+      os.makedirs(settings.processing_dir, exist_ok=True)
+      self.file_handler = IndexedFileHandler(
+          os.path.join(settings.processing_dir, self.default_log_prefix),
+          index_records=settings.logging.index.records)
+    else:
+      # Setup log file for use in configure
+      log_file = os.path.join(settings.processing_dir, self.default_log_prefix)
+      os.makedirs(settings.processing_dir, exist_ok=True)
+      log_file = open(log_file, 'a')
+
+      self.file_handler = logging.StreamHandler(stream=log_file)
+
+    self.file_handler.addFilter(self.extra_filter)
+
+    # Configure log level
+    level = settings.logging.level
+    if isinstance(level, str):
+      # make level case insensitive
+      level = level.upper()
+    self.stderr_handler.setLevel(level)
+    self.file_handler.setLevel(level)
+    self.update_queue_level()
+
+    # Configure format
+    self.file_handler.setFormatter(formatter)
+    self.stderr_handler.setFormatter(formatter)
+
+    rate_limit = settings.logging.rate_limit
+    if rate_limit.records:
+      from terra.logger.rate_limit import RateLimitFilter
+      self.rate_limit_filter = RateLimitFilter(
+          rate_limit.records, rate_limit.interval, rate_limit.max_keys)
+      self.file_handler.addFilter(self.rate_limit_filter)
+      self.stderr_handler.addFilter(self.rate_limit_filter)
+      # Log what the last interval suppressed
+      atexit.register(self.rate_limit_filter.flush)
+
+    # Swap some handlers
+    self.root_logger.addHandler(self.file_handler)
+    self.root_logger.removeHandler(self.preconfig_handler)
+    self.root_logger.removeHandler(self.tmp_handler)
+
+    # Log the settings only to the file handler
+    with HandlerLoggingContext(self.root_logger, [self.file_handler]):
+      self.root_logger.log(DEBUG1, LazyMessage(
+                           lambda: "Settings:\n" + pprint.pformat(
+                               dict(settings))))
+
+    # Replay the buffer to each handler whose level accepts the records. This
+    # repeats any warning and above messages on stderr, since they were already
+    # shown before configure. This is probably not worth preventing, because
+    # error/critical messages before configure should be rare, and are probably
+    # worth repeating. Repeating is the only way to get them formatted right
+    # the second time anyways. The preconfig messages were never in the new
+    # output file.
+    self.preconfig_handler.replay([self.stderr_handler, self.file_handler])
+    self.preconfig_handler = None
+
+    # Remove the temporary file now that you are done with it
+    self.tmp_handler.remove()
+    self.tmp_handler = None
+
+    if log_server_address:
+      # The master prints these records to stderr
+      self.root_logger.removeHandler(self.stderr_handler)
+    elif settings.logging.server.enabled:
+      self.start_server(settings.logging.server.hostname,
+                        settings.logging.server.port)
+
+    if settings.logging.queue:
+      self.start_queue()
+
+    self._configured = True
+
+  def start_server(self, host='localhost', port=0):
+    '''
+    Start a :class:`LogRecordServer`, and set :envvar:`TERRA_LOG_SERVER` so
+    that child processes send their records to it
+    '''
+    self.log_server = LogRecordServer(host, port)
+    self.log_server.start()
+    os.environ[LOG_SERVER_ENVIRONMENT_VARIABLE] = self.log_server.address
+    atexit.register(self.stop_server)
+
+  def stop_server(self):
+    '''
+    Stop the :class:`LogRecordServer`, if running
+    '''
+    if self.log_server is None:
+      return
+    self.log_server.stop()
+    self.log_server = None
+    if os.environ.get(LOG_SERVER_ENVIRONMENT_VARIABLE, None):
+      del os.environ[LOG_SERVER_ENVIRONMENT_VARIABLE]
+    atexit.unregister(self.stop_server)
+
+  def start_queue(self):
+    '''
+    Move the stderr and file handlers behind a queue, so that logging calls
+    only enqueue the record, and a background
+    :class:`logging.handlers.QueueListener` thread formats and writes them.
+
+    The queue is flushed at exit and on uncaught exceptions
+    '''
+    self.log_queue = queue.Queue(-1)
+    self.queue_handler = _QueueHandler(self.log_queue)
+    if self.rate_limit_filter:
+      # Don't even queue records that will be dropped
+      self.queue_handler.addFilter(self.rate_limit_filter)
+    self.queue_listener = logging.handlers.QueueListener(
+        self.log_queue, self.stderr_handler, self.file_handler,
+        respect_handler_level=True)
+    self.update_queue_level()
+
+    try:
+      _acquireLock()
+      self.root_logger.removeHandler(self.stderr_handler)
+      self.root_logger.removeHandler(self.file_handler)
+      self.root_logger.addHandler(self.queue_handler)
+    finally:
+      _releaseLock()
+
+    self.queue_listener.start()
+    atexit.register(self.stop_queue)
+
+  def update_queue_level(self):
+    '''
+    Set the level of the queue to the lowest of the stderr and file handlers,
+    so records neither would write are never queued. Call after changing
+    their levels. Does nothing if the queue is not in use.
+    '''
+    if self.queue_listener is not None:
+      self.queue_handler.setLevel(min(self.stderr_handler.level,
+                                      self.file_handler.level))
+
+  def flush_queue(self):
+    '''
+    Block until every record in the queue has been handled. Does nothing if
+    the queue is not in use.
+    '''
+    if self.queue_listener is not None:
+      self.log_queue.join()
+
+  def stop_queue(self):
+    '''
+    Handle any remaining records in the queue, stop the listener thread and
+    put the handlers directly back on the root logger.
+    '''
+    if self.queue_listener is None:
+      return
+
+    try:
+      _acquireLock()
+      self.root_logger.removeHandler(self.queue_handler)
+      self.root_logger.addHandler(self.stderr_handler)
+      self.root_logger.addHandler(self.file_handler)
+    finally:
+      _releaseLock()
+
+    # Processes everything left in the queue before returning
+    self.queue_listener.stop()
+    self.queue_listener = None
+    atexit.unregister(self.stop_queue)
+
+
+extra_logger_variables = {'hostname': platform.node()}
+'''dict: Extra logger variables that can be reference in log messages. Added
+to every record made by a terra :class:`Logger`, and to any other record that
+reaches terra's handlers'''
+
+
+_caller_attributes = ('pathname', 'filename', 'module', 'lineno', 'funcName')
+'''tuple: The :class:`logging.LogRecord` attributes filled in by
+:func:`Logger.findCaller`'''
+
+_internal_files = {}
+'''dict: Cache of whether frames from a given source file are internal to the
+logging modules, and skipped by :func:`Logger.findCaller`. Keyed on the file
+name rather than the code object, so it doesn't grow with code created at run
+time, nor keep that code alive'''
+
+
+def format_uses_caller(fmt):
+  '''
+  Check if a log format string may use any of the record attributes filled in
+  by :func:`Logger.findCaller`. This is a simple substring test, so it works
+  for every format style, and errs on the side of ``True``.
+  '''
+  return fmt is None or any(attr in fmt for attr in _caller_attributes)
+
+
+class LazyMessage:
+  '''
+  A log message that is only built when a handler formats the record.
+
+  :class:`logging.LogRecord` calls ``str`` on any message that isn't a string,
+  so wrapping an expensive message in a :class:`LazyMessage` defers the work
+  until after the level checks of both the logger and the handlers. The result
+  is cached, so it is only built once for all handlers.
+
+  Arguments
+  ---------
+  function : :term:`callable`
+      Called with no arguments to build the message
+
+  Example
+  -------
+
+  .. code-block:: python
+
+      logger.debug1(LazyMessage(lambda: pprint.pformat(big_dict)))
+  '''
+
+  __slots__ = ('function', '_message')
+
+  def __init__(self, function):
+    self.function = function
+    self._message = None
+
+  def __str__(self):
+    if self._message is None:
+      self._message = str(self.function())
+    return self._message
+
+  def __repr__(self):
+    return f'LazyMessage({self.function!r})'
+
+
+class Logger(Logger_original):
+  find_caller = True
+  '''bool: When ``False``, :func:`findCaller` doesn't walk the stack, unless
+  ``stack_info`` is requested. Set by :option:`logging.skip_caller_lookup`'''
+
+  def findCaller(self, stack_info=False):
+    """
+    Find the stack frame of the caller so that we can note the source
+    file name, line number and function name.
+    """
+    if not (Logger.find_caller or stack_info):
+      return "(unknown file)", 0, "(unknown function)", None
+
+    f = currentframe()
+    # On some versions of IronPython, currentframe() returns None if
+    # IronPython isn't run with -X:Frames.
+    if f is not None:
+      f = f.f_back
+    rv = "(unknown file)", 0, "(unknown function)", None
+    while hasattr(f, "f_code"):
+      co = f.f_code
+      internal = _internal_files.get(co.co_filename)
+      if internal is None:
+        internal = _internal_files[co.co_filename] = \
+            os.path.normcase(co.co_filename) in _srcfiles
+      if internal:
+        f = f.f_back
+        continue
+      sinfo = None
+      if stack_info:
+        sio = io.StringIO()
+        sio.write('Stack (most recent call last):\n')
+        traceback.print_stack(f, file=sio)
+        sinfo = sio.getvalue()
+        if sinfo[-1] == '\n':
+          sinfo = sinfo[:-1]
+        sio.close()
+      rv = (co.co_filename, f.f_lineno, co.co_name, sinfo)
+      break
+    return rv
+
+  def makeRecord(self, *args, **kwargs):
+    rv = super().makeRecord(*args, **kwargs)
+    # Added once here, instead of merging them into ``extra`` on every call.
+    # Anything passed in ``extra`` takes precedence
+    for key, value in extra_logger_variables.items():
+      rv.__dict__.setdefault(key, value)
+    return rv
+
+  def debug1(self, msg, *args, **kwargs):
+    '''
+    Logs a message with level :data:`DEBUG1` on this logger. Same as ``debug``
+    '''
+    if self.isEnabledFor(DEBUG1):
+      self._log(DEBUG1, msg, args, **kwargs)
+
+  def debug2(self, msg, *args, **kwargs):
+    '''
+    Logs a message with level :data:`DEBUG2` on this logger
+    '''
+    if self.isEnabledFor(DEBUG2):
+      self._log(DEBUG2, msg, args, **kwargs)
+
+  def debug3(self, msg, *args, **kwargs):
+    '''
+    Logs a message with level :data:`DEBUG3` on this logger
+    '''
+    if self.isEnabledFor(DEBUG3):
+      self._log(DEBUG3, msg, args, **kwargs)
+
+
+class LoggerAdapter(logging.LoggerAdapter):
+  '''
+  Terra's :class:`logging.LoggerAdapter`
+
+  Every call checks :func:`logging.Logger.isEnabledFor` once, before doing
+  anything else, and then goes straight to the logger. The
+  :data:`extra_logger_variables` are added by :class:`Logger` itself, so
+  ``extra`` is only merged in (see :func:`logging.LoggerAdapter.process`) when
+  the adapter was given different variables.
+  '''
+
+  def log(self, level, msg, *args, **kwargs):
+    if self.logger.isEnabledFor(level):
+      self._emit(level, msg, args, kwargs)
+
+  def _emit(self, level, msg, args, kwargs):
+    if self.extra is not extra_logger_variables:
+      msg, kwargs = self.process(msg, kwargs)
+    self.logger._log(level, msg, args, **kwargs)
+
+  def debug(self, msg, *args, **kwargs):
+    if self.logger.isEnabledFor(DEBUG1):
+      self._emit(DEBUG1, msg, args, kwargs)
+
+  def info(self, msg, *args, **kwargs):
+    if self.logger.isEnabledFor(INFO):
+      self._emit(INFO, msg, args, kwargs)
+
+  def warning(self, msg, *args, **kwargs):
+    if self.logger.isEnabledFor(WARNING):
+      self._emit(WARNING, msg, args, kwargs)
+
+  def error(self, msg, *args, **kwargs):
+    if self.logger.isEnabledFor(ERROR):
+      self._emit(ERROR, msg, args, kwargs)
+
+  def exception(self, msg, *args, exc_info=True, **kwargs):
+    if self.logger.isEnabledFor(ERROR):
+      kwargs['exc_info'] = exc_info
+      self._emit(ERROR, msg, args, kwargs)
+
+  def critical(self, msg, *args, **kwargs):
+    if self.logger.isEnabledFor(CRITICAL):
+      self._emit(CRITICAL, msg, args, kwargs)
+
+  fatal = critical
+
+  def debug1(self, msg, *args, **kwargs):
+    '''
+    Logs a message with level :data:`DEBUG1` on this logger. Same as ``debug``.
+    The arguments are interpreted as for :func:`logging.debug`
+    '''
+    if self.logger.isEnabledFor(DEBUG1):
+      self._emit(DEBUG1, msg, args, kwargs)
+
+  def debug2(self, msg, *args, **kwargs):
+    '''
+    Logs a message with level :data:`DEBUG2` on this logger. The arguments are
+    interpreted as for :func:`logging.debug`
+    '''
+    if self.logger.isEnabledFor(DEBUG2):
+      self._emit(DEBUG2, msg, args, kwargs)
+
+  def debug3(self, msg, *args, **kwargs):
+    '''
+    Logs a message with level :data:`DEBUG3` on this logger. The arguments are
+    interpreted as for :func:`logging.debug`
+    '''
+    if self.logger.isEnabledFor(DEBUG3):
+      self._emit(DEBUG3, msg, args, kwargs)
+
+  def log_lazy(self, level, function, *args, **kwargs):
+    '''
+    Logs the message returned by ``function`` with level ``level``. The
+    ``function`` is only called if a handler emits the record. See
+    :class:`LazyMessage`
+    '''
+    if self.logger.isEnabledFor(level):
+      self._emit(level, LazyMessage(function), args, kwargs)
+
+  def debug1_lazy(self, function, *args, **kwargs):
+    '''
+    Lazy version of :func:`debug1`, see :func:`log_lazy`
+    '''
+    self.log_lazy(DEBUG1, function, *args, **kwargs)
+
+  def debug2_lazy(self, function, *args, **kwargs):
+    '''
+    Lazy version of :func:`debug2`, see :func:`log_lazy`
+    '''
+    self.log_lazy(DEBUG2, function, *args, **kwargs)
+
+  def debug3_lazy(self, function, *args, **kwargs):
+    '''
+    Lazy version of :func:`debug3`, see :func:`log_lazy`
+    '''
+    self.log_lazy(DEBUG3, function, *args, **kwargs)
+
+  def info_lazy(self, function, *args, **kwargs):
+    '''
+    Lazy version of :func:`info`, see :func:`log_lazy`
+    '''
+    self.log_lazy(INFO, function, *args, **kwargs)
+
+  debug_lazy = debug1_lazy
+
+
+def getLogger(name=None, extra=extra_logger_variables):
+  logger = getLogger_original(name)
+  return LoggerAdapter(logger, extra)
+
+
+_srcfiles = (logging_srcfile,
+             os.path.normcase(getLogger.__code__.co_filename))
+
+
+DEBUG1 = 10
+'''
+Debug level one. Same as the original :data:`logging.DEBUG` level, but now
+called :data:`DEBUG1`.
+
+Should be used for general runtime debug messages that would be useful for
+users to see
+'''
+DEBUG2 = 9
+'''
+Debug level two, more verbose.
+
+Should be used for general development debug messages that would be useful for
+developer to see when debugging
+'''
+DEBUG3 = 8
+'''
+Debug level three, even more verbose.
+
+Should be used for more specific development debug messages, such as math
+output used to debug algorithms
+'''
+
+logging.addLevelName(DEBUG1, "DEBUG1")
+logging.addLevelName(DEBUG2, "DEBUG2")
+logging.addLevelName(DEBUG3, "DEBUG3")
+
+logging.setLoggerClass(Logger)
+
+# Get the logger here, AFTER all the changes to the logger class
+logger = getLogger(__name__)
+
+# Disable log setup for unittests. Can't use settings here ;)
+if os.environ.get('TERRA_UNITTEST', None) != "1":  # pragma: no cover
+  # Must be import signal after getLogger is defined... Currently this is
+  # imported from logger. But if a custom getLogger is defined eventually, it
+  # will need to be defined before importing terra.core.signals.
+  import terra.core.signals
+
+  # Configure logging (pre configure)
+  _logs = _SetupTerraLogger()
+
+  # register post_configure with settings
+  terra.core.signals.post_settings_configured.connect(_logs.configure_logger)
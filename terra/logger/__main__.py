@@ -0,0 +1,100 @@
+'''
+Command line tools for terra's log files, see :mod:`terra.logger.binary` and
+:mod:`terra.logger.index`
+'''
+
+import argparse
+import gzip
+import logging
+import sys
+
+from terra.logger.binary import (
+  decode, parse_level, parse_time, DEFAULT_FORMAT
+)
+from terra.logger.index import query
+
+
+def get_parser():
+  parser = argparse.ArgumentParser(
+      prog='python -m terra.logger',
+      description="Read terra's log files")
+  subparsers = parser.add_subparsers(dest='command')
+  subparsers.required = True
+
+  common = argparse.ArgumentParser(add_help=False)
+  common.add_argument('--level', type=parse_level, default=None,
+                      help='Minimum level, e.g. WARNING or DEBUG2')
+  common.add_argument('--logger', dest='loggers', action='append',
+                      default=None,
+                      help='Only this logger and its children. Can be '
+                           'repeated')
+  common.add_argument('--since', type=parse_time, default=None,
+                      help='Seconds since the epoch, or an iso format time')
+  common.add_argument('--until', type=parse_time, default=None,
+                      help='Seconds since the epoch, or an iso format time')
+  common.add_argument('--format', default=DEFAULT_FORMAT,
+                      help='Format of the records, see logging.format')
+  common.add_argument('--date-format', default=None,
+                      help='See logging.date_format')
+  common.add_argument('--style', default='%', choices=('%', '{', '$'),
+                      help='See logging.format_style')
+
+  decode_parser = subparsers.add_parser(
+      'decode', parents=[common], help='Format the records as text')
+  decode_parser.add_argument('files', nargs='+')
+
+  grep_parser = subparsers.add_parser(
+      'grep', parents=[common],
+      help='Format the records with a message matching a regular expression')
+  grep_parser.add_argument('pattern')
+  grep_parser.add_argument('files', nargs='+')
+
+  query_parser = subparsers.add_parser(
+      'query', help='Print the parts of an indexed text log that may contain '
+                    'matching records')
+  query_parser.add_argument('--level', type=parse_level, default=None,
+                            help='Only parts with records at or above this '
+                                 'level, e.g. ERROR')
+  query_parser.add_argument('--since', type=parse_time, default=None,
+                            help='Seconds since the epoch, or an iso format '
+                                 'time')
+  query_parser.add_argument('--until', type=parse_time, default=None,
+                            help='Seconds since the epoch, or an iso format '
+                                 'time')
+  query_parser.add_argument('--grep', dest='pattern', default=None,
+                            help='Only print the lines matching this regular '
+                                 'expression')
+  query_parser.add_argument('files', nargs='+')
+
+  return parser
+
+
+def main(args=None):
+  args = get_parser().parse_args(args)
+
+  if args.command == 'query':
+    for filename in args.files:
+      query(filename, sys.stdout, level=args.level, since=args.since,
+            until=args.until, pattern=args.pattern)
+    return 0
+
+  formatter = logging.Formatter(fmt=args.format, datefmt=args.date_format,
+                                style=args.style)
+  count = 0
+  for filename in args.files:
+    # Rotated segments are compressed
+    open_file = gzip.open if filename.endswith('.gz') else open
+    with open_file(filename, 'rb') as fid:
+      count += decode(fid, sys.stdout, formatter,
+                      pattern=getattr(args, 'pattern', None),
+                      level=args.level, loggers=args.loggers,
+                      since=args.since, until=args.until)
+
+  # Like grep, fail when nothing matched
+  if args.command == 'grep' and not count:
+    return 1
+  return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+  sys.exit(main())
@@ -0,0 +1,338 @@
+'''
+A compact binary format for terra's log file.
+
+Formatting every record as text is slow to write and slow to search once a log
+grows to several gigabytes. When :option:`logging.binary` is set, terra writes
+``terra_log.bin`` with a :class:`BinaryFileHandler` instead, and the records
+are only formatted when read back, by :func:`read_records` or by the command
+line tool:
+
+.. code-block:: bash
+
+    python -m terra.logger decode terra_log.bin
+    python -m terra.logger grep terra_log.bin 'Running' --level DEBUG1 \\
+        --logger terra.compute --since 2020-06-01T12:00
+
+Format
+------
+
+The file is a sequence of frames, each a little endian ``uint32`` length
+followed by that many bytes. The first byte of a frame is its type:
+
+* ``HEADER``: the magic ``TLOG`` and the format version. Written every time
+  the file is opened, and resets the string table
+* ``STRING``: a ``uint32`` id followed by a utf-8 string. Logger names, paths,
+  function names, etc. are interned, and only written the first time they
+  are used
+* ``RECORD``: the fixed size fields (time, level, process, line number and
+  the string ids) followed by the length prefixed message template, its
+  arguments as json, the exception text and the stack info. The level is an
+  ``int32``, it was a single byte in version 1, which is still read
+
+Records can be filtered by time, level and logger using only the fixed size
+fields, so records that don't match are never decoded or formatted.
+'''
+
+import datetime
+import json
+import logging
+import os
+import re
+import struct
+
+from terra.logger import extra_logger_variables
+
+
+MAGIC = b'TLOG'
+VERSION = 2
+
+HEADER = 0
+STRING = 1
+RECORD = 2
+
+DEFAULT_FORMAT = "%(asctime)s (%(hostname)s): %(levelname)s - %(message)s"
+'''str: The format used to decode records, the default of
+:option:`logging.format`'''
+
+_length = struct.Struct('<I')
+_header = struct.Struct('<B4sB')
+_string = struct.Struct('<BI')
+# type, created, levelno, process, lineno, and the string ids of name,
+# pathname, funcName, processName, threadName and the extra variables
+_record = struct.Struct('<BdiII6I')
+# The record of each version, custom levels can be above 255 since version 2
+_records = {1: struct.Struct('<BdBII6I'), VERSION: _record}
+
+# Only args of exactly these types are stored for formatting later, anything
+# else could format differently after a round trip through json
+_json_types = (str, int, float, bool, type(None))
+
+
+def _pack_string(value):
+  data = value.encode('utf-8', 'backslashreplace')
+  return _length.pack(len(data)) + data
+
+
+def _unpack_string(data, offset):
+  (length,) = _length.unpack_from(data, offset)
+  offset += _length.size
+  return data[offset:offset + length].decode('utf-8'), offset + length
+
+
+def _frame(data):
+  return _length.pack(len(data)) + data
+
+
+def _json_args(args):
+  '''
+  Returns the record ``args`` as json, or ``None`` if they can't be stored
+  '''
+  if isinstance(args, dict):
+    values = args.values()
+    if not all(type(key) is str for key in args):
+      return None
+  else:
+    values = args
+  if all(type(value) in _json_types for value in values):
+    return json.dumps(args, separators=(',', ':'))
+  return None
+
+
+class BinaryFileHandler(logging.FileHandler):
+  '''
+  A :class:`logging.FileHandler` that writes records in terra's binary log
+  format. Messages are not formatted, the message template and its arguments
+  are stored instead, unless the arguments are not simple json types.
+
+  Arguments
+  ---------
+  filename : str
+      The log file, always appended to
+  delay : bool, optional
+      Don't open the file until the first record is emitted
+  '''
+
+  def __init__(self, filename, delay=False):
+    self._strings = {}
+    super().__init__(filename, mode='ab', delay=delay)
+
+  def _open(self):
+    stream = open(self.baseFilename, self.mode)
+    # Every session starts with a header, so appending works
+    self._strings = {}
+    stream.write(_frame(_header.pack(HEADER, MAGIC, VERSION)))
+    return stream
+
+  def _intern(self, value, frames):
+    string_id = self._strings.get(value)
+    if string_id is None:
+      string_id = self._strings[value] = len(self._strings)
+      frames.append(_frame(_string.pack(STRING, string_id)
+                           + value.encode('utf-8', 'backslashreplace')))
+    return string_id
+
+  def encode(self, record):
+    '''
+    Encode a record as frames, including any new strings it interns
+
+    Returns
+    -------
+    bytes
+        The frames
+    '''
+    frames = []
+
+    msg = record.msg
+    args = None
+    if isinstance(msg, str) and record.args:
+      args = _json_args(record.args)
+    if args is None:
+      msg = record.getMessage()
+
+    if record.exc_info and not record.exc_text:
+      record.exc_text = (self.formatter or logging._defaultFormatter) \
+          .formatException(record.exc_info)
+
+    extra = json.dumps({key: getattr(record, key, value)
+                        for key, value in extra_logger_variables.items()},
+                       default=str)
+
+    fields = _record.pack(
+        RECORD, record.created, record.levelno, record.process or 0,
+        record.lineno or 0,
+        self._intern(record.name, frames),
+        self._intern(record.pathname, frames),
+        self._intern(record.funcName or '', frames),
+        self._intern(record.processName or '', frames),
+        self._intern(record.threadName or '', frames),
+        self._intern(extra, frames))
+
+    frames.append(_frame(fields
+                         + _pack_string(msg)
+                         + _pack_string(args or '')
+                         + _pack_string(record.exc_text or '')
+                         + _pack_string(record.stack_info or '')))
+    return b''.join(frames)
+
+  def emit(self, record):
+    try:
+      if self.stream is None:
+        self.stream = self._open()
+      self.stream.write(self.encode(record))
+      self.flush()
+    except Exception:
+      self.handleError(record)
+
+
+def _logger_matches(name, loggers):
+  return any(name == logger or name.startswith(logger + '.')
+             for logger in loggers)
+
+
+def read_records(fid, level=None, loggers=None, since=None, until=None):
+  '''
+  Read records written by :class:`BinaryFileHandler`, skipping any that don't
+  match the filters without decoding them. A truncated last record, from a
+  process that is still writing, is ignored
+
+  Arguments
+  ---------
+  fid : file
+      A file opened in binary mode
+  level : int, optional
+      The minimum level
+  loggers : list, optional
+      Only records from these loggers, or their children
+  since : float, optional
+      Only records created at or after this time
+  until : float, optional
+      Only records created before this time
+
+  Returns
+  -------
+  generator
+      Yields :class:`logging.LogRecord`
+  '''
+  strings = {}
+  record_struct = _record
+
+  while True:
+    head = fid.read(_length.size)
+    if len(head) < _length.size:
+      break
+    (length,) = _length.unpack(head)
+    data = fid.read(length)
+    if len(data) < length:
+      break
+
+    kind = data[0]
+    if kind == STRING:
+      (_, string_id) = _string.unpack_from(data)
+      strings[string_id] = data[_string.size:].decode('utf-8')
+      continue
+    elif kind == HEADER:
+      (_, magic, version) = _header.unpack_from(data)
+      if magic != MAGIC or version not in _records:
+        raise ValueError('Not a terra binary log file, or a newer version')
+      strings = {}
+      record_struct = _records[version]
+      continue
+    elif kind != RECORD:
+      raise ValueError(f'Unknown frame type {kind}')
+
+    (_, created, levelno, process, lineno, name_id, pathname_id, funcName_id,
+     processName_id, threadName_id, extra_id) = \
+        record_struct.unpack_from(data)
+
+    if level is not None and levelno < level:
+      continue
+    if since is not None and created < since:
+      continue
+    if until is not None and created >= until:
+      continue
+    name = strings[name_id]
+    if loggers and not _logger_matches(name, loggers):
+      continue
+
+    msg, offset = _unpack_string(data, record_struct.size)
+    args, offset = _unpack_string(data, offset)
+    exc_text, offset = _unpack_string(data, offset)
+    stack_info, offset = _unpack_string(data, offset)
+
+    if args:
+      args = json.loads(args)
+      if isinstance(args, list):
+        args = tuple(args)
+    else:
+      args = None
+
+    pathname = strings[pathname_id]
+    filename = os.path.basename(pathname)
+    record = logging.makeLogRecord({
+        'name': name, 'msg': msg, 'args': args, 'levelno': levelno,
+        'levelname': logging.getLevelName(levelno), 'pathname': pathname,
+        'filename': filename, 'module': os.path.splitext(filename)[0],
+        'lineno': lineno, 'funcName': strings[funcName_id],
+        'created': created, 'msecs': (created - int(created)) * 1000,
+        'process': process, 'processName': strings[processName_id],
+        'threadName': strings[threadName_id], 'exc_text': exc_text or None,
+        'stack_info': stack_info or None})
+    record.__dict__.update(json.loads(strings[extra_id]))
+    yield record
+
+
+def parse_time(value):
+  '''
+  Parse a time given either as seconds since the epoch, or in iso format (in
+  local time)
+  '''
+  try:
+    return float(value)
+  except ValueError:
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def parse_level(value):
+  '''
+  Parse a level given as a number or name, e.g. ``10`` or ``debug1``
+  '''
+  if value.isdigit():
+    return int(value)
+  level = logging.getLevelName(value.upper())
+  if not isinstance(level, int):
+    raise ValueError(f'Unknown level {value}')
+  return level
+
+
+def decode(fid, out, formatter, pattern=None, **filters):
+  '''
+  Format records from ``fid`` and write them to ``out``
+
+  Arguments
+  ---------
+  fid : file
+      A binary log file, opened in binary mode
+  out : file
+      Where to write the formatted records
+  formatter : :class:`logging.Formatter`
+      The formatter to use
+  pattern : str, optional
+      A regular expression the message must match, like ``grep``
+  **filters :
+      Passed to :func:`read_records`
+
+  Returns
+  -------
+  int
+      The number of records written
+  '''
+  if pattern is not None:
+    pattern = re.compile(pattern)
+
+  count = 0
+  for record in read_records(fid, **filters):
+    if pattern is not None and not pattern.search(record.getMessage()):
+      continue
+    out.write(formatter.format(record) + '\n')
+    count += 1
+  return count
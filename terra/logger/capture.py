@@ -0,0 +1,205 @@
+'''
+Capture of the output of services, see
+:option:`compute.capture_output.enabled`.
+
+By default, services run by the compute backends inherit terra's ``stdout`` and
+``stderr``, so the output of services running at the same time is interleaved
+on the console, and never reaches ``terra_log``. When captured, a service's
+``stdout`` and ``stderr`` are piped back to terra, and each line is logged on
+the ``terra.service.{name}`` logger, prefixed with the service name and pid,
+the same as records received by the :class:`terra.logger.LogRecordServer`.
+
+One reader thread per service waits on both pipes with :mod:`selectors` (a
+thread per pipe on Windows, where pipes can't be selected), and logs each line
+as soon as it is complete. Pipes are only read as fast as the lines are logged,
+so a service writing faster than terra can log blocks on its full pipe, rather
+than terra buffering without limit. Lines longer than ``max_line`` bytes are
+split.
+'''
+
+import asyncio
+import logging
+import os
+import selectors
+from subprocess import PIPE
+import threading
+
+from terra import settings
+
+
+class OutputCapture:
+  '''
+  Logs the ``stdout`` and ``stderr`` of a process, a line at a time
+
+  Pass :attr:`popen_kwargs` to :class:`subprocess.Popen`, and then call
+  :meth:`start` with the process, and :meth:`join` after it exits.
+
+  Arguments
+  ---------
+  name : str
+      The service name, to tag the records with
+  stdout_level : int, optional
+      The level ``stdout`` lines are logged at
+  stderr_level : int, optional
+      The level ``stderr`` lines are logged at
+  max_line : int, optional
+      The most bytes of a line logged in one record, longer lines are split
+  '''
+
+  popen_kwargs = {'stdout': PIPE, 'stderr': PIPE}
+  '''dict: The :class:`subprocess.Popen` arguments to pipe the output'''
+
+  chunk_size = 65536
+
+  def __init__(self, name, stdout_level=logging.INFO,
+               stderr_level=logging.WARNING, max_line=65536):
+    self.name = name
+    self.stdout_level = stdout_level
+    self.stderr_level = stderr_level
+    self.max_line = max_line
+    self.logger = logging.getLogger(f'terra.service.{name}')
+    self.pid = None
+    self.streams = []
+    self.threads = []
+
+  def start(self, process):
+    '''
+    Start reading the output of a process
+
+    Arguments
+    ---------
+    process : :class:`subprocess.Popen`
+        A process started with :attr:`popen_kwargs`
+    '''
+    self.pid = process.pid
+    streams = [(stream, level)
+               for stream, level in ((process.stdout, self.stdout_level),
+                                     (process.stderr, self.stderr_level))
+               if stream is not None]
+    self.streams = [stream for stream, _ in streams]
+
+    if os.name == 'nt':
+      self.threads = [threading.Thread(target=self._read_blocking,
+                                       args=(stream, level), daemon=True)
+                      for stream, level in streams]
+    else:
+      self.threads = [threading.Thread(target=self._read_selector,
+                                       args=(streams,), daemon=True)]
+    for thread in self.threads:
+      thread.start()
+
+  def join(self, timeout=None):
+    '''
+    Wait for all the output to be logged, once the process has exited
+    '''
+    for thread in self.threads:
+      thread.join(timeout)
+    for stream in self.streams:
+      stream.close()
+
+  async def aread(self, process):
+    '''
+    The :mod:`asyncio` version of :meth:`start` and :meth:`join`. Reads the
+    output of a process until it is closed
+
+    Arguments
+    ---------
+    process : :class:`asyncio.subprocess.Process`
+        A process started with :attr:`popen_kwargs`
+    '''
+    self.pid = process.pid
+
+    async def read(stream, level):
+      # The stream reader stops reading the pipe when its buffer is full
+      buffer = b''
+      while True:
+        data = await stream.read(self.chunk_size)
+        if not data:
+          break
+        buffer = self._log_lines(level, buffer + data)
+      if buffer:
+        self._log(level, buffer)
+
+    await asyncio.gather(*(read(stream, level) for stream, level in (
+        (process.stdout, self.stdout_level),
+        (process.stderr, self.stderr_level)) if stream is not None))
+
+  def _read_selector(self, streams):
+    buffers = {}
+    with selectors.DefaultSelector() as selector:
+      for stream, level in streams:
+        os.set_blocking(stream.fileno(), False)
+        selector.register(stream, selectors.EVENT_READ, level)
+        buffers[stream] = b''
+
+      while selector.get_map():
+        for key, _ in selector.select():
+          try:
+            data = os.read(key.fd, self.chunk_size)
+          except BlockingIOError:
+            continue
+          if data:
+            buffers[key.fileobj] = self._log_lines(
+                key.data, buffers[key.fileobj] + data)
+          else:
+            # End of file
+            selector.unregister(key.fileobj)
+            if buffers[key.fileobj]:
+              self._log(key.data, buffers[key.fileobj])
+
+  def _read_blocking(self, stream, level):
+    buffer = b''
+    while True:
+      data = os.read(stream.fileno(), self.chunk_size)
+      if not data:
+        break
+      buffer = self._log_lines(level, buffer + data)
+    if buffer:
+      self._log(level, buffer)
+
+  def _log_lines(self, level, buffer):
+    # Log the complete lines, and return the rest
+    *lines, buffer = buffer.split(b'\n')
+    if len(buffer) >= self.max_line:
+      lines.append(buffer)
+      buffer = b''
+    for line in lines:
+      for start in range(0, max(len(line), 1), self.max_line):
+        self._log(level, line[start:start + self.max_line])
+    return buffer
+
+  def _log(self, level, line):
+    if not self.logger.isEnabledFor(level):
+      return
+    line = line.rstrip(b'\r').decode('utf-8', 'replace')
+    # Not a '%s' template, so that rate limiting tells the lines apart
+    record = self.logger.makeRecord(
+        self.logger.name, level, '(unknown file)', 0,
+        f'[{self.name}:{self.pid}] {line}', (), None,
+        extra={'service': self.name})
+    self.logger.handle(record)
+
+
+def service_capture(service_info):
+  '''
+  Get an :class:`OutputCapture` for a service, if
+  :option:`compute.capture_output.enabled` is set
+
+  Arguments
+  ---------
+  service_info : :class:`terra.compute.base.BaseService`
+      The service being run
+
+  Returns
+  -------
+  :class:`OutputCapture`
+      ``None`` when not capturing
+  '''
+  capture = settings.compute.capture_output
+  if not capture.enabled:
+    return None
+  return OutputCapture(
+      type(service_info).__qualname__,
+      stdout_level=logging.getLevelName(capture.stdout_level.upper()),
+      stderr_level=logging.getLevelName(capture.stderr_level.upper()),
+      max_line=capture.max_line)
@@ -0,0 +1,258 @@
+'''
+A sparse index of terra's text log file, see :option:`logging.index.records`.
+
+Every ``records`` records, an entry is appended to the ``terra_log.idx``
+sidecar file, describing that block of records: where it starts and ends in
+``terra_log``, the times of its first and last records, the level of its first
+record, and the highest level seen in the block. Queries can then seek straight
+to a time range, or to the blocks with errors, without reading the whole log:
+
+.. code-block:: bash
+
+    python -m terra.logger query terra_log --level ERROR
+    python -m terra.logger query terra_log --since 2020-06-01T12:00 \\
+        --until 2020-06-01T12:05
+
+Parts of the log that aren't indexed, such as the block still being written,
+are always included by queries.
+'''
+
+import gzip
+import io
+import logging
+import re
+import struct
+
+from terra.logger.rotate import CountingMixin, RotatingMixin
+
+SUFFIX = '.idx'
+'''str: The suffix of the index sidecar file'''
+
+# start, end, first created, last created, first levelno, max levelno
+_entry = struct.Struct('<QQddBB')
+
+
+class IndexMixin(CountingMixin):
+  '''
+  Maintains a sparse index (see :mod:`terra.logger.index`) for a text
+  :class:`logging.FileHandler`
+
+  Arguments
+  ---------
+  index_records : int, optional
+      The number of records per index entry
+  '''
+
+  sidecars = (SUFFIX,)
+  '''tuple: Files that go with the log file, see
+  :class:`terra.logger.rotate.RotatingMixin`'''
+
+  def __init__(self, filename, *args, index_records=1000, **kwargs):
+    self.index_records = index_records
+    self.index_stream = None
+    self._block = None
+    super().__init__(filename, *args, **kwargs)
+
+  def _open(self):
+    # A new log file, e.g. after rotating. The old index stream still points
+    # to the old index file, even if it's been renamed
+    self._write_block()
+    if self.index_stream is not None:
+      self.index_stream.close()
+    stream = super()._open()
+    self.index_stream = open(self.baseFilename + SUFFIX, 'ab')
+    return stream
+
+  def _write_block(self):
+    if self._block is not None:
+      self.index_stream.write(_entry.pack(*self._block[:6]))
+      self.index_stream.flush()
+      self._block = None
+
+  def emit(self, record):
+    try:
+      if self.stream is None:
+        self.stream = self._open()
+
+      if self._block is None:
+        # Where this record will start
+        offset = self.stream_size
+        # start, end, first created, last created, first levelno,
+        # max levelno, count
+        self._block = [offset, offset, record.created, record.created,
+                       min(record.levelno, 255), 0, 0]
+    except Exception:
+      self.handleError(record)
+      return
+
+    super().emit(record)
+
+    try:
+      block = self._block
+      block[1] = self.stream_size
+      block[3] = record.created
+      block[5] = max(block[5], min(record.levelno, 255))
+      block[6] += 1
+      if block[6] >= self.index_records:
+        self._write_block()
+    except Exception:
+      self.handleError(record)
+
+  def close(self):
+    self.acquire()
+    try:
+      if self.index_stream is not None:
+        self._write_block()
+        self.index_stream.close()
+        self.index_stream = None
+    finally:
+      self.release()
+    super().close()
+
+
+class IndexedFileHandler(IndexMixin, logging.FileHandler):
+  '''
+  A :class:`logging.FileHandler` that maintains a sparse index. See
+  :class:`IndexMixin`
+  '''
+
+  def __init__(self, filename, **kwargs):
+    super().__init__(filename, 'a', **kwargs)
+
+
+class IndexedRotatingFileHandler(RotatingMixin, IndexMixin,
+                                 logging.FileHandler):
+  '''
+  A :class:`terra.logger.rotate.RotatingFileHandler` that maintains a sparse
+  index. Each rotated segment keeps its own index. See :class:`IndexMixin`
+  '''
+
+  def __init__(self, filename, **kwargs):
+    super().__init__(filename, 'a', **kwargs)
+
+
+def read_index(filename):
+  '''
+  Read the index of a log file
+
+  Arguments
+  ---------
+  filename : str
+      The log file, not the index file
+
+  Returns
+  -------
+  list
+      ``(start, end, first_created, last_created, first_levelno,
+      max_levelno)`` tuples, one per block, in file order. Empty if there is
+      no index
+  '''
+  try:
+    with open(filename + SUFFIX, 'rb') as fid:
+      data = fid.read()
+  except FileNotFoundError:
+    return []
+  # Ignore a partially written last entry
+  data = data[:len(data) - len(data) % _entry.size]
+  return sorted(_entry.iter_unpack(data))
+
+
+def find_blocks(index, size, level=None, since=None, until=None):
+  '''
+  Find the parts of a log file that may contain matching records
+
+  Arguments
+  ---------
+  index : list
+      The index, from :func:`read_index`
+  size : int
+      The size of the log file
+  level : int, optional
+      Only blocks with records at or above this level
+  since : float, optional
+      Only blocks with records created at or after this time
+  until : float, optional
+      Only blocks with records created before this time
+
+  Returns
+  -------
+  list
+      ``(start, end, max_levelno)`` of each part, where ``max_levelno`` is
+      ``None`` for parts that aren't indexed
+  '''
+  blocks = []
+  position = 0
+  for start, end, first_created, last_created, _, max_levelno in index:
+    if start > position:
+      blocks.append((position, start, None))
+    position = max(position, end)
+
+    if level is not None and max_levelno < level:
+      continue
+    if since is not None and last_created < since:
+      continue
+    if until is not None and first_created >= until:
+      continue
+    blocks.append((start, end, max_levelno))
+
+  if position < size:
+    blocks.append((position, size, None))
+  return blocks
+
+
+def query(filename, out, level=None, since=None, until=None, pattern=None):
+  '''
+  Write the blocks of a text log file that may contain matching records to
+  ``out``, each preceded by a header line
+
+  Arguments
+  ---------
+  filename : str
+      The log file. A rotated segment may be compressed (``.gz``), its index
+      is not
+  out : file
+      Where to write the blocks
+  level : int, optional
+      See :func:`find_blocks`
+  since : float, optional
+      See :func:`find_blocks`
+  until : float, optional
+      See :func:`find_blocks`
+  pattern : str, optional
+      Only write the lines of the blocks matching this regular expression
+
+  Returns
+  -------
+  int
+      The number of blocks written
+  '''
+  if pattern is not None:
+    pattern = re.compile(pattern)
+
+  if filename.endswith('.gz'):
+    fid = gzip.open(filename, 'rb')
+    index = read_index(filename[:-3])
+  else:
+    fid = open(filename, 'rb')
+    index = read_index(filename)
+
+  with fid:
+    size = fid.seek(0, io.SEEK_END)
+    blocks = find_blocks(index, size, level, since, until)
+    for start, end, max_levelno in blocks:
+      if max_levelno is None:
+        out.write(f'==> {filename} {start}-{end} (not indexed) <==\n')
+      else:
+        out.write(f'==> {filename} {start}-{end} (max level '
+                  f'{logging.getLevelName(max_levelno)}) <==\n')
+      fid.seek(start)
+      remaining = end - start
+      while remaining > 0:
+        line = fid.readline(remaining)
+        if not line:
+          break
+        remaining -= len(line)
+        line = line.decode('utf-8', 'replace')
+        if pattern is None or pattern.search(line):
+          out.write(line if line.endswith('\n') else line + '\n')
+  return len(blocks)
@@ -0,0 +1,159 @@
+'''
+Rate limiting of repetitive log records, see
+:option:`logging.rate_limit.records`.
+
+Records are grouped by their logger, level and message template (the message
+before it is merged with its arguments), so a warning logged for every item in
+a loop is one group. Only the first ``records`` of each group are let through
+per ``interval``; the rest are counted, and replaced with a single "Suppressed
+K similar messages" record, logged when the interval is over, or at exit.
+'''
+
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+from terra.logger import LazyMessage
+
+
+class RateLimitFilter(logging.Filter):
+  '''
+  A :class:`logging.Filter` that lets at most ``records`` records from each
+  group through per ``interval`` seconds.
+
+  The same filter can be added to several handlers, the decision is stored on
+  the record so it is only counted once.
+
+  Arguments
+  ---------
+  records : int
+      The number of records let through per group per interval
+  interval : float, optional
+      The length of an interval, in seconds
+  max_keys : int, optional
+      The number of groups tracked. When full, the least recently used group
+      is dropped (after logging its summary)
+  '''
+
+  summary_message = 'Suppressed %d similar messages: %s'
+
+  def __init__(self, records, interval=60, max_keys=1000):
+    super().__init__()
+    self.records = records
+    self.interval = interval
+    self.max_keys = max_keys
+    # key: [interval start, count, suppressed]
+    self.groups = OrderedDict()
+    self.lock = threading.Lock()
+    self.next_sweep = None
+    self._timer = None
+
+  @staticmethod
+  def key(record):
+    msg = record.msg
+    if isinstance(msg, LazyMessage):
+      # The message isn't built yet, group by the code that builds it
+      msg = getattr(msg.function, '__code__', msg.function)
+    elif not isinstance(msg, str):
+      msg = str(msg)
+    return (record.name, record.levelno, msg)
+
+  def filter(self, record):
+    allowed = getattr(record, '_terra_rate_limit', None)
+    if allowed is not None:
+      return allowed
+
+    summaries = []
+    now = record.created
+    key = self.key(record)
+
+    with self.lock:
+      group = self.groups.get(key)
+      if group is None:
+        group = self.groups[key] = [now, 0, 0]
+        if len(self.groups) > self.max_keys:
+          old_key, old_group = self.groups.popitem(last=False)
+          if old_group[2]:
+            summaries.append((old_key, old_group[2]))
+      else:
+        self.groups.move_to_end(key)
+        if now - group[0] >= self.interval:
+          if group[2]:
+            summaries.append((key, group[2]))
+          group[:] = [now, 0, 0]
+
+      group[1] += 1
+      allowed = group[1] <= self.records
+      if not allowed:
+        group[2] += 1
+        if self._timer is None:
+          self._start_timer()
+
+      # Summarize groups that aren't logged again, once per interval
+      if self.next_sweep is None:
+        self.next_sweep = now + self.interval
+      elif now >= self.next_sweep:
+        self.next_sweep = now + self.interval
+        for other_key, other_group in self.groups.items():
+          if other_group[2] and now - other_group[0] >= self.interval:
+            summaries.append((other_key, other_group[2]))
+            other_group[:] = [now, 0, 0]
+
+    for summary in summaries:
+      self.log_summary(*summary)
+
+    record._terra_rate_limit = allowed
+    return allowed
+
+  def _start_timer(self):
+    # Summarizes groups that go quiet, since nothing else would until exit
+    self._timer = threading.Timer(self.interval, self._on_timer)
+    self._timer.daemon = True
+    self._timer.start()
+
+  def _on_timer(self):
+    with self.lock:
+      self._timer = None
+    self.flush(time.time())
+    with self.lock:
+      if self._timer is None and any(group[2]
+                                     for group in self.groups.values()):
+        self._start_timer()
+
+  def flush(self, now=None):
+    '''
+    Log the summary of the groups with suppressed records
+
+    Arguments
+    ---------
+    now : float, optional
+        Only summarize the groups whose interval is over by this time. By
+        default, every group is summarized, e.g. at exit
+    '''
+    summaries = []
+    with self.lock:
+      for key, group in self.groups.items():
+        if group[2] and (now is None or now - group[0] >= self.interval):
+          summaries.append((key, group[2]))
+          if now is None:
+            group[2] = 0
+          else:
+            group[:] = [now, 0, 0]
+
+    for summary in summaries:
+      self.log_summary(*summary)
+
+  def log_summary(self, key, suppressed):
+    '''
+    Log the summary record for a group, on the group's logger
+    '''
+    name, levelno, msg = key
+    if not isinstance(msg, str):
+      msg = getattr(msg, 'co_name', msg)
+    summary = logging.getLogger(name).makeRecord(
+        name, levelno, '(unknown file)', 0, self.summary_message,
+        (suppressed, msg), None)
+    # Never rate limited itself
+    summary._terra_rate_limit = True
+    logging.getLogger(name).handle(summary)
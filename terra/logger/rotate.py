@@ -0,0 +1,276 @@
+'''
+Rotation of terra's log file, see :option:`logging.rotate.max_bytes` and
+:option:`logging.rotate.interval`.
+
+When the log file gets too big or too old, it is renamed with the time it was
+rotated, e.g. ``terra_log.2020-06-01_12-00-00``, and a new log file is started.
+Rotated segments are then compressed with gzip by a background thread, so
+logging never waits on compression. The compressed segments can be read with
+``zless``, ``zgrep``, etc., and binary segments with
+``python -m terra.logger``.
+'''
+
+import atexit
+import glob
+import gzip
+import io
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+
+from terra.logger import getLogger
+from terra.logger.binary import BinaryFileHandler
+logger = getLogger(__name__)
+
+
+class _Compressor:
+  '''
+  Compresses files with gzip on a background thread
+  '''
+
+  def __init__(self):
+    self.queue = queue.Queue()
+    self.lock = threading.Lock()
+    self.pid = None
+
+  def submit(self, filename):
+    with self.lock:
+      # Start a thread in each process, threads don't survive a fork
+      if self.pid != os.getpid():
+        self.pid = os.getpid()
+        self.queue = queue.Queue()
+        threading.Thread(target=self._run, name='TerraLogCompressor',
+                         daemon=True).start()
+        atexit.register(self.join)
+    self.queue.put(filename)
+
+  def join(self):
+    '''
+    Wait for all submitted files to be compressed
+    '''
+    if self.pid == os.getpid():
+      self.queue.join()
+
+  def _run(self):
+    while True:
+      filename = self.queue.get()
+      try:
+        compress(filename)
+      except FileNotFoundError:
+        # Already removed, because of backup_count
+        pass
+      except OSError:
+        logger.warning(f'Failed to compress {filename}', exc_info=True)
+      finally:
+        self.queue.task_done()
+
+
+compressor = _Compressor()
+''':class:`_Compressor`: Compresses rotated log files'''
+
+
+def compress(filename):
+  '''
+  Compress ``filename`` to ``filename.gz``, and remove it. The compressed file
+  only appears once it is complete.
+  '''
+  with open(filename, 'rb') as src, \
+      gzip.open(filename + '.gz.tmp', 'wb') as dst:
+    shutil.copyfileobj(src, dst)
+  os.replace(filename + '.gz.tmp', filename + '.gz')
+  try:
+    os.remove(filename)
+  except FileNotFoundError:
+    # Removed while being compressed, because of backup_count
+    os.remove(filename + '.gz')
+
+
+_segment_pattern = re.compile(
+    r'\.(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})(?:\.(\d+))?')
+
+
+class _CountingStream:
+  '''
+  Wraps a log file stream, counting the bytes written to it, so the size of
+  the file is known without an ``os.fstat`` for every record
+  '''
+
+  def __init__(self, stream):
+    self.stream = stream
+    # The end of the file, plus anything still buffered, e.g. the header of a
+    # binary log
+    self.size = stream.tell()
+    if isinstance(stream, io.TextIOBase):
+      self._encoding = stream.encoding
+      self._errors = stream.errors
+      # "\n" is written as os.linesep
+      self._newline_bytes = len(os.linesep) - 1
+    else:
+      self._encoding = None
+
+  def write(self, data):
+    written = self.stream.write(data)
+    if self._encoding is None:
+      self.size += len(data)
+    else:
+      self.size += len(data.encode(self._encoding, self._errors))
+      if self._newline_bytes:
+        self.size += data.count('\n') * self._newline_bytes
+    return written
+
+  def __getattr__(self, name):
+    return getattr(self.stream, name)
+
+
+class CountingMixin:
+  '''
+  Opens the stream of a :class:`logging.FileHandler` wrapped to count the
+  bytes written, see :attr:`stream_size`. The size is only looked up again
+  when the file is opened, e.g. after rotating
+  '''
+
+  @property
+  def stream_size(self):
+    '''
+    int: The size of the log file, including what is still buffered
+    '''
+    return self.stream.size
+
+  def _open(self):
+    return _CountingStream(super()._open())
+
+
+class RotatingMixin(CountingMixin):
+  '''
+  Adds rotation by size and time to a :class:`logging.FileHandler`
+
+  Arguments
+  ---------
+  max_bytes : int, optional
+      Rotate once the file is at least this big. ``0`` disables rotation by
+      size
+  interval : float, optional
+      Rotate after this many seconds. ``0`` disables rotation by time
+  backup_count : int, optional
+      The number of rotated segments to keep, ``0`` keeps them all
+  compress : bool, optional
+      Compress rotated segments with gzip
+  '''
+
+  def __init__(self, filename, *args, max_bytes=0, interval=0,
+               backup_count=0, compress=True, **kwargs):
+    self.max_bytes = max_bytes
+    self.interval = interval
+    self.backup_count = backup_count
+    self.compress = compress
+
+    # Like logging.handlers.TimedRotatingFileHandler, an existing file is as
+    # old as its last modification
+    if os.path.exists(filename):
+      start = os.stat(filename).st_mtime
+    else:
+      start = time.time()
+    self.rollover_at = start + interval if interval else None
+
+    super().__init__(filename, *args, **kwargs)
+
+  def shouldRollover(self, record):
+    if self.rollover_at is not None and record.created >= self.rollover_at:
+      return True
+    if self.max_bytes and self.stream is not None \
+        and self.stream_size >= self.max_bytes:
+      return True
+    return False
+
+  def _segment_key(self, filename):
+    match = _segment_pattern.fullmatch(filename[len(self.baseFilename):])
+    if match:
+      # The time, and then the count, if any
+      return (match.group(1), int(match.group(2) or 0))
+    return None
+
+  def segments(self):
+    '''
+    Returns the rotated segments, oldest first
+    '''
+    segments = {}
+    for filename in glob.glob(glob.escape(self.baseFilename) + '.*'):
+      if filename.endswith('.gz'):
+        filename = filename[:-3]
+      key = self._segment_key(filename)
+      if key:
+        segments[filename] = key
+    return sorted(segments, key=segments.get)
+
+  def rotated_filename(self):
+    '''
+    Returns the name for a new rotated segment, newer than all the existing
+    segments
+    '''
+    now = time.strftime('%Y-%m-%d_%H-%M-%S')
+    counts = [self._segment_key(segment)[1] for segment in self.segments()
+              if self._segment_key(segment)[0] == now]
+    if not counts:
+      return f'{self.baseFilename}.{now}'
+    return f'{self.baseFilename}.{now}.{max(counts) + 1}'
+
+  def doRollover(self):
+    # Files that go with the log file, e.g. an index, are defined by the
+    # other classes mixed in
+    sidecars = getattr(self, 'sidecars', ())
+
+    if self.stream:
+      self.stream.close()
+      self.stream = None
+
+    if os.path.exists(self.baseFilename):
+      rotated = self.rotated_filename()
+      os.rename(self.baseFilename, rotated)
+      for sidecar in sidecars:
+        if os.path.exists(self.baseFilename + sidecar):
+          os.rename(self.baseFilename + sidecar, rotated + sidecar)
+      if self.compress:
+        compressor.submit(rotated)
+
+    if self.backup_count:
+      for segment in self.segments()[:-self.backup_count]:
+        for filename in (segment, segment + '.gz') + tuple(
+            segment + sidecar for sidecar in sidecars):
+          try:
+            os.remove(filename)
+          except FileNotFoundError:
+            pass
+
+    if self.interval:
+      self.rollover_at = time.time() + self.interval
+    self.stream = self._open()
+
+  def emit(self, record):
+    try:
+      if self.shouldRollover(record):
+        self.doRollover()
+    except Exception:
+      self.handleError(record)
+      return
+    super().emit(record)
+
+
+class RotatingFileHandler(RotatingMixin, logging.FileHandler):
+  '''
+  A :class:`logging.FileHandler` for text logs, rotated by size and time. See
+  :class:`RotatingMixin`
+  '''
+
+  def __init__(self, filename, **kwargs):
+    super().__init__(filename, 'a', **kwargs)
+
+
+class RotatingBinaryFileHandler(RotatingMixin, BinaryFileHandler):
+  '''
+  A :class:`terra.logger.binary.BinaryFileHandler`, rotated by size and time.
+  See :class:`RotatingMixin`
+  '''
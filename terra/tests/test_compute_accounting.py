@@ -0,0 +1,67 @@
+import os
+import signal
+from subprocess import Popen
+import sys
+from unittest import mock, skipUnless
+
+from terra.compute import accounting, scheduler
+from .utils import TestCase
+
+
+class TestAccounting(TestCase):
+  def write(self, name, data):
+    filename = os.path.join(self.temp_dir.name, name)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'w') as fid:
+      fid.write(data)
+
+  def test_cgroup_v2(self):
+    group = 'docker/abc/'
+    self.write(group + 'cpu.stat', 'usage_usec 3500000\nuser_usec 2500000\n'
+                                   'system_usec 1000000\n')
+    self.write(group + 'memory.peak', '4096\n')
+    self.write(group + 'io.stat', '8:0 rbytes=100 wbytes=200 rios=1 wios=2\n'
+                                  '8:16 rbytes=10 wbytes=20 rios=1 wios=2\n')
+    with mock.patch.object(scheduler, 'cgroup_root', self.temp_dir.name):
+      self.assertEqual(accounting.container_usage('abc'),
+                       {'user_time': 2.5, 'system_time': 1, 'max_rss': 4096,
+                        'read_bytes': 110, 'write_bytes': 220})
+      self.assertIsNone(accounting.container_usage('def'))
+
+  def test_cgroup_v1(self):
+    self.write('cpuacct/docker/abc/cpuacct.usage_user', '2000000000\n')
+    self.write('cpuacct/docker/abc/cpuacct.usage_sys', '500000000\n')
+    self.write('memory/docker/abc/memory.max_usage_in_bytes', '8192\n')
+    self.write('blkio/docker/abc/blkio.throttle.io_service_bytes',
+               '8:0 Read 100\n8:0 Write 200\n8:0 Sync 300\n8:0 Async 0\n'
+               '8:0 Total 300\nTotal 300\n')
+    with mock.patch.object(scheduler, 'cgroup_root', self.temp_dir.name):
+      self.assertEqual(accounting.container_usage('abc'),
+                       {'user_time': 2, 'system_time': 0.5, 'max_rss': 8192,
+                        'read_bytes': 100, 'write_bytes': 200})
+
+  @skipUnless(hasattr(os, 'wait4'), 'Requires os.wait4')
+  def test_wait(self):
+    process = Popen([sys.executable, '-c', 'raise SystemExit(2)'])
+    returncode, usage = accounting.wait(process)
+    self.assertEqual(returncode, 2)
+    self.assertEqual(set(usage), set(accounting.usage_keys))
+    # Popen knows it exited
+    self.assertEqual(process.wait(), 2)
+
+    process = Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+    process.send_signal(signal.SIGTERM)
+    self.assertEqual(accounting.wait(process)[0], -signal.SIGTERM)
+
+  def test_monitor_stop(self):
+    usage = dict.fromkeys(accounting.usage_keys)
+    with mock.patch.object(accounting, 'find_container', lambda label: 'abc'),\
+        mock.patch.object(accounting, 'container_usage',
+                          return_value=usage) as container_usage:
+      monitor = accounting.ContainerMonitor('terra.run=abc', 60)
+      monitor.start()
+      # Read once more when stopped
+      self.assertIs(monitor.stop(), usage)
+      self.assertEqual(container_usage.call_count, 2)
+      self.assertIs(monitor.stop(), usage)
+      self.assertEqual(container_usage.call_count, 2)
@@ -1,4 +1,7 @@
+import asyncio
 import os
+import threading
+import time
 from unittest import mock
 
 from terra import settings
@@ -36,6 +39,50 @@ class TestServiceBase(TestCase):
     # Make sure BAR is isolated from process env
     self.assertNotIn("BAR", os.environ)
 
+  @mock.patch.dict(os.environ, {'FOO': "BAR"})
+  def test_env_shared(self):
+    service1 = base.BaseService()
+    service2 = base.BaseService()
+    self.assertIs(service1.env.base, service2.env.base)
+    service1.env['BAR'] = 'foo'
+    self.assertNotIn('BAR', service2.env)
+
+    # A new snapshot once os.environ changes
+    os.environ['FOO'] = 'BAZ'
+    service3 = base.BaseService()
+    self.assertEqual(service3.env['FOO'], 'BAZ')
+    self.assertEqual(service1.env['FOO'], 'BAR')
+
+  def test_env_overlay(self):
+    env = base.EnvOverlay({'A': '1', 'B': '2', 'C': '3'})
+    env['A'] = '10'
+    env['D'] = '4'
+    del env['B']
+    env['C'] = '3'
+    self.assertEqual(dict(env), {'A': '10', 'C': '3', 'D': '4'})
+    self.assertEqual(len(env), 3)
+    self.assertNotIn('B', env)
+    self.assertEqual(env.base, {'A': '1', 'B': '2', 'C': '3'})
+    self.assertEqual(env.diff(), ['- B: 2', '~ A: 1 -> 10', '+ D: 4'])
+
+    with self.assertRaises(KeyError):
+      env['B']
+    with self.assertRaises(KeyError):
+      del env['B']
+
+    # Deleting a changed variable that is in the base
+    del env['A']
+    self.assertEqual(dict(env), {'C': '3', 'D': '4'})
+    env['B'] = '20'
+    self.assertEqual(env['B'], '20')
+    self.assertEqual(len(env), 3)
+
+    env2 = env.copy()
+    env2['E'] = '5'
+    self.assertNotIn('E', env)
+    self.assertIs(env2.base, env.base)
+    self.assertEqual(dict(env2), {'B': '20', 'C': '3', 'D': '4', 'E': '5'})
+
   def test_add_volumes(self):
     service = base.BaseService()
     # Add a volumes
@@ -65,6 +112,135 @@ class TestServiceBase(TestCase):
                   base.services)
 
 
+class TestCompute(base.BaseCompute):
+  def foo_service(self, service_info, *args):
+    return service_info, args
+
+
+class TestComputeCommands(TestCase):
+  def test_command(self):
+    compute = TestCompute()
+    service = base.BaseService()
+    self.assertEqual(compute.foo(service, 1, 2), (service, (1, 2)))
+    self.assertEqual(compute.foo.__name__, 'foo')
+    self.assertEqual(compute.foo.__qualname__, 'TestCompute.foo')
+
+  def test_command_cached(self):
+    compute = TestCompute()
+    command = compute.foo
+    # Installed on the class, so __getattr__ is not used again
+    self.assertIs(TestCompute.__dict__['foo'], command.__func__)
+    with mock.patch.object(base.BaseCompute, '_command') as patch:
+      self.assertIs(compute.foo.__func__, command.__func__)
+      self.assertIs(TestCompute().foo.__func__, command.__func__)
+    patch.assert_not_called()
+
+  def test_no_implementation(self):
+    compute = TestCompute()
+    with self.assertRaisesRegex(AttributeError, 'bar_service'):
+      compute.bar
+    self.assertNotIn('bar', TestCompute.__dict__)
+
+
+class RunManyCompute(base.BaseCompute):
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.active = 0
+    self.max_active = 0
+
+  def run_service(self, service_info):
+    with self.lock:
+      self.active += 1
+      self.max_active = max(self.max_active, self.active)
+    time.sleep(service_info.delay)
+    with self.lock:
+      self.active -= 1
+    if service_info.fail:
+      raise base.ServiceRunFailed()
+    return service_info.index
+
+
+class RunManyService(base.BaseService):
+  def __init__(self, index, delay=0.01, fail=False):
+    super().__init__()
+    self.index = index
+    self.delay = delay
+    self.fail = fail
+    self.calls = []
+
+  def pre_run(self):
+    self.calls.append('pre_run')
+
+  def post_run(self):
+    self.calls.append('post_run')
+
+
+class TestRunMany(TestCase):
+  def test_run_many(self):
+    compute = RunManyCompute()
+    services = [RunManyService(x, fail=x == 2) for x in range(6)]
+    futures = compute.run_many(services, max_parallel=2)
+
+    self.assertEqual(len(futures), 6)
+    for index, future in enumerate(futures):
+      if index == 2:
+        self.assertIsInstance(future.exception(), base.ServiceRunFailed)
+      else:
+        self.assertEqual(future.result(), index)
+    self.assertEqual(compute.max_active, 2)
+    self.assertEqual(services[0].calls, ['pre_run', 'post_run'])
+    # post_run is skipped when the service fails
+    self.assertEqual(services[2].calls, ['pre_run'])
+
+  def test_as_completed(self):
+    compute = RunManyCompute()
+    services = [RunManyService(0, delay=0.5), RunManyService(1)]
+    futures = list(compute.run_many(services, max_parallel=2,
+                                    as_completed=True))
+    self.assertEqual([future.result() for future in futures], [1, 0])
+
+
+class AsyncService(RunManyService):
+  async def apre_run(self):
+    self.calls.append('apre_run')
+
+
+class TestArun(TestCase):
+  def test_arun_sync(self):
+    # Sync services and computes run in the executor
+    compute = RunManyCompute()
+    service = RunManyService(3)
+    self.assertEqual(asyncio.run(compute.arun(service)), 3)
+    self.assertEqual(service.calls, ['pre_run', 'post_run'])
+
+  def test_arun_async(self):
+    compute = RunManyCompute()
+    service = AsyncService(4)
+
+    async def arun_service(service_info):
+      return 'async'
+    compute.arun_service = arun_service
+
+    self.assertEqual(asyncio.run(compute.arun(service)), 'async')
+    self.assertEqual(service.calls, ['apre_run', 'post_run'])
+    self.assertEqual(compute.max_active, 0)
+
+  def test_arun_many(self):
+    compute = RunManyCompute()
+    services = [RunManyService(x, delay=0.2, fail=x == 1) for x in range(3)]
+
+    async def run():
+      return await asyncio.gather(
+          *(compute.arun(service) for service in services),
+          return_exceptions=True)
+
+    results = asyncio.run(run())
+    self.assertEqual(results[0], 0)
+    self.assertIsInstance(results[1], base.ServiceRunFailed)
+    self.assertEqual(results[2], 2)
+    self.assertEqual(compute.max_active, 3)
+
+
 class TestUnitTests(TestCase):
   def last_test_registered_services(self):
     self.assertFalse(
@@ -0,0 +1,217 @@
+import asyncio
+import os
+import threading
+from unittest import mock
+
+from terra import settings
+from terra.compute import base, cache
+from .utils import TestCase
+
+
+class Compute(base.BaseCompute):
+  def __init__(self):
+    self.runs = []
+
+  def run_service(self, service_info):
+    self.runs.append(service_info.name)
+    with open(settings.test.output_file, 'w') as fid:
+      fid.write(f'{service_info.name} {len(self.runs)}')
+    return service_info.result
+
+
+class Service(base.BaseService):
+  outputs = ('test.output_file',)
+  inputs = ('test.input_file',)
+
+  def __init__(self, name='a', result='done'):
+    super().__init__()
+    self.name = name
+    self.result = result
+
+
+class TestServiceCache(TestCase):
+  def setUp(self):
+    self.patches.append(mock.patch.object(settings, '_wrapped', None))
+    self.patches.append(mock.patch.dict(cache.stats, hits=0, misses=0))
+    super().setUp()
+    self.input_file = os.path.join(self.temp_dir.name, 'input.txt')
+    self.output_file = os.path.join(self.temp_dir.name, 'out', 'output.txt')
+    settings.configure({
+        'processing_dir': self.temp_dir.name,
+        'compute': {'cache': {'enabled': True}},
+        'test': {'input_file': self.input_file,
+                 'output_file': self.output_file},
+        'foo': 'bar'})
+    os.makedirs(os.path.dirname(self.output_file))
+    self.write(self.input_file, 'input')
+    self.compute = Compute()
+
+  def write(self, filename, data):
+    with open(filename, 'w') as fid:
+      fid.write(data)
+
+  def read(self, filename):
+    with open(filename, 'r') as fid:
+      return fid.read()
+
+  def test_hit(self):
+    self.assertEqual(self.compute.run(Service()), 'done')
+    os.remove(self.output_file)
+
+    with self.assertLogs(cache.__name__, level='INFO') as cm:
+      self.assertEqual(self.compute.run(Service()), 'done')
+    self.assertEqual(self.compute.runs, ['a'])
+    self.assertEqual(self.read(self.output_file), 'a 1')
+    self.assertIn('Cache hit for Service', cm.output[0])
+    self.assertIn('1 hits, 1 misses', cm.output[0])
+
+    # Restored as a hard link
+    entry_dir = cache.service_cache(Service()).entry_dir
+    self.assertTrue(os.path.samefile(self.output_file,
+                                     os.path.join(entry_dir, '0')))
+
+  def test_disabled(self):
+    settings.compute.cache.enabled = False
+    self.compute.run(Service())
+    self.compute.run(Service())
+    self.assertEqual(self.compute.runs, ['a', 'a'])
+    self.assertNotExist(settings.compute.cache.cache_dir)
+
+  def test_no_outputs(self):
+    service = Service()
+    service.outputs = ()
+    self.assertIsNone(cache.service_cache(service))
+
+  def test_cache_dir_output(self):
+    service = Service()
+    service.outputs = ('processing_dir',)
+    with self.assertLogs(cache.__name__, level='WARNING') as cm:
+      self.assertIsNone(cache.service_cache(service))
+    self.assertIn('overlaps the cache directory', cm.output[0])
+
+    with self.assertLogs(cache.__name__, level='WARNING'):
+      self.compute.run(service)
+      service = Service()
+      service.outputs = ('processing_dir',)
+      self.compute.run(service)
+    self.assertEqual(self.compute.runs, ['a', 'a'])
+    self.assertNotExist(settings.compute.cache.cache_dir)
+
+  def test_input_changed(self):
+    self.compute.run(Service())
+    self.write(self.input_file, 'changed')
+    self.compute.run(Service())
+    self.assertEqual(self.compute.runs, ['a', 'a'])
+
+  def test_content_hash(self):
+    settings.compute.cache.content_hash = True
+    self.compute.run(Service())
+    # Same contents, only a new modification time
+    stat = os.stat(self.input_file)
+    os.utime(self.input_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    self.compute.run(Service())
+    self.assertEqual(self.compute.runs, ['a'])
+
+    self.write(self.input_file, 'changed')
+    self.compute.run(Service())
+    self.assertEqual(self.compute.runs, ['a', 'a'])
+
+  def test_command(self):
+    service = Service()
+    service.command = ['process', '--fast']
+    self.compute.run(service)
+    service = Service()
+    service.command = ['process', '--slow']
+    self.compute.run(service)
+    self.assertEqual(self.compute.runs, ['a', 'a'])
+
+    service = Service()
+    service.command = ['process', '--fast']
+    self.compute.run(service)
+    self.assertEqual(self.compute.runs, ['a', 'a'])
+
+    service = Service()
+    service.command = ['process', '--other']
+    asyncio.run(self.compute.arun(service))
+    self.assertEqual(self.compute.runs, ['a', 'a', 'a'])
+
+  def test_settings(self):
+    self.compute.run(Service())
+    settings.foo = 'baz'
+    self.compute.run(Service())
+    self.assertEqual(self.compute.runs, ['a', 'a'])
+
+    # Only depends on the test settings
+    service = Service()
+    service.cache_settings = ('test',)
+    self.compute.run(service)
+    settings.foo = 'qux'
+    service = Service()
+    service.cache_settings = ('test',)
+    self.compute.run(service)
+    self.assertEqual(self.compute.runs, ['a', 'a', 'a'])
+
+  def test_directory(self):
+    output_dir = os.path.dirname(self.output_file)
+    service = Service()
+    service.outputs = (output_dir,)
+    self.compute.run(service)
+    os.remove(self.output_file)
+    os.rmdir(output_dir)
+
+    service = Service()
+    service.outputs = (output_dir,)
+    self.compute.run(service)
+    self.assertEqual(self.compute.runs, ['a'])
+    self.assertEqual(self.read(self.output_file), 'a 1')
+
+  def test_not_serializable(self):
+    with self.assertLogs(cache.__name__, level='WARNING') as cm:
+      self.compute.run(Service(result=object()))
+      self.compute.run(Service(result=object()))
+    self.assertIn('not json serializable', cm.output[0])
+    self.assertEqual(self.compute.runs, ['a', 'a'])
+
+  def test_accounting_record(self):
+    record = {'service': 'Service', 'pid': 1, 'returncode': 0,
+              'start_time': 0.0, 'elapsed': 12.0, 'user_time': 10.0,
+              'system_time': 1.0, 'max_rss': 4096, 'read_bytes': 0,
+              'write_bytes': 0}
+    self.assertEqual(self.compute.run(Service(result=record)), record)
+    # A hit didn't use any resources
+    self.assertIsNone(self.compute.run(Service(result=record)))
+    self.assertEqual(self.compute.runs, ['a'])
+
+  def test_failure(self):
+    class FailingCompute(Compute):
+      def run_service(self, service_info):
+        super().run_service(service_info)
+        raise base.ServiceRunFailed()
+
+    with self.assertRaises(base.ServiceRunFailed):
+      FailingCompute().run(Service())
+    self.compute.run(Service())
+    self.assertEqual(self.compute.runs, ['a'])
+
+  def test_arun(self):
+    self.compute.run(Service())
+    result = asyncio.run(self.compute.arun(Service()))
+    self.assertEqual(result, 'done')
+    self.assertEqual(self.compute.runs, ['a'])
+
+  def test_arun_off_loop(self):
+    threads = []
+
+    def restore(cache):
+      threads.append(threading.get_ident())
+      return False, None
+
+    def store(cache, result):
+      threads.append(threading.get_ident())
+
+    with mock.patch.object(cache.ServiceCache, 'restore', restore), \
+        mock.patch.object(cache.ServiceCache, 'store', store):
+      asyncio.run(self.compute.arun(Service()))
+    # Not on the event loop's thread
+    self.assertEqual(len(threads), 2)
+    self.assertNotIn(threading.get_ident(), threads)
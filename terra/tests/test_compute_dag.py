@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+from unittest import mock
+
+from terra import settings
+import terra.compute.utils
+from terra.compute import base, dag, scheduler
+from .utils import TestCase
+
+
+class Compute(base.BaseCompute):
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.started = []
+    self.active = []
+    self.overlaps = []
+    self.services = []
+
+  def run_service(self, service_info):
+    with self.lock:
+      self.started.append(service_info.name)
+      self.services.append(service_info)
+      self.active.append(service_info)
+      self.overlaps.append({s.name for s in self.active})
+    time.sleep(service_info.duration)
+    with self.lock:
+      self.active.remove(service_info)
+    if service_info.fail:
+      raise base.ServiceRunFailed()
+    return service_info.name
+
+
+class Service(base.BaseService):
+  def __init__(self, name, fail=False, inputs=(), outputs=(), duration=0.02):
+    super().__init__()
+    self.name = name
+    self.fail = fail
+    self.duration = duration
+    self.inputs = inputs
+    self.outputs = outputs
+
+
+class Reader(base.BaseService):
+  pass
+
+
+class Reader_compute(Service):
+  def __init__(self):
+    super().__init__('reader', inputs=['stage1.output_dir'])
+
+
+class Writer(base.BaseService):
+  pass
+
+
+class Writer_compute(Service):
+  def __init__(self):
+    super().__init__('writer', outputs=['stage1.output_dir'])
+
+
+class TestServiceDag(TestCase):
+  def setUp(self):
+    self.patches.append(mock.patch.object(settings, '_wrapped', None))
+    super().setUp()
+    settings.configure({'processing_dir': self.temp_dir.name})
+    self.compute = Compute()
+
+  def scheduler(self, cpus):
+    return scheduler.Scheduler(self.compute, cpus=cpus, memory=100)
+
+  def test_after(self):
+    graph = dag.ServiceDag()
+    a = graph.add(Service('a'))
+    b = graph.add(Service('b'), after=[a])
+    c = graph.add(Service('c'), after=[b])
+
+    results = graph.run(self.scheduler(4))
+    self.assertEqual(self.compute.started, ['a', 'b', 'c'])
+    self.assertEqual(results, {a: 'a', b: 'b', c: 'c'})
+
+  def test_parallel(self):
+    graph = dag.ServiceDag()
+    a = graph.add(Service('a'))
+    graph.add(Service('b'), after=[a])
+    graph.add(Service('c'), after=[a])
+    graph.run(self.scheduler(2))
+    self.assertEqual(self.compute.started[0], 'a')
+    self.assertIn({'b', 'c'}, self.compute.overlaps)
+
+  def test_inferred(self):
+    output_dir = os.path.join(self.temp_dir.name, 'stage1')
+    settings.stage1 = {'output_dir': output_dir}
+    graph = dag.ServiceDag()
+    # Added in the wrong order on purpose
+    second = graph.add(Service(
+        'second', inputs=[os.path.join(output_dir, 'a.json')]))
+    first = graph.add(Service('first', outputs=['stage1.output_dir']))
+    unrelated = graph.add(Service(
+        'unrelated', inputs=[os.path.join(self.temp_dir.name, 'other')]))
+
+    depends = graph.dependencies()
+    self.assertEqual(depends[second], {first})
+    self.assertEqual(depends[first], set())
+    self.assertEqual(depends[unrelated], set())
+
+    graph.run(self.scheduler(1))
+    self.assertLess(self.compute.started.index('first'),
+                    self.compute.started.index('second'))
+
+  @mock.patch.dict(base.services, clear=True)
+  @mock.patch.dict(terra.compute.utils.compute.__dict__)
+  def test_loaded_for_run(self):
+    Compute.register(Reader)(Reader_compute)
+    Compute.register(Writer)(Writer_compute)
+    settings.stage1 = {'output_dir': os.path.join(self.temp_dir.name, 'x')}
+    graph = dag.ServiceDag()
+    reader = graph.add(Reader)
+    writer = graph.add(Writer)
+    graph.run(self.scheduler(1))
+    # The instances run, for this compute, are the ones the dependencies were
+    # worked out from
+    self.assertIsInstance(writer.service, Writer_compute)
+    self.assertEqual(self.compute.started, ['writer', 'reader'])
+    self.assertIs(self.compute.services[0], writer.service)
+    self.assertIs(self.compute.services[1], reader.service)
+
+  def test_overlaps(self):
+    self.assertTrue(dag._overlaps('stage1', os.path.abspath('stage1/a.json')))
+    self.assertFalse(dag._overlaps('stage1', 'stage10'))
+    with mock.patch.object(os.path, 'commonpath', side_effect=ValueError):
+      self.assertFalse(dag._overlaps('C:\\data', 'D:\\data'))
+
+  def test_inferred_list(self):
+    settings.files = {'input_files': ['/data/x.tif', '/data/y.tif']}
+    graph = dag.ServiceDag()
+    writer = graph.add(Service('writer', outputs=['/data']))
+    reader = graph.add(Service('reader', inputs=['files.input_files']))
+    # Not a setting, so a path
+    other = graph.add(Service('other', inputs=['files.missing_files']))
+    depends = graph.dependencies()
+    self.assertEqual(depends[reader], {writer})
+    self.assertEqual(depends[other], set())
+
+  def test_critical_path(self):
+    graph = dag.ServiceDag()
+    graph.add(Service('short'))
+    a = graph.add(Service('a'))
+    b = graph.add(Service('b'), after=[a])
+    graph.add(Service('c'), after=[b])
+    graph.run(self.scheduler(1))
+    self.assertEqual(self.compute.started[0], 'a')
+
+  def test_cycle(self):
+    graph = dag.ServiceDag()
+    a = graph.add(Service('a'))
+    b = graph.add(Service('b'), after=[a])
+    a.after.append(b)
+    with self.assertRaisesRegex(ValueError, 'cycle'):
+      graph.run(self.scheduler(1))
+    self.assertEqual(self.compute.started, [])
+
+  def test_fail_fast(self):
+    graph = dag.ServiceDag()
+    a = graph.add(Service('a', fail=True))
+    b = graph.add(Service('b'), after=[a])
+    slow = graph.add(Service('slow', duration=0.2))
+    c = graph.add(Service('c'), after=[slow])
+    with self.assertLogs(dag.__name__, level='ERROR'):
+      with self.assertRaises(dag.DagFailed) as cm:
+        graph.run(self.scheduler(2))
+    # slow was already running, but c isn't started after it
+    self.assertEqual(set(self.compute.started), {'a', 'slow'})
+    self.assertEqual(list(cm.exception.failed), [a])
+    self.assertIsInstance(cm.exception.failed[a], base.ServiceRunFailed)
+    self.assertEqual(cm.exception.skipped, [b, c])
+    self.assertEqual(cm.exception.results, {slow: 'slow'})
+
+  def test_keep_going(self):
+    graph = dag.ServiceDag()
+    a = graph.add(Service('a', fail=True))
+    b = graph.add(Service('b'), after=[a])
+    c = graph.add(Service('c'))
+    with self.assertLogs(dag.__name__, level='ERROR'):
+      with self.assertRaises(dag.DagFailed) as cm:
+        graph.run(self.scheduler(1), keep_going=True)
+    self.assertEqual(self.compute.started, ['a', 'c'])
+    self.assertEqual(cm.exception.skipped, [b])
+    self.assertEqual(cm.exception.results, {c: 'c'})
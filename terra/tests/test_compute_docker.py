@@ -1,11 +1,14 @@
+import asyncio
 import os
 import re
 import json
+from subprocess import PIPE
+import time
 from unittest import mock
 import warnings
 
 from terra import settings
-from terra.compute import base
+from terra.compute import accounting, base, scheduler
 from terra.compute import docker
 from terra.compute import compute
 import terra.compute.utils
@@ -114,6 +117,19 @@ class TestDockerJust(TestComputeDockerCase):
     self.assertEqual(set(kwargs.keys()), {'executable', 'env'})
     self.assertEqual(kwargs['env']['JUSTFILE'], "/foo/bar")
 
+  def test_ajust(self):
+    default_justfile = os.path.join(os.environ['TERRA_TERRA_DIR'], 'Justfile')
+
+    async def create_subprocess_exec(*args, **kwargs):
+      return args, kwargs
+
+    with mock.patch.object(docker.asyncio, 'create_subprocess_exec',
+                           create_subprocess_exec):
+      args, kwargs = asyncio.run(compute.ajust("foo", "bar"))
+    self.assertEqual(args, ('bash', 'just', 'foo', 'bar'))
+    self.assertEqual(set(kwargs.keys()), {'executable', 'env'})
+    self.assertEqual(kwargs['env']['JUSTFILE'], default_justfile)
+
   def test_just_kwargs(self):
     default_justfile = os.path.join(os.environ['TERRA_TERRA_DIR'], 'Justfile')
     # Use the shell kwarg for Popen
@@ -165,7 +181,9 @@ class TestDockerRun(TestComputeDockerCase):
   def mock_just(_self, *args, **kwargs):
     _self.just_args = args
     _self.just_kwargs = kwargs
-    return type('blah', (object,), {'wait': lambda self: _self.return_value})()
+    return type('blah', (object,), {'wait': lambda self: _self.return_value,
+                                    'pid': 0, 'stdout': None,
+                                    'stderr': None})()
 
   def setUp(self):
     # Mock the just call for recording
@@ -190,6 +208,103 @@ class TestDockerRun(TestComputeDockerCase):
     with self.assertRaises(base.ServiceRunFailed):
       compute.run(MockJustService())
 
+  def test_arun(self):
+    compute = docker.Compute()
+
+    async def ajust(*args, **kwargs):
+      self.just_args = args
+      self.just_kwargs = kwargs
+
+      async def wait():
+        return self.return_value
+      return type('blah', (object,), {'wait': lambda self: wait(),
+                                      'pid': 0, 'stdout': None,
+                                      'stderr': None})()
+
+    self.return_value = 0
+    with mock.patch.object(compute, 'ajust', ajust):
+      asyncio.run(compute.arun(MockJustService()))
+      self.assertEqual(('--wrap', 'Just-docker-compose',
+                        '-f', 'file1', 'run', 'launch', 'ls'),
+                       self.just_args)
+      self.assertEqual({'env': {'BAR': 'FOO'}}, self.just_kwargs)
+
+      self.return_value = 1
+      with self.assertRaises(base.ServiceRunFailed):
+        asyncio.run(compute.arun(MockJustService()))
+
+  def test_run_capture_output(self):
+    compute = docker.Compute()
+
+    self.return_value = 0
+    with settings:
+      settings.compute.capture_output.enabled = True
+      compute.run(MockJustService())
+    self.assertEqual({'env': {'BAR': 'FOO'}, 'stdout': PIPE, 'stderr': PIPE},
+                     self.just_kwargs)
+
+  def test_run_accounting(self):
+    compute = docker.Compute()
+    group = os.path.join(self.temp_dir.name, 'system.slice',
+                         'docker-abc.scope')
+    os.makedirs(group)
+    with open(os.path.join(group, 'cpu.stat'), 'w') as fid:
+      fid.write('usage_usec 3000000\nuser_usec 2000000\n'
+                'system_usec 1000000\n')
+    with open(os.path.join(group, 'memory.peak'), 'w') as fid:
+      fid.write('1000\n')
+
+    def just(*args, **kwargs):
+      self.just_args = args
+      # Running long enough for the container to be read
+      return type('blah', (object,),
+                  {'wait': lambda self: time.sleep(0.2) or 0, 'pid': 0,
+                   'stdout': None, 'stderr': None})()
+
+    with settings, \
+        mock.patch.object(compute, 'just', just), \
+        mock.patch.object(accounting, 'find_container',
+                          lambda label: 'abc'), \
+        mock.patch.object(scheduler, 'cgroup_root', self.temp_dir.name):
+      settings.compute.accounting.enabled = True
+      settings.compute.accounting.interval = 0.01
+      record = compute.run(MockJustService())
+
+    self.assertEqual(self.just_args[:6], ('--wrap', 'Just-docker-compose',
+                                          '-f', 'file1', 'run', '--label'))
+    self.assertTrue(self.just_args[6].startswith('terra.run='))
+    self.assertEqual(self.just_args[7:], ('launch', 'ls'))
+
+    self.assertEqual(record['returncode'], 0)
+    self.assertEqual(record['user_time'], 2)
+    self.assertEqual(record['system_time'], 1)
+    self.assertEqual(record['max_rss'], 1000)
+    self.assertIsNone(record['read_bytes'])
+
+  def test_run_accounting_interrupted(self):
+    compute = docker.Compute()
+
+    def wait(self):
+      raise KeyboardInterrupt
+
+    def just(*args, **kwargs):
+      return type('blah', (object,), {'wait': wait, 'pid': 0,
+                                      'stdout': None, 'stderr': None})()
+
+    with settings, \
+        mock.patch.object(compute, 'just', just), \
+        mock.patch.object(accounting.ServiceAccounting, 'monitor_container',
+                          autospec=True) as monitor_container:
+      monitor_container.side_effect = lambda self, interval: setattr(
+          self, 'monitor', mock.Mock())
+      settings.compute.accounting.enabled = True
+      with self.assertRaises(KeyboardInterrupt):
+        compute.run(MockJustService())
+
+    # The monitor thread is stopped
+    accounting_ = monitor_container.call_args[0][0]
+    accounting_.monitor.stop.assert_called_once_with()
+
 
 ###############################################################################
 
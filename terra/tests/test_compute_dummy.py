@@ -4,6 +4,7 @@ from terra import settings
 from terra.compute import base
 from terra.compute import dummy
 import terra.compute.utils
+from terra.core.signals import pre_service_run, post_service_run
 
 from .utils import TestCase
 
@@ -106,3 +107,48 @@ class TestServiceDummy(TestComputeDummyCase):
         getattr(self.dummyCompute, phase)(self.test_service_name)
       self.assertTrue(any('INFO:terra.compute.dummy:{}:'.format(
           phase.capitalize()) in o for o in cm.output))
+
+  def test_service_run_signals(self):
+    events = []
+
+    def pre(sender, **kwargs):
+      events.append(('pre', sender, kwargs))
+
+    def post(sender, **kwargs):
+      events.append(('post', sender, kwargs))
+
+    pre_service_run.connect(pre)
+    post_service_run.connect(post)
+    try:
+      self.dummyCompute.run(self.test_service_name)
+      # Only the run command sends the signals
+      with self.assertLogs(dummy.__name__, level="INFO"):
+        self.dummyCompute.create(self.test_service_name)
+    finally:
+      pre_service_run.disconnect(pre)
+      post_service_run.disconnect(post)
+
+    self.assertEqual([e[0] for e in events], ['pre', 'post'])
+    self.assertIs(events[0][1], dummy.Compute)
+    self.assertIs(events[0][2]['compute'], self.dummyCompute)
+    self.assertIsInstance(events[0][2]['service'], dummy.Service)
+    self.assertIs(events[0][2]['service'], events[1][2]['service'])
+    self.assertIsNone(events[1][2]['exception'])
+    self.assertGreaterEqual(events[1][2]['elapsed'], 0)
+
+  def test_service_run_signals_exception(self):
+    events = []
+
+    def post(sender, **kwargs):
+      events.append(kwargs)
+
+    post_service_run.connect(post)
+    try:
+      with mock.patch.object(dummy.Compute, 'run_service',
+                             side_effect=ValueError('foo')), \
+          self.assertRaises(ValueError):
+        self.dummyCompute.run(self.test_service_name)
+    finally:
+      post_service_run.disconnect(post)
+
+    self.assertIsInstance(events[0]['exception'], ValueError)
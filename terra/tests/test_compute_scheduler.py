@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from unittest import mock
+
+from terra import settings
+from terra.compute import base, scheduler
+from .utils import TestCase
+
+
+class Compute(base.BaseCompute):
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.started = []
+    self.active = []
+    self.overlaps = []
+
+  def run_service(self, service_info):
+    with self.lock:
+      self.started.append(service_info.name)
+      self.active.append(service_info)
+      self.overlaps.append([s.name for s in self.active])
+    time.sleep(0.05)
+    with self.lock:
+      self.active.remove(service_info)
+    if service_info.fail:
+      raise base.ServiceRunFailed()
+    return service_info.name
+
+
+class Service(base.BaseService):
+  def __init__(self, name, cpus=1, memory=0, resources=(), fail=False):
+    super().__init__()
+    self.name = name
+    self.cpus = cpus
+    self.memory = memory
+    self.resources = resources
+    self.fail = fail
+
+
+class TestScheduler(TestCase):
+  def setUp(self):
+    self.patches.append(mock.patch.object(settings, '_wrapped', None))
+    super().setUp()
+    settings.configure({'processing_dir': self.temp_dir.name})
+    self.compute = Compute()
+
+  def test_cpus(self):
+    with scheduler.Scheduler(self.compute, cpus=2, memory=100) as sched:
+      futures = sched.run_many([Service(x) for x in range(5)])
+    self.assertEqual([f.result() for f in futures], list(range(5)))
+    self.assertEqual(max(len(x) for x in self.compute.overlaps), 2)
+
+  def test_memory(self):
+    with scheduler.Scheduler(self.compute, cpus=10, memory=100) as sched:
+      sched.run_many([Service(x, memory=40) for x in range(4)])
+    self.assertEqual(max(len(x) for x in self.compute.overlaps), 2)
+
+  def test_resources(self):
+    services = [Service('a', resources=('gpu',)),
+                Service('b', resources=('gpu',)),
+                Service('c')]
+    with scheduler.Scheduler(self.compute, cpus=10, memory=100) as sched:
+      with self.compute.lock:
+        sched.run_many(services)
+        # c didn't wait for the gpu
+        self.assertEqual([job.service.name for job in sched.pending], ['b'])
+    for overlap in self.compute.overlaps:
+      self.assertFalse({'a', 'b'} <= set(overlap))
+
+  def test_heaviest_first(self):
+    services = [Service('small', cpus=1), Service('big', cpus=3),
+                Service('medium', cpus=2), Service('small2', cpus=1)]
+    sched = scheduler.Scheduler(self.compute, cpus=4, memory=100)
+    # Hold off the threads, to see what was started
+    with self.compute.lock:
+      sched.run_many(services)
+      # big, and then medium waits for room, holding up the smaller ones
+      self.assertEqual([job.service.name for job in sched.pending],
+                       ['medium', 'small', 'small2'])
+      self.assertEqual(sched.running, 1)
+      self.assertEqual(sched.free_cpus, 1)
+    sched.shutdown()
+    self.assertEqual(self.compute.started[:2], ['big', 'medium'])
+
+  def test_no_starvation(self):
+    sched = scheduler.Scheduler(self.compute, cpus=2, memory=100)
+    with self.compute.lock:
+      sched.submit(Service('a'))
+      sched.submit(Service('big', cpus=2))
+      # There is room for small, but big was waiting first
+      sched.submit(Service('small'))
+      self.assertEqual([job.service.name for job in sched.pending],
+                       ['big', 'small'])
+      self.assertEqual(sched.running, 1)
+    sched.shutdown()
+    self.assertEqual(self.compute.started, ['a', 'big', 'small'])
+
+  def test_priority(self):
+    sched = scheduler.Scheduler(self.compute, cpus=1, memory=100)
+    with self.compute.lock:
+      sched.run_many([Service('big', cpus=1), Service('a'), Service('b')],
+                     priorities=[0, 1, 2])
+      self.assertEqual([job.service.name for job in sched.pending],
+                       ['a', 'big'])
+    sched.shutdown()
+    self.assertEqual(self.compute.started, ['b', 'a', 'big'])
+
+  def test_too_big(self):
+    with scheduler.Scheduler(self.compute, cpus=2, memory=100) as sched:
+      with self.assertLogs(scheduler.__name__, level='WARNING'):
+        future = sched.submit(Service('huge', cpus=8))
+      sched.submit(Service('small'))
+    self.assertEqual(future.result(), 'huge')
+    self.assertEqual(self.compute.overlaps[0], ['huge'])
+
+  def test_failure(self):
+    with scheduler.Scheduler(self.compute, cpus=1, memory=100) as sched:
+      futures = sched.run_many([Service('a', fail=True), Service('b')])
+    self.assertIsInstance(futures[0].exception(), base.ServiceRunFailed)
+    self.assertEqual(futures[1].result(), 'b')
+
+  def test_capacity_settings(self):
+    with settings:
+      settings.compute.scheduler.cpus = 3
+      settings.compute.scheduler.memory = 1000
+      self.assertEqual(scheduler.node_capacity(), (3, 1000))
+
+  def write_cgroup(self, *lines):
+    proc_cgroup = os.path.join(self.temp_dir.name, 'proc_cgroup')
+    with open(proc_cgroup, 'w') as fid:
+      fid.write(''.join(line + '\n' for line in lines))
+    self.patches.append(mock.patch.object(scheduler, 'proc_cgroup',
+                                          proc_cgroup))
+    # Stopped on tearDown
+    self.patches[-1].start()
+
+  def write_files(self, files):
+    for name, value in files:
+      name = os.path.join(self.temp_dir.name, name)
+      os.makedirs(os.path.dirname(name), exist_ok=True)
+      with open(name, 'w') as fid:
+        fid.write(value + '\n')
+
+  def test_cgroup_v2(self):
+    self.write_cgroup('0::/')
+    self.write_files((('cpu.max', '150000 100000'),
+                      ('memory.max', '1048576')))
+    with mock.patch.object(scheduler, 'cgroup_root', self.temp_dir.name):
+      self.assertEqual(scheduler.cgroup_cpus(), 1.5)
+      self.assertEqual(scheduler.cgroup_memory(), 1048576)
+      cpus, memory = scheduler.node_capacity()
+    self.assertLessEqual(cpus, 1.5)
+    self.assertEqual(memory, 1048576)
+
+  def test_cgroup_v1(self):
+    self.write_cgroup('4:memory:/', '1:cpu,cpuacct:/')
+    self.write_files((('cpu/cpu.cfs_quota_us', '-1'),
+                      ('cpu/cpu.cfs_period_us', '100000'),
+                      ('memory/memory.limit_in_bytes',
+                       '9223372036854771712')))
+    with mock.patch.object(scheduler, 'cgroup_root', self.temp_dir.name):
+      self.assertIsNone(scheduler.cgroup_cpus())
+      self.assertIsNone(scheduler.cgroup_memory())
+
+  def test_cgroup_v2_own(self):
+    self.write_cgroup('0::/system.slice/foo.service')
+    self.write_files((('system.slice/foo.service/cpu.max', 'max 100000'),
+                      ('system.slice/foo.service/memory.max', '2048'),
+                      ('system.slice/cpu.max', '50000 100000'),
+                      ('system.slice/memory.max', '4096'),
+                      ('cpu.max', '400000 100000')))
+    with mock.patch.object(scheduler, 'cgroup_root', self.temp_dir.name):
+      # The lowest of its own and its ancestors' limits
+      self.assertEqual(scheduler.cgroup_cpus(), 0.5)
+      self.assertEqual(scheduler.cgroup_memory(), 2048)
+
+  def test_cgroup_v1_own(self):
+    self.write_cgroup('9:name=systemd:/', '4:memory:/foo/bar',
+                      '2:cpu,cpuacct:/foo/bar')
+    self.write_files((('cpu,cpuacct/foo/bar/cpu.cfs_quota_us', '200000'),
+                      ('cpu,cpuacct/foo/bar/cpu.cfs_period_us', '100000'),
+                      ('memory/foo/bar/memory.limit_in_bytes', '1024'),
+                      ('memory/memory.limit_in_bytes',
+                       '9223372036854771712')))
+    with mock.patch.object(scheduler, 'cgroup_root', self.temp_dir.name):
+      self.assertEqual(scheduler.cgroup_cpus(), 2)
+      self.assertEqual(scheduler.cgroup_memory(), 1024)
+
+  def test_no_cgroup(self):
+    with mock.patch.object(scheduler, 'cgroup_root', self.temp_dir.name):
+      self.assertIsNone(scheduler.cgroup_cpus())
+      self.assertIsNone(scheduler.cgroup_memory())
@@ -100,6 +100,32 @@ class TestUtils(TestComputeUtilsCase):
     self.assertIsInstance(utils.load_service(Service.__module__ + '.Service2'),
                           Service)
 
+  @mock.patch.dict(utils.compute.__dict__, _connection=Compute())
+  def test_load_service_cache(self):
+    name = Service.__module__ + '.Service2'
+    first = utils.load_service(name)
+    with mock.patch.object(utils, 'import_module') as import_module:
+      second = utils.load_service(name)
+    import_module.assert_not_called()
+    self.assertIsInstance(second, Service)
+    # Still a new instance each time
+    self.assertIsNot(first, second)
+
+  @mock.patch.dict(utils.compute.__dict__, _connection=Compute())
+  def test_load_service_cache_register(self):
+    self.assertIsInstance(utils.load_service(Service2), Service)
+    # Registering changes what Service2 resolves to
+    Compute.register(Service2)(Service2_test)
+    self.assertIsInstance(utils.load_service(Service2), Service2_test)
+
+  @mock.patch.dict(utils.compute.__dict__, _connection=Compute())
+  def test_load_service_cache_registry_patched(self):
+    self.assertIsInstance(utils.load_service(Service), Service_test)
+    with mock.patch.dict(terra.compute.base.services, clear=True):
+      with self.assertRaises(KeyError), self.assertLogs(utils.__name__):
+        utils.load_service(Service)
+    self.assertIsInstance(utils.load_service(Service), Service_test)
+
   @mock.patch.dict(utils.compute.__dict__, _connection=Compute())
   def test_load_service_unregistered(self):
     with self.assertRaises(KeyError), self.assertLogs(utils.__name__) as log:
@@ -118,3 +144,106 @@ class TestComputeHandler(TestComputeUtilsCase):
 
   # Make sure this can be run twice
   test_compute_handler2 = test_compute_handler
+
+
+class Service_dummy(terra.compute.base.BaseService):
+  pass
+
+
+class GpuService(terra.compute.base.BaseService):
+  resources = ('gpu',)
+
+
+class BigService(Service):
+  cpus = 8
+
+
+class TestComputeRouting(TestComputeUtilsCase):
+  def setUp(self):
+    super().setUp()
+    terra.compute.dummy.Compute.register(Service)(Service_dummy)
+    settings.compute.connections = {'light': {'arch': 'dummy'}}
+    self.handler = utils.ComputeHandler()
+
+  def test_connections(self):
+    self.assertEqual(self.handler._connections, {})
+    light = self.handler['light']
+    self.assertIs(type(light), terra.compute.dummy.Compute)
+    self.assertIs(self.handler['light'], light)
+    self.assertIs(self.handler['default'], self.handler._connection)
+    self.assertIsInstance(self.handler['default'], Compute)
+    with self.assertRaisesRegex(KeyError, 'missing'):
+      self.handler['missing']
+
+  def test_close(self):
+    light = self.handler['light']
+    with mock.patch.object(light, 'close', create=True) as close:
+      self.handler.close()
+    close.assert_called_once_with()
+    self.assertEqual(self.handler._connections, {})
+    # Created again the next time
+    self.assertIsNot(self.handler['light'], light)
+
+  def test_no_routes(self):
+    self.assertEqual(self.handler.route(Service), 'default')
+
+  def test_route_service(self):
+    settings.compute.routes = [{'service': f'{__name__}.Service',
+                                'connection': 'light'}]
+    self.assertEqual(self.handler.route(Service), 'light')
+    self.assertEqual(self.handler.route(f'{__name__}.Service'), 'light')
+    self.assertEqual(self.handler.route(Service()), 'light')
+    # Base classes match too
+    self.assertEqual(self.handler.route(BigService), 'light')
+    self.assertEqual(self.handler.route(Service2), 'default')
+
+    # Names of no known class only match by name
+    settings.compute.routes = [{'service': 'Service', 'connection': 'light'}]
+    self.assertEqual(self.handler.route('Service'), 'light')
+    self.assertEqual(self.handler.route('no_such_module.Service'), 'default')
+
+  def test_route_pattern(self):
+    settings.compute.routes = [{'service': '*.Service2*',
+                                'connection': 'light'}]
+    self.assertEqual(self.handler.route(Service2_test), 'light')
+    self.assertEqual(self.handler.route(Service), 'default')
+
+  def test_route_needs(self):
+    settings.compute.routes = [
+        {'resources': ['gpu'], 'connection': 'gpu'},
+        {'min_cpus': 4, 'connection': 'big'},
+        {'min_memory': 1024, 'connection': 'big'}]
+    self.assertEqual(self.handler.route(GpuService), 'gpu')
+    self.assertEqual(self.handler.route(BigService), 'big')
+    self.assertEqual(self.handler.route(Service), 'default')
+
+    # Set on the instance
+    service = GpuService()
+    service.resources = ()
+    service.memory = 2048
+    self.assertEqual(self.handler.route(service), 'big')
+
+  def test_run(self):
+    settings.compute.routes = [{'service': f'{__name__}.Service',
+                                'connection': 'light'}]
+    with mock.patch.object(terra.compute.dummy.Compute, 'run_service',
+                           return_value=15) as run_service:
+      self.assertEqual(self.handler.run(Service), 15)
+    # Loaded for the compute it was routed to
+    self.assertIsInstance(run_service.call_args[0][0], Service_dummy)
+
+    with mock.patch.object(Compute, 'run_service',
+                           return_value=16) as run_service:
+      self.assertEqual(self.handler.run(Service2), 16)
+    run_service.assert_called_once()
+
+  def test_scheduler(self):
+    from terra.compute.scheduler import Scheduler
+    settings.compute.routes = [{'service': f'{__name__}.Service',
+                                'connection': 'light'}]
+    with mock.patch.object(terra.compute.dummy.Compute, 'run_service',
+                           return_value=15) as run_service, \
+        Scheduler(self.handler, cpus=1, memory=100) as scheduler:
+      future = scheduler.submit(Service)
+    self.assertEqual(future.result(), 15)
+    self.assertIsInstance(run_service.call_args[0][0], Service_dummy)
@@ -1,4 +1,8 @@
+import asyncio
+import json
 import os
+from subprocess import PIPE, Popen
+import sys
 from unittest import mock
 
 from terra import settings
@@ -43,7 +47,9 @@ class TestVirtualEnv(TestCase):
     _self.popen_args = args
     _self.popen_kwargs = kwargs
     # Wait will return whatever is in self.return_valu
-    return type('blah', (object,), {'wait': lambda self: _self.return_value})()
+    return type('blah', (object,), {'wait': lambda self: _self.return_value,
+                                    'pid': 0, 'stdout': None,
+                                    'stderr': None})()
 
   def test_run_failed(self):
     compute = virtualenv.Compute()
@@ -80,6 +86,92 @@ class TestVirtualEnv(TestCase):
     self.assertEqual(self.popen_kwargs['env']['BAR'], 'FOO')
     self.assertTrue(self.popen_kwargs['env']['PATH'].startswith('/bar/foo'))
 
+  def test_run_capture_output(self):
+    compute = virtualenv.Compute()
+    service = MockVirtualEnvService()
+
+    with settings:
+      settings.compute.capture_output.enabled = True
+
+      self.return_value = 0
+      compute.run(service)
+
+    self.assertEqual(self.popen_args, (['ls'],))
+    self.assertEqual(set(self.popen_kwargs.keys()),
+                     {'env', 'executable', 'stdout', 'stderr'})
+    self.assertEqual(self.popen_kwargs['stdout'], PIPE)
+    self.assertEqual(self.popen_kwargs['stderr'], PIPE)
+
+  def test_arun(self):
+    compute = virtualenv.Compute()
+    service = MockVirtualEnvService()
+    service.command = [sys.executable, '-c',
+                       'import os; print(os.environ["BAR"])']
+
+    with settings:
+      settings.compute.capture_output.enabled = True
+      with self.assertLogs('terra.service', level='INFO') as cm:
+        asyncio.run(compute.arun(service))
+    self.assertEqual(len(cm.records), 1)
+    self.assertTrue(cm.records[0].getMessage().endswith('] FOO'))
+
+    # post_run removed the temp dir
+    self.assertNotExist(service.temp_dir.name)
+
+    service = MockVirtualEnvService()
+    service.command = [sys.executable, '-c', 'raise SystemExit(1)']
+    with self.assertRaises(base.ServiceRunFailed):
+      asyncio.run(compute.arun(service))
+
+  def test_run_accounting(self):
+    compute = virtualenv.Compute()
+    service = MockVirtualEnvService()
+    service.command = [sys.executable, '-c',
+                       'x = bytearray(64 * 1024 * 1024)']
+
+    with settings:
+      settings.compute.accounting.enabled = True
+      with mock.patch.object(virtualenv, 'Popen', Popen):
+        record = compute.run(service)
+
+        service = MockVirtualEnvService()
+        service.command = [sys.executable, '-c', 'raise SystemExit(3)']
+        with self.assertRaises(base.ServiceRunFailed):
+          compute.run(service)
+
+    self.assertEqual(record['service'], 'MockVirtualEnvService')
+    self.assertEqual(record['returncode'], 0)
+    self.assertGreaterEqual(record['max_rss'], 64 * 1024 * 1024)
+    self.assertGreater(record['user_time'] + record['system_time'], 0)
+    self.assertGreater(record['elapsed'], 0)
+
+    usage_dir = os.path.join(self.temp_dir.name, 'service_usage')
+    with open(os.path.join(usage_dir, f'MockVirtualEnvService.'
+                                      f'{record["pid"]}.json'), 'r') as fid:
+      self.assertEqual(json.load(fid), record)
+    self.assertEqual(len(os.listdir(usage_dir)), 2)
+
+  @mock.patch.dict(os.environ)
+  def test_logging_overlay(self):
+    os.environ.pop('BAR', None)
+    compute = virtualenv.Compute()
+    service = MockVirtualEnvService()
+
+    self.return_value = 0
+    with self.assertLogs(virtualenv.__name__, level="DEBUG1") as cm:
+      compute.run(service)
+
+    env_lines = [x for x in cm.output if "Environment Modification:" in x][0]
+    env_lines = env_lines.split('\n')
+    # Only the overlay's changes
+    self.assertEqual(len(env_lines), 3)
+    self.assertIn('+ BAR: FOO', env_lines)
+    self.assertTrue(any(o.startswith('+ TERRA_SETTINGS_FILE:')
+                        for o in env_lines))
+    # Popen gets the whole environment
+    self.assertIs(type(self.popen_kwargs['env']), dict)
+    self.assertEqual(self.popen_kwargs['env']['PATH'], os.environ['PATH'])
+
   def test_logging_code(self):
     compute = virtualenv.Compute()
     service = MockVirtualEnvService()
@@ -1,6 +1,11 @@
 import sys
 import os
+import json
 import time
+import shutil
+import socket
+import subprocess
+import logging
 from unittest import mock, skipUnless
 
 try:
@@ -195,6 +200,182 @@ class TestCeleryExecutor(TestCase):
     with self.assertRaisesRegex(RuntimeError, "cannot .* after shutdown"):
       self.executor.submit(test)
 
+
+def redis_server_available():
+  return celery is not None and shutil.which('redis-server') is not None
+
+
+@skipUnless(celery, "Celery not installed")
+class TestCeleryLogStreamRecords(TestCase):
+  def test_serialize(self):
+    from terra.executor.celery.log_stream import (
+        serialize_record, deserialize_record)
+    try:
+      raise ValueError('oops')
+    except ValueError:
+      record = logging.LogRecord('foo.bar', logging.ERROR, __file__, 12,
+                                 'Hi %s', ('there',), sys.exc_info())
+    record2 = deserialize_record(serialize_record(record))
+    self.assertEqual(record2.name, 'foo.bar')
+    self.assertEqual(record2.levelno, logging.ERROR)
+    self.assertEqual(record2.getMessage(), 'Hi there')
+    self.assertEqual(record2.lineno, 12)
+    self.assertIn('ValueError: oops', record2.exc_text)
+    self.assertIn('hostname', record2.__dict__)
+
+  def record(self, msg):
+    return logging.LogRecord('foo', logging.INFO, __file__, 0, msg, (), None)
+
+  def test_flush_failed(self):
+    import redis
+    from terra.executor.celery.log_stream import RedisStreamHandler
+    handler = RedisStreamHandler('redis://localhost:0/0', 'test_log',
+                                 batch_size=100, flush_interval=60,
+                                 capacity=3)
+    handler.redis = mock.Mock()
+    pipe = handler.redis.pipeline.return_value
+    pipe.execute.side_effect = redis.RedisError
+    for x in range(3):
+      handler.handle(self.record(str(x)))
+    handler.flush()
+    handler.handle(self.record('3'))
+    handler.flush()
+
+    # The oldest record is the one dropped
+    self.assertEqual(handler.dropped, 1)
+    self.assertEqual([json.loads(data)['msg'] for data in handler.buffer],
+                     ['1', '2', '3'])
+
+    pipe.execute.side_effect = None
+    with self.assertLogs('terra.executor.celery.log_stream',
+                         logging.WARNING) as cm:
+      handler.flush()
+    self.assertIn('Dropped 1 log records', cm.output[0])
+    self.assertEqual([json.loads(call[0][1]['r'])['msg']
+                      for call in pipe.xadd.call_args_list[-3:]],
+                     ['1', '2', '3'])
+
+    # Only reported once
+    with mock.patch('terra.executor.celery.log_stream.logger') as logger:
+      handler.handle(self.record('ok'))
+      handler.flush()
+    logger.warning.assert_not_called()
+    handler.close()
+
+  def test_consumer_start(self):
+    import redis
+    from terra.executor.celery.log_stream import RedisStreamLogConsumer
+    consumer = RedisStreamLogConsumer('redis://localhost:0/0', 'test_log')
+    consumer.redis = mock.Mock()
+    consumer.redis.xread.return_value = []
+    # The server's clock, not this host's
+    consumer.redis.time.return_value = (1600000000, 123456)
+    consumer.start()
+    self.assertEqual(consumer.last_id, '1600000000123-0')
+    consumer.stop()
+
+    consumer.redis.time.side_effect = redis.ConnectionError
+    with self.assertLogs('terra.executor.celery.log_stream', logging.WARNING):
+      consumer.start()
+    consumer.stop()
+
+  def test_consumer_stop(self):
+    import redis
+    from terra.executor.celery.log_stream import (
+        RedisStreamLogConsumer, serialize_record)
+    consumer = RedisStreamLogConsumer('redis://localhost:0/0', 'test_log',
+                                      batch_size=2)
+    consumer.redis = mock.Mock()
+    consumer.redis.time.return_value = (1600000000, 0)
+    # Nothing while running, then more than a batch left at stop
+    entries = [(f'{x}-0', {b'r': serialize_record(
+        self.record(f'left {x}'))}) for x in range(3)]
+    batches = [[('test_log', entries[:2])], [('test_log', entries[2:])], []]
+    consumer.redis.xread.side_effect = lambda *args, **kwargs: \
+        [] if consumer.thread is not None else batches.pop(0)
+    consumer.start()
+    with self.assertLogs('foo', logging.INFO) as cm:
+      consumer.stop()
+    self.assertEqual(len(cm.output), 3)
+    self.assertEqual(consumer.last_id, '2-0')
+
+    # A lost connection doesn't raise
+    consumer.redis.xread.side_effect = lambda *args, **kwargs: \
+        [] if consumer.thread is not None else consumer.redis.ping()
+    consumer.redis.ping.side_effect = redis.ConnectionError
+    consumer.start()
+    with self.assertLogs('terra.executor.celery.log_stream', logging.WARNING):
+      consumer.stop()
+
+
+@skipUnless(redis_server_available(), "redis-server not available")
+class TestCeleryLogStream(TestCase):
+  def setUp(self):
+    super().setUp()
+    with socket.socket() as sock:
+      sock.bind(('localhost', 0))
+      self.port = sock.getsockname()[1]
+    self.server = subprocess.Popen(
+        ['redis-server', '--port', str(self.port), '--save', '',
+         '--appendonly', 'no', '--dir', self.temp_dir.name],
+        stdout=subprocess.DEVNULL)
+    self.url = f'redis://localhost:{self.port}/0'
+
+    import redis
+    client = redis.Redis.from_url(self.url)
+    for _ in range(100):
+      try:
+        client.ping()
+        break
+      except redis.ConnectionError:
+        time.sleep(0.05)
+
+  def tearDown(self):
+    self.server.terminate()
+    self.server.wait()
+    super().tearDown()
+
+  def test_stream(self):
+    from terra.executor.celery.log_stream import (
+        RedisStreamHandler, RedisStreamLogConsumer)
+    consumer = RedisStreamLogConsumer(self.url, 'test_log')
+    consumer.start()
+
+    handler = RedisStreamHandler(self.url, 'test_log', batch_size=2,
+                                 flush_interval=60)
+
+    def record(msg, *args):
+      return logging.LogRecord(f'{__name__}.test_stream', logging.INFO,
+                               __file__, 0, msg, args, None)
+
+    with self.assertLogs(f'{__name__}.test_stream', logging.INFO) as cm:
+      handler.handle(record('one'))
+      # Not a full batch yet
+      self.assertEqual(len(handler.buffer), 1)
+      handler.handle(record('two %d', 2))
+      self.assertEqual(len(handler.buffer), 0)
+      handler.handle(record('three'))
+      # Close flushes the rest
+      handler.close()
+      # Stop reads anything left in the stream
+      consumer.stop()
+
+    self.assertEqual(len(cm.output), 3)
+    self.assertIn(f'{os.getpid()}] two 2', cm.output[1])
+    self.assertIn('three', cm.output[2])
+
+  def test_bounded_buffer(self):
+    from terra.executor.celery.log_stream import RedisStreamHandler
+    handler = RedisStreamHandler(self.url, 'test_log', batch_size=100,
+                                 flush_interval=60, capacity=3)
+    for x in range(5):
+      handler.handle(logging.LogRecord('foo', logging.INFO, __file__, 0,
+                                       str(x), (), None))
+    self.assertEqual(len(handler.buffer), 3)
+    self.assertEqual(handler.dropped, 2)
+    handler.close()
+
+
 #   def test_import(self):
 #     import terra.executor.celery
 #     from celery._state import _apps
@@ -1,4 +1,5 @@
 from terra.executor.sync import SyncExecutor
+from terra.core.signals import task_submitted, task_done
 from .utils import TestCase
 
 
@@ -36,3 +37,27 @@ class TestExecutorDummy(TestCase):
   def test_map(self):
     mapped = self.executor.map(test1, [10, 11, 12])
     self.assertEqual(list(mapped), [21, 22, 23])
+
+  def test_task_signals(self):
+    events = []
+
+    def submitted(sender, **kwargs):
+      events.append(('submitted', sender, kwargs))
+
+    def done(sender, **kwargs):
+      events.append(('done', sender, kwargs))
+
+    task_submitted.connect(submitted)
+    task_done.connect(done)
+    try:
+      future = self.executor.submit(test1, 15)
+    finally:
+      task_submitted.disconnect(submitted)
+      task_done.disconnect(done)
+
+    self.assertEqual([e[0] for e in events], ['submitted', 'done'])
+    self.assertIs(events[0][1], SyncExecutor)
+    self.assertIs(events[0][2]['fn'], test1)
+    self.assertIs(events[1][2]['future'], future)
+    self.assertIs(events[1][2]['executor'], self.executor)
+    self.assertGreaterEqual(events[1][2]['elapsed'], 0)
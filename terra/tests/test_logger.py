@@ -1,4 +1,5 @@
 from unittest import mock
+import atexit
 import io
 import os
 import sys
@@ -8,6 +9,8 @@ import logging
 import uuid
 import tempfile
 import platform
+import time
+import threading
 
 from terra.core.exceptions import ImproperlyConfigured
 from terra import settings
@@ -72,6 +75,11 @@ class TestLoggerCase(TestCase):
   def tearDown(self):
     # Remove all the logger handlers
     sys.excepthook = self.original_system_hook
+    logger.Logger.find_caller = True
+    self._logs.stop_queue()
+    self._logs.stop_server()
+    if self._logs.rate_limit_filter:
+      atexit.unregister(self._logs.rate_limit_filter.flush)
     try:
       self._logs.log_file.close()
     except AttributeError:
@@ -101,8 +109,17 @@ class TestLogger(TestLoggerCase):
       with self.assertRaises(ImproperlyConfigured):
         self._logs.configure_logger(None)
 
+  def test_temp_file_lazy(self):
+    self.assertIsNone(self._logs.tmp_file)
+    self.assertFalse(hasattr(self, 'temp_log_file'))
+    # Nothing to remove
+    settings.processing_dir
+    self.assertIsNone(self._logs.tmp_file)
+
   def test_temp_file_cleanup(self):
+    logger.getLogger(f'{__name__}.test_temp_file_cleanup').debug3('Created')
     self.assertExist(self.temp_log_file)
+    self.assertEqual(self._logs.tmp_file.name, self.temp_log_file)
     self.assertFalse(self._logs._configured)
     settings.processing_dir
     self.assertNotExist(self.temp_log_file)
@@ -115,6 +132,31 @@ class TestLogger(TestLoggerCase):
         '<locals>.handle_exception')
     self.assertEqual('terra.logger', sys.excepthook.__module__)
 
+  def test_ipython_exception_hook(self):
+    class InteractiveShell:
+      def showtraceback(self):
+        return 'shown'
+
+    interactiveshell = mock.Mock(InteractiveShell=InteractiveShell)
+    modules = {'IPython': mock.Mock(), 'IPython.core': mock.Mock(),
+               'IPython.core.interactiveshell': interactiveshell}
+    with mock.patch.dict(sys.modules, modules):
+      self._logs.setup_logging_ipython_exception_hook()
+    self.assertEqual(InteractiveShell.showtraceback.__qualname__,
+                     '_SetupTerraLogger.setup_logging_ipython_exception_hook.'
+                     '<locals>.handle_traceback')
+    with self.assertLogs() as cm:
+      self.assertEqual(InteractiveShell().showtraceback(), 'shown')
+    self.assertIn('Uncaught exception', str(cm.output))
+
+  def test_ipython_not_imported(self):
+    with mock.patch.dict(sys.modules):
+      for module in list(sys.modules):
+        if module.split('.')[0] == 'IPython':
+          del sys.modules[module]
+      self._logs.setup_logging_ipython_exception_hook()
+      self.assertNotIn('IPython', sys.modules)
+
   def test_exception_hook(self):
     def save_exec_info(exc_type, exc, tb):
       self.exc_type = exc_type
@@ -147,6 +189,7 @@ class TestLogger(TestLoggerCase):
     self.assertEqual(stderr_handler.level, logging.WARNING)
 
   def test_logs_temp_file(self):
+    logger.getLogger(f'{__name__}.test_logs_temp_file').debug3('Created')
     temp_handler = [
         h for h in self._logs.root_logger.handlers
         if hasattr(h, 'stream') and h.stream.name == self.temp_log_file][0]
@@ -215,6 +258,221 @@ class TestLogger(TestLoggerCase):
         f'{os.path.basename(__file__)}:test_funcName_stackinfo byeee\n',
         stream.getvalue())
 
+  def test_find_caller_cache(self):
+    test_logger = logger.getLogger(f'{__name__}.test_find_caller_cache')
+    with self.assertLogs(test_logger.logger, level=logger.INFO) as cm:
+      test_logger.info('Caller')
+    self.assertEqual(cm.records[0].funcName, 'test_find_caller_cache')
+    self.assertIs(logger._internal_files[__file__], False)
+    self.assertIs(logger._internal_files[
+        logger.LoggerAdapter.info.__code__.co_filename], True)
+
+    # Code made at run time shares its file's entry
+    size = len(logger._internal_files)
+    with self.assertLogs(test_logger.logger, level=logger.INFO):
+      for x in range(3):
+        exec(compile('test_logger.info("Dynamic")', '<dynamic>', 'exec'))
+    self.assertEqual(len(logger._internal_files), size + 1)
+
+  def test_format_uses_caller(self):
+    self.assertTrue(logger.format_uses_caller('%(filename)s %(message)s'))
+    self.assertTrue(logger.format_uses_caller('{lineno} {message}'))
+    self.assertTrue(logger.format_uses_caller('$funcName $message'))
+    self.assertTrue(logger.format_uses_caller(None))
+    self.assertFalse(logger.format_uses_caller('%(asctime)s %(message)s'))
+
+  def test_skip_caller_lookup(self):
+    settings.configure({'processing_dir': self.temp_dir.name,
+                        'logging': {'skip_caller_lookup': True}})
+    self.assertFalse(logger.Logger.find_caller)
+
+    test_logger = logger.getLogger(f'{__name__}.test_skip_caller_lookup')
+    with self.assertLogs(test_logger.logger, level=logger.INFO) as cm:
+      test_logger.info('Skipped')
+      # stack_info still needs the stack
+      test_logger.info('Stack', stack_info=True)
+    self.assertEqual(cm.records[0].funcName, '(unknown function)')
+    self.assertEqual(cm.records[0].lineno, 0)
+    self.assertEqual(cm.records[1].funcName, 'test_skip_caller_lookup')
+
+  def test_skip_caller_lookup_format(self):
+    settings.configure({'processing_dir': self.temp_dir.name,
+                        'logging': {'skip_caller_lookup': True,
+                                    'format': '%(funcName)s %(message)s'}})
+    self.assertTrue(logger.Logger.find_caller)
+
+  def test_lazy_message(self):
+    calls = []
+
+    def message():
+      calls.append(1)
+      return 'Lazy %s'
+
+    test_logger = logger.getLogger(f'{__name__}.test_lazy_message')
+    test_logger.setLevel(logger.INFO)
+    test_logger.logger.propagate = False
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    test_logger.logger.addHandler(handler)
+    self.addCleanup(test_logger.logger.removeHandler, handler)
+
+    # Disabled on the logger
+    test_logger.debug1_lazy(message, 'x')
+    test_logger.debug2_lazy(message, 'x')
+    self.assertEqual(calls, [])
+
+    # Disabled on the handler
+    handler.setLevel(logger.WARNING)
+    test_logger.info_lazy(message, 'x')
+    self.assertEqual(calls, [])
+    self.assertEqual(stream.getvalue(), '')
+
+    # Only built once for multiple handlers
+    handler.setLevel(logger.INFO)
+    handler2 = logging.StreamHandler(stream)
+    test_logger.logger.addHandler(handler2)
+    self.addCleanup(test_logger.logger.removeHandler, handler2)
+    test_logger.info_lazy(message, 'x')
+    self.assertEqual(calls, [1])
+    self.assertEqual(stream.getvalue(), 'Lazy x\nLazy x\n')
+
+  def test_lazy_settings(self):
+    with mock.patch('pprint.pformat', return_value='') as pformat:
+      settings.configure({'processing_dir': self.temp_dir.name,
+                          'logging': {'level': 'ERROR'}})
+      self._logs.file_handler.flush()
+    pformat.assert_not_called()
+
+  def test_extra_variables(self):
+    test_logger = logger.getLogger(f'{__name__}.test_extra_variables')
+    with self.assertLogs(test_logger.logger, level=logger.INFO) as cm:
+      test_logger.info('Default')
+      test_logger.info('Override', extra={'hostname': 'other'})
+      logger.getLogger(f'{__name__}.test_extra_variables',
+                       extra={'foo': 'bar'}).info('Custom')
+    self.assertEqual(cm.records[0].hostname, platform.node())
+    self.assertEqual(cm.records[1].hostname, 'other')
+    self.assertEqual(cm.records[2].hostname, platform.node())
+    self.assertEqual(cm.records[2].foo, 'bar')
+
+  def test_extra_variables_filter(self):
+    # A logger that isn't a terra Logger
+    other_logger = logging.Logger(f'{__name__}.test_extra_variables_filter')
+    record = other_logger.makeRecord(other_logger.name, logger.ERROR,
+                                     __file__, 0, 'Other', (), None)
+    self.assertFalse(hasattr(record, 'hostname'))
+    self.assertTrue(self._logs.extra_filter.filter(record))
+    self.assertEqual(record.hostname, platform.node())
+    self.assertIn(self._logs.extra_filter, self._logs.stderr_handler.filters)
+
+  def test_disabled_no_work(self):
+    test_logger = logger.getLogger(f'{__name__}.test_disabled_no_work')
+    test_logger.setLevel(logger.INFO)
+    with mock.patch.object(test_logger.logger, '_log') as _log, \
+        mock.patch.object(test_logger, 'process') as process:
+      test_logger.debug1('Disabled')
+      test_logger.debug2('Disabled')
+      test_logger.debug3('Disabled')
+      test_logger.debug('Disabled')
+      test_logger.log(logger.DEBUG1, 'Disabled')
+      test_logger.logger.debug1('Disabled')
+      _log.assert_not_called()
+      test_logger.info('Enabled %s', 1, exc_info=False)
+      _log.assert_called_once_with(logger.INFO, 'Enabled %s', (1,),
+                                   exc_info=False)
+      process.assert_not_called()
+
+  def test_logger_debug_levels(self):
+    test_logger = logging.getLogger(f'{__name__}.test_logger_debug_levels')
+    self.assertIsInstance(test_logger, logger.Logger)
+    with self.assertLogs(test_logger, level=logger.DEBUG3) as cm:
+      test_logger.debug1('One')
+      test_logger.debug2('Two')
+      test_logger.debug3('Three')
+    self.assertEqual([r.levelno for r in cm.records],
+                     [logger.DEBUG1, logger.DEBUG2, logger.DEBUG3])
+    self.assertEqual(cm.records[0].funcName, 'test_logger_debug_levels')
+
+  def test_binary(self):
+    from terra.logger.binary import BinaryFileHandler, read_records
+    settings.configure({'processing_dir': self.temp_dir.name,
+                        'logging': {'binary': True, 'level': 'INFO'}})
+    self.assertIsInstance(self._logs.file_handler, BinaryFileHandler)
+    self.assertNotExist(os.path.join(self.temp_dir.name, 'terra_log'))
+
+    message = str(uuid.uuid4())
+    logger.getLogger(f'{__name__}.test_binary').info(message)
+    with open(os.path.join(self.temp_dir.name, 'terra_log.bin'), 'rb') as fid:
+      self.assertIn(message, [r.getMessage() for r in read_records(fid)])
+
+  def test_rate_limit(self):
+    self.assertIsNone(self._logs.rate_limit_filter)
+    settings.configure({'processing_dir': self.temp_dir.name,
+                        'logging': {'level': 'INFO', 'queue': True,
+                                    'rate_limit': {'records': 2}}})
+    rate_limit_filter = self._logs.rate_limit_filter
+    self.assertEqual(rate_limit_filter.records, 2)
+    self.assertEqual(rate_limit_filter.interval, 60)
+    self.assertIn(rate_limit_filter, self._logs.file_handler.filters)
+    self.assertIn(rate_limit_filter, self._logs.stderr_handler.filters)
+    self.assertIn(rate_limit_filter, self._logs.queue_handler.filters)
+
+    test_logger = logger.getLogger(f'{__name__}.test_rate_limit')
+    message = str(uuid.uuid4())
+    for x in range(5):
+      test_logger.info(f'{message} %d', x)
+    self._logs.flush_queue()
+    with open(self._logs.log_file.name, 'r') as fid:
+      self.assertEqual(fid.read().count(message), 2)
+
+    # At exit
+    rate_limit_filter.flush()
+    self._logs.flush_queue()
+    with open(self._logs.log_file.name, 'r') as fid:
+      self.assertIn(f'Suppressed 3 similar messages: {message} %d',
+                    fid.read())
+
+  def test_rotate(self):
+    from terra.logger.rotate import RotatingFileHandler
+    settings.configure({'processing_dir': self.temp_dir.name,
+                        'logging': {'rotate': {'max_bytes': 1000,
+                                               'backup_count': 3}}})
+    self.assertIsInstance(self._logs.file_handler, RotatingFileHandler)
+    self.assertEqual(self._logs.file_handler.max_bytes, 1000)
+    self.assertEqual(self._logs.file_handler.backup_count, 3)
+    self.assertIsNone(self._logs.file_handler.rollover_at)
+    self.assertEqual(self._logs.log_file.name,
+                     os.path.join(self.temp_dir.name, 'terra_log'))
+
+    # log_file follows the handler onto the new file
+    old = self._logs.log_file
+    self._logs.file_handler.doRollover()
+    self.assertTrue(old.closed)
+    self.assertFalse(self._logs.log_file.closed)
+    self.assertIs(self._logs.log_file, self._logs.file_handler.stream)
+    self.assertEqual(self._logs.log_file.name,
+                     os.path.join(self.temp_dir.name, 'terra_log'))
+
+  def test_index(self):
+    from terra.logger.index import IndexedFileHandler
+    settings.configure({'processing_dir': self.temp_dir.name,
+                        'logging': {'index': {'records': 10}}})
+    self.assertIsInstance(self._logs.file_handler, IndexedFileHandler)
+    self.assertEqual(self._logs.file_handler.index_records, 10)
+    self.assertEqual(self._logs.log_file.name,
+                     os.path.join(self.temp_dir.name, 'terra_log'))
+    self.assertExist(os.path.join(self.temp_dir.name, 'terra_log.idx'))
+
+  def test_index_rotate(self):
+    from terra.logger.index import IndexedRotatingFileHandler
+    settings.configure({'processing_dir': self.temp_dir.name,
+                        'logging': {'index': {'records': 10},
+                                    'rotate': {'max_bytes': 1000}}})
+    self.assertIsInstance(self._logs.file_handler,
+                          IndexedRotatingFileHandler)
+    self.assertEqual(self._logs.file_handler.index_records, 10)
+    self.assertEqual(self._logs.file_handler.max_bytes, 1000)
+
   def test_level(self):
     settings.configure({'processing_dir': self.temp_dir.name,
                         'logging': {'level': 'DEBUG1'}})
@@ -263,6 +521,54 @@ class TestLogger(TestLoggerCase):
     self.assertEqual(str(test_handler.buffer).count(message2), 1)
     self.assertEqual(str(test_handler.buffer).count(message3), 0)
 
+  def test_preconfig_buffer(self):
+    buffer = logger._PreconfigBuffer(2)
+    self.addCleanup(buffer.close)
+    test_logger = logger.getLogger(f'{__name__}.test_preconfig_buffer')
+    records = [test_logger.logger.makeRecord(
+               test_logger.logger.name, level, __file__, 0,
+               'Message %d', (x,), None)
+               for x, level in enumerate([logger.INFO, logger.ERROR] * 3)]
+    for record in records[:2]:
+      buffer.handle(record)
+    self.assertIsNone(buffer.spill_handler)
+
+    for record in records[2:]:
+      buffer.handle(record)
+    # Bounded
+    self.assertEqual(list(buffer.buffer), records[4:])
+    spill_file = buffer.spill_handler.baseFilename
+    self.assertExist(spill_file)
+
+    info_handler = logging.handlers.MemoryHandler(capacity=1000)
+    info_handler.setLevel(logger.INFO)
+    error_handler = logging.handlers.MemoryHandler(capacity=1000)
+    error_handler.setLevel(logger.ERROR)
+    buffer.replay([info_handler, error_handler])
+
+    self.assertEqual([r.getMessage() for r in info_handler.buffer],
+                     [f'Message {x}' for x in range(6)])
+    self.assertEqual([r.getMessage() for r in error_handler.buffer],
+                     ['Message 1', 'Message 3', 'Message 5'])
+    self.assertNotExist(spill_file)
+    self.assertIsNone(buffer.spill_handler)
+    self.assertEqual(len(buffer.buffer), 0)
+
+  def test_replay_spilled(self):
+    self.assertEqual(self._logs.preconfig_handler.capacity, 1000)
+    self._logs.preconfig_handler.capacity = 2
+    test_logger = logger.getLogger(f'{__name__}.test_replay_spilled')
+    messages = [str(uuid.uuid4()) for x in range(5)]
+    with mock.patch.object(self._logs.stderr_handler, 'stream', io.StringIO()):
+      for message in messages:
+        test_logger.error(message)
+      settings.configure({'processing_dir': self.temp_dir.name})
+
+    with open(self._logs.log_file.name, 'r') as fid:
+      log = fid.read()
+    self.assertEqual([log.index(message) for message in messages],
+                     sorted(log.index(message) for message in messages))
+
   def test_configured_file(self):
     settings._setup()
     log_filename = os.path.join(self.temp_dir.name,
@@ -276,6 +582,157 @@ class TestLogger(TestLoggerCase):
     self.assertEqual(log_handler.level, logger.ERROR)
     self.assertEqual(self._logs.root_logger.level, logger.NOTSET)
 
+  def test_queue(self):
+    settings.configure({'processing_dir': self.temp_dir.name,
+                        'logging': {'level': 'INFO', 'queue': True}})
+    self.assertIsNotNone(self._logs.queue_listener)
+    self.assertIn(self._logs.queue_handler, self._logs.root_logger.handlers)
+    self.assertNotIn(self._logs.file_handler,
+                     self._logs.root_logger.handlers)
+    self.assertNotIn(self._logs.stderr_handler,
+                     self._logs.root_logger.handlers)
+
+    message1 = str(uuid.uuid4())
+    message2 = str(uuid.uuid4())
+    test_logger = logger.getLogger(f'{__name__}.test_queue')
+    test_logger.info(message1)
+    test_logger.debug1(message2)
+    self._logs.flush_queue()
+
+    with open(self._logs.log_file.name, 'r') as fid:
+      log = fid.read()
+    self.assertIn(message1, log)
+    # Handler levels are still respected
+    self.assertNotIn(message2, log)
+
+    # Records below both handlers' levels aren't queued
+    self.assertEqual(self._logs.queue_handler.level, logger.INFO)
+    with mock.patch.object(self._logs.log_queue, 'put_nowait') as put_nowait:
+      test_logger.debug1(message2)
+    put_nowait.assert_not_called()
+
+    self._logs.file_handler.setLevel(logger.DEBUG1)
+    self._logs.update_queue_level()
+    test_logger.debug1(message2)
+    self._logs.flush_queue()
+    with open(self._logs.log_file.name, 'r') as fid:
+      self.assertIn(message2, fid.read())
+
+    self._logs.stop_queue()
+    self.assertIsNone(self._logs.queue_listener)
+    self.assertIn(self._logs.file_handler, self._logs.root_logger.handlers)
+    self.assertNotIn(self._logs.queue_handler,
+                     self._logs.root_logger.handlers)
+
+  def test_queue_exception_hook(self):
+    settings.configure({'processing_dir': self.temp_dir.name,
+                        'logging': {'queue': True}})
+    sys.excepthook = lambda *args: None
+    self._logs.setup_logging_exception_hook()
+    message = str(uuid.uuid4())
+    with mock.patch.object(self._logs.stderr_handler, 'stream', io.StringIO()):
+      # The hook blocks until the record is handled, so no flush is needed
+      sys.excepthook(ZeroDivisionError, ZeroDivisionError(message),
+                     make_traceback())
+      with open(self._logs.log_file.name, 'r') as fid:
+        self.assertIn(message, fid.read())
+    self._logs.stop_queue()
+
+  def test_log_server(self):
+    settings.configure({'processing_dir': self.temp_dir.name,
+                        'logging': {'level': 'INFO',
+                                    'server': {'enabled': True}}})
+    self.assertIsNotNone(self._logs.log_server)
+    address = os.environ[logger.LOG_SERVER_ENVIRONMENT_VARIABLE]
+    self.assertEqual(address, self._logs.log_server.address)
+
+    # Pretend to be a child process
+    message = str(uuid.uuid4())
+    host, port = address.rsplit(':', 1)
+    client = logger._LogServerHandler(host, int(port), 'FooService')
+    record = logging.LogRecord(f'{__name__}.test_log_server', logger.INFO,
+                               __file__, 0, "%s", (message,), None)
+    client.emit(record)
+    client.close()
+
+    # The record is handled on the server's thread
+    for _ in range(100):
+      with open(self._logs.log_file.name, 'r') as fid:
+        log = fid.read()
+      if message in log:
+        break
+      time.sleep(0.05)
+    self.assertIn(f'[FooService:{os.getpid()}] {message}', log)
+
+    self._logs.stop_server()
+    self.assertNotIn(logger.LOG_SERVER_ENVIRONMENT_VARIABLE, os.environ)
+
+  def test_log_server_writer(self):
+    handled = []
+
+    class Handler(logging.Handler):
+      def emit(self, record):
+        handled.append((threading.current_thread().name, record.getMessage()))
+
+    test_logger = logging.getLogger(f'{__name__}.test_log_server_writer')
+    handler = Handler()
+    test_logger.addHandler(handler)
+    self.addCleanup(test_logger.removeHandler, handler)
+    with mock.patch.object(test_logger, 'propagate', False):
+      server = logger.LogRecordServer()
+      server.start()
+      host, port = server.address.rsplit(':', 1)
+      clients = [logger._LogServerHandler(host, int(port), f'Foo{c}')
+                 for c in range(2)]
+      for x in range(20):
+        for client in clients:
+          client.emit(logging.LogRecord(test_logger.name, logger.INFO,
+                                        __file__, 0, "%d", (x,), None))
+      for client in clients:
+        client.close()
+
+      for _ in range(100):
+        if len(handled) == 40:
+          break
+        time.sleep(0.05)
+      server.stop()
+
+    # One thread writes every record, and each sender's order is kept
+    self.assertEqual({name for name, _ in handled}, {'TerraLogServerWriter'})
+    for c in range(2):
+      self.assertEqual(
+          [message for _, message in handled
+           if message.startswith(f'[Foo{c}:')],
+          [f'[Foo{c}:{os.getpid()}] {x}' for x in range(20)])
+
+  def test_log_server_child(self):
+    with mock.patch.dict(os.environ,
+                         {logger.LOG_SERVER_ENVIRONMENT_VARIABLE:
+                          'localhost:1234'}):
+      settings.configure({'processing_dir': self.temp_dir.name})
+
+    self.assertIsInstance(self._logs.file_handler, logger._LogServerHandler)
+    self.assertEqual(self._logs.file_handler.port, 1234)
+    self.assertNotIn(self._logs.stderr_handler,
+                     self._logs.root_logger.handlers)
+    self.assertNotExist(os.path.join(self.temp_dir.name,
+                                     self._logs.default_log_prefix))
+    self._logs.file_handler.close()
+
+  def test_log_server_env(self):
+    class FooService:
+      pass
+
+    with mock.patch.dict(os.environ):
+      os.environ.pop(logger.LOG_SERVER_ENVIRONMENT_VARIABLE, None)
+      self.assertEqual(logger.log_server_env(FooService()), {})
+
+      os.environ[logger.LOG_SERVER_ENVIRONMENT_VARIABLE] = 'foo:1'
+      self.assertEqual(logger.log_server_env(FooService()),
+                       {logger.LOG_SERVER_ENVIRONMENT_VARIABLE: 'foo:1',
+                        logger.LOG_SERVICE_ENVIRONMENT_VARIABLE:
+                            FooService.__qualname__})
+
   def test_debug1(self):
     message = str(uuid.uuid4())
     with self.assertLogs(level=logger.DEBUG1) as cm:
@@ -0,0 +1,196 @@
+import io
+import logging
+import os
+import platform
+import sys
+from unittest import mock
+
+from terra import logger
+from terra.logger import binary
+from terra.logger.__main__ import main
+from .utils import TestCase
+
+
+class TestBinaryLog(TestCase):
+  def setUp(self):
+    super().setUp()
+    self.filename = os.path.join(self.temp_dir.name, 'terra_log.bin')
+    self.handler = binary.BinaryFileHandler(self.filename)
+    self.test_logger = logger.getLogger(f'{__name__}.TestBinaryLog')
+    self.test_logger.setLevel(logger.DEBUG3)
+    self.test_logger.logger.addHandler(self.handler)
+    self.test_logger.logger.propagate = False
+
+  def tearDown(self):
+    self.test_logger.logger.removeHandler(self.handler)
+    self.handler.close()
+    super().tearDown()
+
+  def read(self, **kwargs):
+    with open(self.filename, 'rb') as fid:
+      return list(binary.read_records(fid, **kwargs))
+
+  def test_round_trip(self):
+    self.test_logger.info('Hello %s %d', 'world', 15)
+    self.test_logger.debug2('Mapping %(a)s', {'a': 1.5})
+    self.test_logger.warning('Object %s', object)
+
+    records = self.read()
+    self.assertEqual(len(records), 3)
+
+    self.assertEqual(records[0].msg, 'Hello %s %d')
+    self.assertEqual(records[0].args, ('world', 15))
+    self.assertEqual(records[0].getMessage(), 'Hello world 15')
+    self.assertEqual(records[0].levelname, 'INFO')
+    self.assertEqual(records[0].name, f'{__name__}.TestBinaryLog')
+    self.assertEqual(records[0].funcName, 'test_round_trip')
+    self.assertEqual(records[0].filename, os.path.basename(__file__))
+    self.assertEqual(records[0].process, os.getpid())
+    self.assertEqual(records[0].hostname, platform.node())
+
+    self.assertEqual(records[1].getMessage(), 'Mapping 1.5')
+    self.assertEqual(records[1].levelno, logger.DEBUG2)
+
+    # Not a json type, so formatted when written
+    self.assertEqual(records[2].msg, f'Object {object}')
+    self.assertIsNone(records[2].args)
+
+    formatter = logging.Formatter(binary.DEFAULT_FORMAT)
+    self.assertIn(f'({platform.node()}): INFO - Hello world 15',
+                  formatter.format(records[0]))
+
+  def test_exception(self):
+    try:
+      raise ValueError('Bad value')
+    except ValueError:
+      self.test_logger.exception('Failed')
+
+    record, = self.read()
+    self.assertIn('ValueError: Bad value', record.exc_text)
+    self.assertIn('ValueError: Bad value',
+                  logging.Formatter().format(record))
+
+  def test_custom_level(self):
+    self.test_logger.log(300, 'Custom')
+    record, = self.read()
+    self.assertEqual(record.levelno, 300)
+    self.assertEqual(record.getMessage(), 'Custom')
+
+  def test_version_1(self):
+    frames = [binary._header.pack(binary.HEADER, binary.MAGIC, 1)]
+    for string_id, value in enumerate(('foo', __file__, 'func', 'Main',
+                                       'Thread', '{}')):
+      frames.append(binary._string.pack(binary.STRING, string_id)
+                    + value.encode())
+    frames.append(binary._records[1].pack(
+        binary.RECORD, 100.0, logger.INFO, 1, 2, 0, 1, 2, 3, 4, 5)
+        + binary._pack_string('Old') + binary._pack_string('')
+        + binary._pack_string('') + binary._pack_string(''))
+    with open(self.filename, 'wb') as fid:
+      fid.write(b''.join(binary._frame(frame) for frame in frames))
+
+    # And a newer session appended
+    self.handler.close()
+    self.test_logger.info('New')
+    records = self.read()
+    self.assertEqual([r.getMessage() for r in records], ['Old', 'New'])
+    self.assertEqual(records[0].levelno, logger.INFO)
+    self.assertEqual(records[0].name, 'foo')
+
+  def test_interned(self):
+    for x in range(10):
+      self.test_logger.info('Same logger %d', x)
+    with open(self.filename, 'rb') as fid:
+      data = fid.read()
+    self.assertEqual(data.count(f'{__name__}.TestBinaryLog'.encode()), 1)
+
+  def test_append(self):
+    self.test_logger.info('First')
+    self.handler.close()
+    self.test_logger.logger.removeHandler(self.handler)
+
+    self.handler = binary.BinaryFileHandler(self.filename)
+    self.test_logger.logger.addHandler(self.handler)
+    self.test_logger.info('Second')
+
+    with open(self.filename, 'rb') as fid:
+      self.assertEqual(fid.read().count(binary.MAGIC), 2)
+    self.assertEqual([r.getMessage() for r in self.read()],
+                     ['First', 'Second'])
+    self.assertEqual(self.read()[1].name, f'{__name__}.TestBinaryLog')
+
+  def test_truncated(self):
+    self.test_logger.info('Complete')
+    self.test_logger.info('Truncated')
+    with open(self.filename, 'rb+') as fid:
+      fid.truncate(os.path.getsize(self.filename) - 3)
+    self.assertEqual([r.getMessage() for r in self.read()], ['Complete'])
+
+  def test_not_binary_log(self):
+    with open(self.filename, 'wb') as fid:
+      fid.write(binary._frame(b'\x00ABCD\x01'))
+    with self.assertRaises(ValueError):
+      self.read()
+
+  def test_filters(self):
+    other_logger = logger.getLogger(f'{__name__}.Other')
+    other_logger.logger.addHandler(self.handler)
+    self.addCleanup(other_logger.logger.removeHandler, self.handler)
+    other_logger.logger.propagate = False
+    other_logger.setLevel(logger.DEBUG3)
+
+    with mock.patch('time.time', return_value=1000.0):
+      self.test_logger.debug1('Early debug')
+    with mock.patch('time.time', return_value=2000.0):
+      self.test_logger.error('Late error')
+      other_logger.error('Other error')
+      child = logger.getLogger(f'{__name__}.TestBinaryLog.child')
+      child.error('Child error')
+
+    def messages(**kwargs):
+      return [r.getMessage() for r in self.read(**kwargs)]
+
+    self.assertEqual(messages(level=logger.ERROR),
+                     ['Late error', 'Other error', 'Child error'])
+    self.assertEqual(messages(since=1500), messages(level=logger.ERROR))
+    self.assertEqual(messages(until=1500), ['Early debug'])
+    self.assertEqual(messages(loggers=[f'{__name__}.Other']), ['Other error'])
+    self.assertEqual(messages(loggers=[f'{__name__}.TestBinaryLog']),
+                     ['Early debug', 'Late error', 'Child error'])
+
+  def test_filters_skip_decoding(self):
+    self.test_logger.debug1('Skipped')
+    self.test_logger.error('Decoded')
+    with mock.patch.object(binary, '_unpack_string',
+                           wraps=binary._unpack_string) as unpack:
+      self.assertEqual(len(self.read(level=logger.ERROR)), 1)
+    # msg, args, exc_text and stack_info of one record
+    self.assertEqual(unpack.call_count, 4)
+
+  def test_parse(self):
+    self.assertEqual(binary.parse_level('debug2'), logger.DEBUG2)
+    self.assertEqual(binary.parse_level('15'), 15)
+    with self.assertRaises(ValueError):
+      binary.parse_level('loud')
+    self.assertEqual(binary.parse_time('1000.5'), 1000.5)
+    self.assertEqual(binary.parse_time('2020-01-02T03:04:05'),
+                     binary.datetime.datetime(2020, 1, 2, 3, 4, 5).timestamp())
+
+  def test_main(self):
+    self.test_logger.info('Hello %s', 'world')
+    self.test_logger.warning('Goodbye')
+
+    with mock.patch.object(sys, 'stdout', io.StringIO()) as stdout:
+      self.assertEqual(main(['decode', self.filename,
+                             '--format', '%(levelname)s %(message)s']), 0)
+    self.assertEqual(stdout.getvalue(), 'INFO Hello world\nWARNING Goodbye\n')
+
+    with mock.patch.object(sys, 'stdout', io.StringIO()) as stdout:
+      self.assertEqual(main(['grep', 'wor', self.filename,
+                             '--format', '{message}', '--style', '{']), 0)
+    self.assertEqual(stdout.getvalue(), 'Hello world\n')
+
+    with mock.patch.object(sys, 'stdout', io.StringIO()) as stdout:
+      self.assertEqual(main(['grep', 'wor', self.filename,
+                             '--level', 'warning']), 1)
+    self.assertEqual(stdout.getvalue(), '')
@@ -0,0 +1,103 @@
+import logging
+from subprocess import Popen, TimeoutExpired
+import sys
+import threading
+from unittest import mock
+
+from terra import settings, logger
+from terra.compute import virtualenv
+from terra.logger.capture import OutputCapture, service_capture
+from .utils import TestCase
+
+
+class TestCapture(TestCase):
+  def setUp(self):
+    self.patches.append(mock.patch.object(settings, '_wrapped', None))
+    super().setUp()
+    settings.configure({'processing_dir': self.temp_dir.name})
+
+  def run_python(self, code, capture):
+    process = Popen([sys.executable, '-c', code], **capture.popen_kwargs)
+    capture.start(process)
+    self.assertEqual(process.wait(), 0)
+    capture.join()
+    return process
+
+  def test_capture(self):
+    capture = OutputCapture('Foo')
+    with self.assertLogs('terra.service.Foo', level=logger.DEBUG1) as cm:
+      process = self.run_python(
+          'import sys\n'
+          'print("out 1")\n'
+          'print("err 1", file=sys.stderr)\n'
+          'print("out 2\\r\\n\\nno newline 100%", end="")\n', capture)
+
+    # The order between stdout and stderr isn't kept
+    self.assertEqual(
+        [x for x in cm.output if x.startswith('INFO:')],
+        [f'INFO:terra.service.Foo:[Foo:{process.pid}] out 1',
+         f'INFO:terra.service.Foo:[Foo:{process.pid}] out 2',
+         f'INFO:terra.service.Foo:[Foo:{process.pid}] ',
+         f'INFO:terra.service.Foo:[Foo:{process.pid}] no newline 100%'])
+    self.assertEqual(
+        [x for x in cm.output if not x.startswith('INFO:')],
+        [f'WARNING:terra.service.Foo:[Foo:{process.pid}] err 1'])
+    self.assertEqual(cm.records[0].service, 'Foo')
+    self.assertTrue(process.stdout.closed)
+
+  def test_max_line(self):
+    capture = OutputCapture('Foo', max_line=4)
+    with self.assertLogs('terra.service.Foo') as cm:
+      self.run_python('print("123456789\\nabcd", end="")', capture)
+    self.assertEqual([r.getMessage().split(' ', 1)[1] for r in cm.records],
+                     ['1234', '5678', '9', 'abcd'])
+
+  def test_backpressure(self):
+    # The service blocks on its full pipe while logging is blocked
+    unblock = threading.Event()
+    records = []
+
+    class BlockingHandler(logging.Handler):
+      def emit(self, record):
+        unblock.wait()
+        records.append(record)
+
+    handler = BlockingHandler()
+    capture = OutputCapture('Foo')
+    capture.logger.addHandler(handler)
+    self.addCleanup(capture.logger.removeHandler, handler)
+    capture.logger.setLevel(logger.INFO)
+    self.addCleanup(capture.logger.setLevel, logger.NOTSET)
+
+    process = Popen([sys.executable, '-c', 'for x in range(100000): print(x)'],
+                    **capture.popen_kwargs)
+    capture.start(process)
+    with self.assertRaises(TimeoutExpired):
+      process.wait(0.5)
+    unblock.set()
+    self.assertEqual(process.wait(), 0)
+    capture.join()
+
+    self.assertEqual(len(records), 100000)
+    self.assertEqual(records[-1].getMessage().split(' ', 1)[1], '99999')
+
+  def test_levels(self):
+    capture = OutputCapture('Foo', stdout_level=logger.DEBUG1)
+    with self.assertLogs('terra.service.Foo', level=logger.INFO) as cm:
+      self.run_python('import sys\nprint("out")\nprint("err", '
+                      'file=sys.stderr)', capture)
+    self.assertEqual(len(cm.records), 1)
+    self.assertEqual(cm.records[0].levelno, logger.WARNING)
+
+  def test_service_capture(self):
+    service = virtualenv.Service()
+    self.assertIsNone(service_capture(service))
+
+    with settings:
+      settings.compute.capture_output.enabled = True
+      settings.compute.capture_output.stdout_level = 'debug1'
+      capture = service_capture(service)
+    self.assertEqual(capture.name, 'Service')
+    self.assertEqual(capture.stdout_level, logger.DEBUG1)
+    self.assertEqual(capture.stderr_level, logger.WARNING)
+    self.assertEqual(capture.max_line, 65536)
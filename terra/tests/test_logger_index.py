@@ -0,0 +1,149 @@
+import io
+import logging
+import os
+import sys
+from unittest import mock
+
+from terra import logger
+from terra.logger import index, rotate
+from terra.logger.__main__ import main
+from .utils import TestCase
+
+
+class TestIndex(TestCase):
+  def setUp(self):
+    super().setUp()
+    self.filename = os.path.join(self.temp_dir.name, 'terra_log')
+    self.test_logger = logger.getLogger(f'{__name__}.TestIndex')
+    self.test_logger.setLevel(logger.INFO)
+    self.test_logger.logger.propagate = False
+    self.handler = None
+
+  def tearDown(self):
+    rotate.compressor.join()
+    if self.handler:
+      self.test_logger.logger.removeHandler(self.handler)
+      self.handler.close()
+    super().tearDown()
+
+  def use_handler(self, handler_class=index.IndexedFileHandler, **kwargs):
+    self.handler = handler_class(self.filename, **kwargs)
+    self.handler.setFormatter(logging.Formatter('%(message)s'))
+    self.test_logger.logger.addHandler(self.handler)
+
+  def log(self, created, level, msg):
+    with mock.patch('time.time', return_value=created):
+      self.test_logger.log(level, msg)
+
+  def query(self, *args):
+    with mock.patch.object(sys, 'stdout', io.StringIO()) as stdout:
+      self.assertEqual(main(['query'] + list(args) + [self.filename]), 0)
+    return stdout.getvalue().splitlines()
+
+  def test_entries(self):
+    self.use_handler(index_records=3)
+    for x in range(7):
+      self.log(100 + x, logger.INFO, f'Message {x}')
+    self.log(107, logger.ERROR, 'Error 7')
+    self.log(108, logger.INFO, 'Message 8')
+
+    entries = index.read_index(self.filename)
+    self.assertEqual(
+        entries,
+        [(0, 30, 100, 102, logger.INFO, logger.INFO),
+         (30, 60, 103, 105, logger.INFO, logger.INFO),
+         (60, 88, 106, 108, logger.INFO, logger.ERROR)])
+
+    # The last partial block is written when closed
+    self.log(109, logger.INFO, 'Message 9')
+    self.assertEqual(len(index.read_index(self.filename)), 3)
+    self.handler.close()
+    self.assertEqual(index.read_index(self.filename)[-1],
+                     (88, 98, 109, 109, logger.INFO, logger.INFO))
+
+  def test_non_ascii(self):
+    self.use_handler(index_records=2, encoding='utf-8')
+    with mock.patch.object(os, 'fstat', side_effect=AssertionError):
+      for x in range(4):
+        self.log(100 + x, logger.INFO, f'\u00e9t\u00e9 {x}')
+    # Offsets are in bytes
+    self.assertEqual(index.read_index(self.filename),
+                     [(0, 16, 100, 101, logger.INFO, logger.INFO),
+                      (16, 32, 102, 103, logger.INFO, logger.INFO)])
+
+  def test_query_level(self):
+    self.use_handler(index_records=2)
+    for x in range(6):
+      self.log(100 + x, logger.ERROR if x == 3 else logger.INFO,
+               f'Message {x}')
+
+    self.assertEqual(self.query('--level', 'ERROR'),
+                     [f'==> {self.filename} 20-40 (max level ERROR) <==',
+                      'Message 2', 'Message 3'])
+    self.assertEqual(self.query('--level', 'ERROR', '--grep', '3'),
+                     [f'==> {self.filename} 20-40 (max level ERROR) <==',
+                      'Message 3'])
+
+  def test_query_time(self):
+    self.use_handler(index_records=2)
+    for x in range(6):
+      self.log(100 + x * 10, logger.INFO, f'Message {x}')
+
+    self.assertEqual(self.query('--since', '125', '--until', '141'),
+                     [f'==> {self.filename} 20-40 (max level INFO) <==',
+                      'Message 2', 'Message 3',
+                      f'==> {self.filename} 40-60 (max level INFO) <==',
+                      'Message 4', 'Message 5'])
+    self.assertEqual(self.query('--since', '200'), [])
+
+  def test_not_indexed(self):
+    with open(self.filename, 'w') as fid:
+      fid.write('Before\n')
+    self.use_handler(index_records=2)
+    for x in range(3):
+      self.log(100, logger.INFO, f'Message {x}')
+
+    # The part written before the index, and the block still being written,
+    # are always included
+    self.assertEqual(self.query('--level', 'ERROR'),
+                     [f'==> {self.filename} 0-7 (not indexed) <==',
+                      'Before',
+                      f'==> {self.filename} 27-37 (not indexed) <==',
+                      'Message 2'])
+
+  def test_rotate(self):
+    self.use_handler(index.IndexedRotatingFileHandler, index_records=2,
+                     max_bytes=30, backup_count=1, compress=False)
+    for x in range(8):
+      self.log(100 + x, logger.INFO, f'Message {x}')
+
+    segments = self.handler.segments()
+    self.assertEqual(len(segments), 1)
+    self.assertEqual(index.read_index(segments[0]),
+                     [(0, 20, 103, 104, logger.INFO, logger.INFO),
+                      (20, 30, 105, 105, logger.INFO, logger.INFO)])
+    self.assertEqual(index.read_index(self.filename),
+                     [(0, 20, 106, 107, logger.INFO, logger.INFO)])
+
+    # The older segment's index was removed with it
+    self.assertEqual(
+        sorted(os.listdir(self.temp_dir.name)),
+        sorted(['terra_log', 'terra_log.idx', os.path.basename(segments[0]),
+                os.path.basename(segments[0]) + '.idx']))
+
+  def test_compressed_segment(self):
+    self.use_handler(index.IndexedRotatingFileHandler, index_records=2,
+                     max_bytes=30)
+    for x in range(4):
+      self.log(100 + x, logger.ERROR if x == 0 else logger.INFO,
+               f'Message {x}')
+    rotate.compressor.join()
+
+    segment, = self.handler.segments()
+    self.assertNotExist(segment)
+    out = io.StringIO()
+    self.assertEqual(index.query(segment + '.gz', out, level=logger.ERROR),
+                     1)
+    self.assertEqual(out.getvalue().splitlines(),
+                     [f'==> {segment}.gz 0-20 (max level ERROR) <==',
+                      'Message 0', 'Message 1'])
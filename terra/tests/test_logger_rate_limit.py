@@ -0,0 +1,120 @@
+import logging
+import logging.handlers
+import time
+
+from terra import logger
+from terra.logger.rate_limit import RateLimitFilter
+from .utils import TestCase
+
+
+class TestRateLimit(TestCase):
+  def setUp(self):
+    super().setUp()
+    self.test_logger = logger.getLogger(f'{__name__}.TestRateLimit')
+    self.test_logger.setLevel(logger.INFO)
+    self.test_logger.logger.propagate = False
+    self.filter = RateLimitFilter(2, interval=10, max_keys=3)
+    self.handler = logging.handlers.MemoryHandler(capacity=1000)
+    self.handler.addFilter(self.filter)
+    self.test_logger.logger.addHandler(self.handler)
+
+  def tearDown(self):
+    if self.filter._timer:
+      self.filter._timer.cancel()
+    self.test_logger.logger.removeHandler(self.handler)
+    super().tearDown()
+
+  def log(self, created, msg, *args, level=logger.WARNING, name=None):
+    name = name or self.test_logger.logger.name
+    record = logging.getLogger(name).makeRecord(
+        name, level, __file__, 0, msg, args, None)
+    record.created = created
+    logging.getLogger(name).handle(record)
+
+  def messages(self):
+    return [r.getMessage() for r in self.handler.buffer]
+
+  def test_rate_limit(self):
+    for x in range(5):
+      self.log(100 + x, 'Item %d failed', x)
+    self.log(101, 'Different %d', 1)
+    self.assertEqual(self.messages(), ['Item 0 failed', 'Item 1 failed',
+                                       'Different 1'])
+
+    # Next interval
+    self.log(110, 'Item %d failed', 5)
+    self.assertEqual(self.messages()[3:],
+                     ['Suppressed 3 similar messages: Item %d failed',
+                      'Item 5 failed'])
+    self.assertEqual(self.handler.buffer[3].levelno, logger.WARNING)
+    self.assertEqual(self.handler.buffer[3].name,
+                     self.test_logger.logger.name)
+
+  def test_level_is_part_of_key(self):
+    for x in range(3):
+      self.log(100, 'Same', level=logger.WARNING)
+      self.log(100, 'Same', level=logger.ERROR)
+    self.assertEqual(len(self.handler.buffer), 4)
+
+  def test_sweep(self):
+    for x in range(3):
+      self.log(100, 'Once %d', x)
+    # A different message, after the interval, summarizes the first one
+    self.log(111, 'Other')
+    self.assertEqual(self.messages(),
+                     ['Once 0', 'Once 1',
+                      'Suppressed 1 similar messages: Once %d', 'Other'])
+
+  def test_max_keys(self):
+    for x in range(3):
+      self.log(100, 'First')
+    for msg in ('Second', 'Third', 'Fourth'):
+      self.log(100, msg)
+    self.assertEqual(len(self.filter.groups), 3)
+    self.assertNotIn((self.test_logger.logger.name, logger.WARNING, 'First'),
+                     self.filter.groups)
+    self.assertIn('Suppressed 1 similar messages: First', self.messages())
+
+  def test_lazy_message(self):
+    for x in range(3):
+      self.test_logger.info_lazy(lambda x=x: f'Lazy {x}')
+    self.assertEqual(self.messages(), ['Lazy 0', 'Lazy 1'])
+
+  def test_multiple_handlers(self):
+    handler2 = logging.handlers.MemoryHandler(capacity=1000)
+    handler2.addFilter(self.filter)
+    self.test_logger.logger.addHandler(handler2)
+    self.addCleanup(self.test_logger.logger.removeHandler, handler2)
+
+    for x in range(4):
+      self.log(100, 'Both %d', x)
+    self.assertEqual(self.messages(), ['Both 0', 'Both 1'])
+    self.assertEqual([r.getMessage() for r in handler2.buffer],
+                     ['Both 0', 'Both 1'])
+
+  def test_flush(self):
+    # The end of a run, nothing else is logged
+    for x in range(4):
+      self.log(100, 'Last %d', x)
+    self.filter.flush()
+    self.assertEqual(self.messages(),
+                     ['Last 0', 'Last 1',
+                      'Suppressed 2 similar messages: Last %d'])
+    # Only summarized once
+    self.filter.flush()
+    self.assertEqual(len(self.handler.buffer), 3)
+    # Still limited for the rest of the interval
+    self.log(101, 'Last %d', 4)
+    self.assertEqual(len(self.handler.buffer), 3)
+
+  def test_quiet(self):
+    self.filter.interval = 0.05
+    for x in range(3):
+      self.log(time.time(), 'Quiet %d', x)
+    for _ in range(100):
+      if len(self.handler.buffer) == 3:
+        break
+      time.sleep(0.02)
+    self.assertEqual(self.messages(),
+                     ['Quiet 0', 'Quiet 1',
+                      'Suppressed 1 similar messages: Quiet %d'])
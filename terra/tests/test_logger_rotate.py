@@ -0,0 +1,140 @@
+import gzip
+import io
+import logging
+import os
+import sys
+from unittest import mock
+
+from terra import logger
+from terra.logger import rotate
+from terra.logger.__main__ import main
+from .utils import TestCase
+
+
+class TestRotate(TestCase):
+  def setUp(self):
+    super().setUp()
+    self.filename = os.path.join(self.temp_dir.name, 'terra_log')
+    self.test_logger = logger.getLogger(f'{__name__}.TestRotate')
+    self.test_logger.setLevel(logger.INFO)
+    self.test_logger.logger.propagate = False
+    self.handler = None
+
+  def tearDown(self):
+    rotate.compressor.join()
+    if self.handler:
+      self.test_logger.logger.removeHandler(self.handler)
+      self.handler.close()
+    super().tearDown()
+
+  def use_handler(self, handler_class=rotate.RotatingFileHandler,
+                  filename=None, **kwargs):
+    self.handler = handler_class(filename or self.filename, **kwargs)
+    self.handler.setFormatter(logging.Formatter('%(message)s'))
+    self.test_logger.logger.addHandler(self.handler)
+
+  def test_size(self):
+    self.use_handler(max_bytes=100)
+    for x in range(30):
+      self.test_logger.info(f'Message {x:05d}')
+    rotate.compressor.join()
+
+    segments = self.handler.segments()
+    self.assertEqual(len(segments), 3)
+    messages = []
+    for segment in segments:
+      self.assertNotExist(segment)
+      with gzip.open(segment + '.gz', 'rt') as fid:
+        contents = fid.read()
+      # Rotates on the first record past max_bytes
+      self.assertEqual(len(contents), 112)
+      messages += contents.splitlines()
+    with open(self.filename, 'r') as fid:
+      messages += fid.read().splitlines()
+
+    self.assertEqual(messages, [f'Message {x:05d}' for x in range(30)])
+
+  def test_size_counted(self):
+    with open(self.filename, 'w') as fid:
+      fid.write('Old\n')
+    self.use_handler(max_bytes=1000, encoding='utf-8')
+    self.assertEqual(self.handler.stream_size, 4)
+    with mock.patch.object(os, 'fstat', side_effect=AssertionError):
+      for x in range(5):
+        self.test_logger.info(f'Caf\u00e9 {x}')
+    self.assertEqual(self.handler.stream_size,
+                     os.path.getsize(self.filename))
+
+  def test_time(self):
+    with mock.patch('time.time', return_value=1000.0):
+      self.use_handler(interval=60, compress=False)
+      self.test_logger.info('First')
+    with mock.patch('time.time', return_value=1059.0):
+      self.test_logger.info('Second')
+    self.assertEqual(self.handler.segments(), [])
+
+    with mock.patch('time.time', return_value=1060.0):
+      self.test_logger.info('Third')
+    segment, = self.handler.segments()
+    with open(segment, 'r') as fid:
+      self.assertEqual(fid.read(), 'First\nSecond\n')
+    self.assertEqual(self.handler.rollover_at, 1120.0)
+
+  def test_existing_file_age(self):
+    with open(self.filename, 'w') as fid:
+      fid.write('Old\n')
+    os.utime(self.filename, (1000, 1000))
+    self.use_handler(interval=60, compress=False)
+    self.assertEqual(self.handler.rollover_at, 1060)
+    self.test_logger.info('New')
+    self.assertEqual(len(self.handler.segments()), 1)
+
+  def test_backup_count(self):
+    self.use_handler(max_bytes=10, backup_count=2)
+    for x in range(6):
+      self.test_logger.info(f'Message {x:05d}')
+    rotate.compressor.join()
+
+    segments = self.handler.segments()
+    self.assertEqual(len(segments), 2)
+    # Rotated in the same second, so numbered
+    self.assertEqual(segments[1], segments[0].rsplit('.', 1)[0] + '.'
+                     + str(int(segments[0].rsplit('.', 1)[1]) + 1))
+    with gzip.open(segments[-1] + '.gz', 'rt') as fid:
+      self.assertEqual(fid.read(), 'Message 00004\n')
+
+  def test_segments(self):
+    self.use_handler(max_bytes=10)
+    for name in ('terra_log.2020-01-02_03-04-05.gz',
+                 'terra_log.2020-01-02_03-04-05.1.gz',
+                 'terra_log.2020-01-02_03-04-05.10',
+                 'terra_log.2020-01-02_03-04-05.2',
+                 'terra_log.2019-01-02_03-04-05.gz',
+                 'terra_log.2019-01-02_03-04-05.gz.tmp',
+                 'terra_log.bin',
+                 'terra_log.bin.2018-01-02_03-04-05'):
+      open(os.path.join(self.temp_dir.name, name), 'w').close()
+
+    self.assertEqual(
+        [os.path.basename(x) for x in self.handler.segments()],
+        ['terra_log.2019-01-02_03-04-05',
+         'terra_log.2020-01-02_03-04-05',
+         'terra_log.2020-01-02_03-04-05.1',
+         'terra_log.2020-01-02_03-04-05.2',
+         'terra_log.2020-01-02_03-04-05.10'])
+
+  def test_binary(self):
+    self.use_handler(rotate.RotatingBinaryFileHandler,
+                     filename=self.filename + '.bin', max_bytes=200)
+    for x in range(10):
+      self.test_logger.info('Message %d', x)
+    rotate.compressor.join()
+
+    files = [segment + '.gz' for segment in self.handler.segments()]
+    self.assertGreater(len(files), 1)
+    files.append(self.filename + '.bin')
+
+    with mock.patch.object(sys, 'stdout', io.StringIO()) as stdout:
+      main(['decode', '--format', '%(message)s'] + files)
+    self.assertEqual(stdout.getvalue().splitlines(),
+                     [f'Message {x}' for x in range(10)])
@@ -1,4 +1,11 @@
-from terra.core.signals import Signal, receiver, post_settings_configured
+import os
+from unittest import mock
+
+from terra.core.signals import (
+  Signal, receiver, post_settings_configured, STATS_ENVIRONMENT_VARIABLE,
+  pre_service_run, post_service_run, task_submitted, task_done,
+  stage_started, stage_finished
+)
 from .utils import TestCase
 
 
@@ -149,9 +156,77 @@ class TestSignals(TestCase):
     self.assertEqual(self.count, 1.1)
 
 
+class TestSignalStats(TestCase):
+  def handle(self, sender, **kwargs):
+    return 11
+
+  def fail(self, sender, **kwargs):
+    raise TypeError('Foo is not Bar')
+
+  def test_disabled(self):
+    signal = Signal(track_stats=False)
+    signal.connect(self.handle)
+    # No instrumentation installed on the instance
+    self.assertNotIn('send', signal.__dict__)
+    self.assertEqual(signal.send(sender=None), [(self.handle, 11)])
+    self.assertEqual(signal.stats(), {})
+
+  def test_stats(self):
+    signal = Signal(track_stats=True)
+    signal.connect(self.handle)
+    self.assertEqual(signal.send(sender=None), [(self.handle, 11)])
+    signal.send(sender=None)
+
+    stats = signal.stats()
+    self.assertEqual(len(stats), 1)
+    name, stat = stats.popitem()
+    self.assertIn('TestSignalStats.handle', name)
+    self.assertEqual(stat.calls, 2)
+    self.assertEqual(stat.exceptions, 0)
+    self.assertGreaterEqual(stat.total_time, stat.max_time)
+    self.assertGreaterEqual(stat.max_time, stat.mean_time)
+
+    signal.reset_stats()
+    self.assertEqual(signal.stats(), {})
+
+  def test_stats_exceptions(self):
+    signal = Signal(track_stats=True)
+    signal.connect(self.fail)
+    signal.connect(self.handle)
+    with self.assertRaises(TypeError):
+      signal.send(sender=None)
+
+    results = signal.send_robust(sender=None)
+    self.assertIsInstance(results[0][1], TypeError)
+    self.assertEqual(results[1], (self.handle, 11))
+
+    stats = {k.rsplit('.', 1)[1]: v for k, v in signal.stats().items()}
+    self.assertEqual(stats['fail'].calls, 2)
+    self.assertEqual(stats['fail'].exceptions, 2)
+    self.assertEqual(stats['handle'].calls, 1)
+
+  @mock.patch.dict(os.environ, {STATS_ENVIRONMENT_VARIABLE: "1"})
+  def test_stats_environment(self):
+    signal = Signal()
+    signal.connect(self.handle)
+    signal.send(sender=None)
+    self.assertEqual(len(signal.stats()), 1)
+
+  def test_log_stats(self):
+    signal = Signal(track_stats=True, name='foo_signal')
+    signal.connect(self.handle)
+    signal.send(sender=None)
+    with self.assertLogs('terra.core.signals', level='INFO') as cm:
+      signal.log_stats()
+    self.assertIn('foo_signal', str(cm.output))
+    self.assertIn('TestSignalStats.handle: calls=1', str(cm.output))
+
+
 class TestUnitTests(TestCase):
   def last_test_signals(self):
-    for signal in [post_settings_configured]:
+    for signal in [post_settings_configured, pre_service_run,
+                   post_service_run, task_submitted, task_done,
+                   stage_started, stage_finished]:
       self.assertFalse(
           signal.receivers,
           msg="If you are seting this, one of the other unit tests has "
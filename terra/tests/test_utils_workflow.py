@@ -4,6 +4,7 @@ import os
 import json
 
 from terra.utils.workflow import resumable, AlreadyRunException
+from terra.core.signals import stage_started, stage_finished
 from terra import settings
 from terra.logger import DEBUG1
 from .utils import TestCase
@@ -159,3 +160,31 @@ class TestResumable(TestCase):
     self.assertEqual(test1(klass), 11)
     self.assertExist(settings.status_file)
     self.assertEqual(klass.x, 12)
+
+  def test_stage_signals(self):
+    events = []
+
+    def started(sender, **kwargs):
+      events.append(('started', sender, kwargs))
+
+    def finished(sender, **kwargs):
+      events.append(('finished', sender, kwargs))
+
+    @resumable
+    def test1(self):
+      events.append(('run',))
+
+    stage_started.connect(started)
+    stage_finished.connect(finished)
+    try:
+      test1(Klass())
+    finally:
+      stage_started.disconnect(started)
+      stage_finished.disconnect(finished)
+
+    self.assertEqual([e[0] for e in events], ['started', 'run', 'finished'])
+    self.assertIs(events[0][1], Klass)
+    self.assertEqual(events[0][2]['stage_name'],
+                     f'{__file__}//{test1.__qualname__}')
+    self.assertEqual(events[0][2]['start_time'], events[2][2]['start_time'])
+    self.assertGreaterEqual(events[2][2]['elapsed'], 0)
@@ -6,9 +6,11 @@ import os
 import shutil
 import json
 import inspect
+import time
 from vsi.tools.python import BasicDecorator, args_to_kwargs
 
 from terra.core.settings import ObjectDict
+from terra.core.signals import stage_started, stage_finished
 from terra import settings
 from terra.logger import getLogger
 logger = getLogger(__name__)
@@ -101,6 +103,14 @@ class resumable(BasicDecorator):
     logger.debug(f"Starting stage: {stage_name}")
     self.save_status()
 
+    if stage_started.receivers or stage_finished.receivers:
+      start_time = time.time()
+      start = time.perf_counter()
+      stage_started.send(sender=type(self.stage_self), stage_name=stage_name,
+                         start_time=start_time)
+    else:
+      start = None
+
     # Run function
     result = self.fun(*args, **kwargs)
 
@@ -109,6 +119,11 @@ class resumable(BasicDecorator):
     logger.debug(f"Finished stage: {stage_name}")
     self.save_status()
 
+    if start is not None:
+      stage_finished.send(sender=type(self.stage_self), stage_name=stage_name,
+                          start_time=start_time,
+                          elapsed=time.perf_counter() - start)
+
     return result
 
   def save_status(self):